@@ -0,0 +1,119 @@
+from collections import Counter
+import re
+import time
+import logging
+
+import psycopg2.extensions
+
+from app.config.settings import settings
+from app.utils.exceptions import QueryBudgetExceededException
+from app.utils.metrics import record_query, request_stats
+
+logger = logging.getLogger(__name__)
+
+# statements are logged normalized: literals become ?, whitespace is collapsed and the
+# text is cut short (execute_values sends a whole batch of rows as one statement).
+# parameters are never logged, only their types
+_MAX_STATEMENT_CHARS = 500
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'?")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.%$])\d+(?:\.\d+)?")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_statement(query) -> str:
+    if isinstance(query, bytes):
+        query = query.decode(errors="replace")
+    elif not isinstance(query, str):
+        query = str(query)
+    # a bit more than what is kept, the literals shrink
+    text = query[:_MAX_STATEMENT_CHARS * 4]
+    text = _STRING_LITERAL.sub("?", text)
+    text = _NUMBER_LITERAL.sub("?", text)
+    text = _WHITESPACE.sub(" ", text).strip()
+    if len(text) > _MAX_STATEMENT_CHARS or len(query) > _MAX_STATEMENT_CHARS * 4:
+        text = text[:_MAX_STATEMENT_CHARS] + " ..."
+    return text
+
+
+def _redacted(value) -> str:
+    if isinstance(value, (list, tuple)):
+        return f"<{type(value).__name__}[{len(value)}]>"
+    return f"<{type(value).__name__}>"
+
+
+def redact_params(params) -> str:
+    """the shape of the parameters without their values"""
+    if params is None:
+        return "none"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{key}: {_redacted(value)}" for key, value in params.items()) + "}"
+    if isinstance(params, (list, tuple)):
+        return "(" + ", ".join(_redacted(value) for value in params) + ")"
+    return _redacted(params)
+
+
+def _check_budget():
+    stats = request_stats.get()
+    if stats is None or stats.query_budget is None or stats.queries < stats.query_budget:
+        return
+
+    # the same statement over and over is the usual culprit (an N+1 loop)
+    ran = Counter(normalize_statement(statement) for statement, _, _ in stats.statements)
+    summary = "; ".join(f"{count}x {statement}" for statement, count in ran.most_common())
+    logger.error(f"Request {stats.request_id} exceeded its budget of {stats.query_budget} queries: {summary}")
+    raise QueryBudgetExceededException(
+        f"Request {stats.request_id} exceeded its budget of {stats.query_budget} queries"
+    )
+
+
+def _record(cursor, query, params, seconds: float):
+    record_query(seconds)
+
+    stats = request_stats.get()
+    request_id = stats.request_id if stats is not None else "-"
+    if stats is not None and stats.query_budget is not None:
+        stats.statements.append((query, seconds, cursor.rowcount))
+
+    if seconds * 1000 >= settings.SLOW_QUERY_MS:
+        logger.warning(
+            f"Slow query in request {request_id}: {seconds * 1000:.1f} ms, {cursor.rowcount} rows: "
+            f"{normalize_statement(query)} params {redact_params(params)}"
+        )
+    elif logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            f"Query in request {request_id}: {seconds * 1000:.1f} ms, {cursor.rowcount} rows: "
+            f"{normalize_statement(query)}"
+        )
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """
+    cursor_factory of every pooled connection (so of everything get_db_connection
+    hands out). each statement is timed and counted into the db metrics and the
+    stats of the request it runs for, slow ones are logged. for named cursors only
+    the DECLARE is counted, the fetches that follow it are not
+    """
+
+    def execute(self, query, vars=None):
+        _check_budget()
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            _record(self, query, vars, time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        _check_budget()
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            _record(self, query, None, time.perf_counter() - started)
+
+    def copy_expert(self, sql, file, size=8192):
+        _check_budget()
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            _record(self, sql, None, time.perf_counter() - started)
@@ -1,12 +1,24 @@
 import psycopg2
-from psycopg2 import pool, OperationalError
+from psycopg2 import OperationalError
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+import asyncio
+import contextvars
 from .settings import settings
+from .pool import BoundedConnectionPool
+from .cursor import InstrumentedCursor
+from app.utils.exceptions import PoolTimeoutException
 import logging
 
 logger = logging.getLogger(__name__)
 
 connection_pool = None
 
+# psycopg2 is blocking, so every query runs on this bounded pool of threads
+# instead of on the event loop. it has more threads than the pool has
+# connections so bursts wait in the pool's fair queue (with its timeout)
+db_executor = None
+
 def _get_connection_kwargs():
     """get connection params with keepalive stuff"""
     return {
@@ -17,15 +29,27 @@ def _get_connection_kwargs():
         'keepalives_interval': 10,  # send keepalive evry 10sec
         'keepalives_count': 5,      # close after 5 failed keepalives
         'connect_timeout': 10,      # conection timeout
+        # every statement is timed for /metrics
+        'cursor_factory': InstrumentedCursor,
     }
 
 def init_db_pool():
-    global connection_pool
+    global connection_pool, db_executor
     try:
         kwargs = _get_connection_kwargs()
-        connection_pool = psycopg2.pool.SimpleConnectionPool(
-            1, 20, **kwargs
+        connection_pool = BoundedConnectionPool(
+            settings.DB_POOL_MIN_SIZE,
+            settings.DB_POOL_MAX_SIZE,
+            settings.DB_POOL_TIMEOUT_SECONDS,
+            max_lifetime=settings.DB_POOL_MAX_LIFETIME_SECONDS,
+            idle_timeout=settings.DB_POOL_IDLE_TIMEOUT_SECONDS,
+            validation_interval=settings.DB_POOL_VALIDATION_INTERVAL_SECONDS,
+            validator=_test_connection,
+            **kwargs
         )
+        # idle connections are validated and reaped in the background instead of on checkout
+        connection_pool.start_maintenance()
+        db_executor = ThreadPoolExecutor(max_workers=settings.DB_POOL_MAX_SIZE * 2, thread_name_prefix="db")
         if connection_pool:
             logger.info("Database connection pool created successfully")
     except Exception as e:
@@ -37,43 +61,37 @@ def _test_connection(conn):
     try:
         with conn.cursor() as cur:
             cur.execute("SELECT 1")
+        conn.rollback()
         return True
     except (OperationalError, psycopg2.InterfaceError):
         return False
 
 def get_db_connection():
-    """get a conection from pool with helth check"""
+    """
+    get a conection from pool. there is no health check round trip here, the pool
+    validates idle conections in the background and callers that hit a conection
+    error report it through return_db_connection(conn, broken=True)
+    """
     global connection_pool
     if not connection_pool:
         raise Exception("Connection pool not initialized")
-    
-    conn = connection_pool.getconn()
-    
-    # test if the conection is still valid
-    if not _test_connection(conn):
-        logger.warning("Stale connection detected, reconnecting...")
-        try:
-            conn.close()
-        except Exception:
-            pass
-        # put back the dead conection and get a new one
-        connection_pool.putconn(conn, close=True)
-        conn = connection_pool.getconn()
-        
-        # make sure the new conection actualy works
-        if not _test_connection(conn):
-            raise Exception("Failed to establish database connection")
-    
-    return conn
 
-def return_db_connection(conn):
+    return connection_pool.getconn()
+
+def return_db_connection(conn, broken=False):
     """return conection to pool, close if its broken"""
     global connection_pool
     if connection_pool and conn:
         try:
-            # check if conection is usable before puting back in pool
+            # after a conection error check it before puting back in pool
+            if broken and not conn.closed and not _test_connection(conn):
+                logger.warning("Broken connection detected, closing it")
+                conn.close()
+
             if conn.closed:
                 connection_pool.putconn(conn, close=True)
+                # if one conection died the others probably did too (db restart, network blip)
+                connection_pool.request_validation()
             else:
                 connection_pool.putconn(conn)
         except Exception as e:
@@ -83,8 +101,63 @@ def return_db_connection(conn):
             except Exception:
                 pass
 
+def _run_with_connection(fn, args):
+    conn = get_db_connection()
+    broken = False
+    try:
+        return fn(conn, *args)
+    except Exception as e:
+        # a conection error (as opposed to a bad query) gets the conection checked on return
+        broken = isinstance(e, (OperationalError, psycopg2.InterfaceError))
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
+    finally:
+        return_db_connection(conn, broken=broken)
+
+async def run_db(fn, *args):
+    """
+    runs fn(conn, *args) on the db thread pool with a pooled connection and
+    awaits the result, so a slow query only blocks its own request and not the
+    event loop. if fn raises the transaction is rolled back and the exception
+    comes back to the caller, the connection always goes back to the pool
+    """
+    loop = asyncio.get_running_loop()
+    # copy the context so contextvars set by the request are visible in the thread
+    context = contextvars.copy_context()
+    try:
+        return await loop.run_in_executor(db_executor, context.run, _run_with_connection, fn, args)
+    except PoolTimeoutException as e:
+        # the pool stayed exhausted for the whole timeout, tell the client to back off
+        logger.warning(f"Database pool exhausted: {e}")
+        raise HTTPException(status_code=503, detail="Database busy, please retry")
+
+async def acquire_db_connection():
+    """
+    checks a conection out of the pool without blocking the event loop, for work
+    that outlives a single run_db call (streamed responses). the caller owns it and
+    must give it back with return_db_connection
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(db_executor, get_db_connection)
+    except PoolTimeoutException as e:
+        logger.warning(f"Database pool exhausted: {e}")
+        raise HTTPException(status_code=503, detail="Database busy, please retry")
+
+def get_pool_stats() -> dict:
+    """live counters of the connection pool (empty if it is not initialized)"""
+    if not connection_pool:
+        return {}
+    return connection_pool.stats()
+
 def close_db_pool():
-    global connection_pool
+    global connection_pool, db_executor
+    if db_executor:
+        db_executor.shutdown(wait=True)
+        db_executor = None
     if connection_pool:
         connection_pool.closeall()
         logger.info("Database connection pool closed")
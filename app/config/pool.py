@@ -0,0 +1,315 @@
+from collections import deque
+from typing import Callable, Optional
+import threading
+import time
+import logging
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+
+from app.utils.exceptions import PoolTimeoutException
+
+logger = logging.getLogger(__name__)
+
+
+class _Waiter:
+    """one thread blocked in getconn, woken up with either a connection or a free slot"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.conn = None
+        self.may_connect = False
+
+
+class BoundedConnectionPool:
+    """
+    thread-safe psycopg2 connection pool with at most max_size connections.
+
+    when every connection is in use getconn waits in a FIFO queue (a returned
+    connection is handed straight to the oldest waiter, so nobody gets starved by
+    newer callers) and raises PoolTimeoutException after timeout seconds instead
+    of failing right away like psycopg2's pools. stats() exposes live counters.
+
+    checkout does no round trip: connection health is handled in the background
+    by a maintenance thread (see start_maintenance) that validates connections
+    idle for longer than validation_interval, closes the ones older than
+    max_lifetime or idle longer than idle_timeout (down to min_size) and tops
+    the pool back up to min_size. callers that hit a connection error hand the
+    connection back with putconn(close=True) and call request_validation()
+    """
+
+    def __init__(self, min_size: int, max_size: int, timeout: float,
+                 max_lifetime: float = 1800.0, idle_timeout: float = 300.0,
+                 validation_interval: float = 30.0,
+                 validator: Optional[Callable] = None, **connect_kwargs):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError(f"invalid pool size min={min_size} max={max_size}")
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.validation_interval = validation_interval
+        self._validator = validator or self._select_one
+        self._connect_kwargs = connect_kwargs
+
+        self._lock = threading.Lock()
+        # idle connections, the right end is the most recently used
+        self._idle = deque()
+        self._waiters = deque()
+        self._size = 0
+        self._closed = False
+        # conn -> [created_at, idle_since, validated_at]
+        self._meta = {}
+
+        self._acquires = 0
+        self._timeouts = 0
+        self._wait_seconds_total = 0.0
+        self._wait_seconds_max = 0.0
+        self._validations = 0
+        self._reaped = 0
+
+        self._wakeup = threading.Event()
+        self._maintenance_thread = None
+
+        for _ in range(min_size):
+            conn = self._connect()
+            with self._lock:
+                self._idle.append(conn)
+                self._size += 1
+
+    @staticmethod
+    def _select_one(conn) -> bool:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    def _connect(self):
+        conn = psycopg2.connect(**self._connect_kwargs)
+        now = time.monotonic()
+        with self._lock:
+            self._meta[conn] = [now, now, now]
+        return conn
+
+    def _discard(self, conn):
+        """closes a connection that is no longer counted in _idle"""
+        with self._lock:
+            self._meta.pop(conn, None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expired(self, conn, now: float) -> bool:
+        meta = self._meta.get(conn)
+        return meta is not None and now - meta[0] > self.max_lifetime
+
+    def getconn(self, timeout: Optional[float] = None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        conn = None
+        waiter = None
+        may_connect = False
+
+        with self._lock:
+            if self._closed:
+                raise psycopg2.pool.PoolError("connection pool is closed")
+            # nobody may jump the queue while others are waiting
+            if self._idle and not self._waiters:
+                conn = self._idle.pop()
+            elif self._size < self.max_size and not self._waiters:
+                self._size += 1
+                may_connect = True
+            else:
+                waiter = _Waiter()
+                self._waiters.append(waiter)
+
+        if waiter is not None:
+            waiter.event.wait(timeout)
+            with self._lock:
+                if waiter.conn is None and not waiter.may_connect:
+                    self._waiters.remove(waiter)
+                    self._timeouts += 1
+                    raise PoolTimeoutException(
+                        f"No database connection available after {timeout:.1f}s "
+                        f"({self._size} open, {len(self._waiters)} waiting)"
+                    )
+            conn = waiter.conn
+            may_connect = waiter.may_connect
+
+        # swapping a connection past its lifetime costs a connect but no query
+        if conn is not None and self._expired(conn, time.monotonic()):
+            self._discard(conn)
+            with self._lock:
+                self._reaped += 1
+            conn = None
+            may_connect = True
+
+        if may_connect:
+            try:
+                conn = self._connect()
+            except Exception:
+                self._release_slot()
+                raise
+
+        waited = time.monotonic() - started
+        with self._lock:
+            self._acquires += 1
+            self._wait_seconds_total += waited
+            self._wait_seconds_max = max(self._wait_seconds_max, waited)
+
+        return conn
+
+    def putconn(self, conn, close: bool = False):
+        if not close and not conn.closed:
+            # never hand out a connection in the middle of a transaction
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                close = True
+
+        if close or conn.closed or self._closed or self._expired(conn, time.monotonic()):
+            self._discard(conn)
+            self._release_slot()
+            return
+
+        self._make_available(conn)
+
+    def _make_available(self, conn, used: bool = True):
+        with self._lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.conn = conn
+                waiter.event.set()
+            else:
+                meta = self._meta.get(conn)
+                if meta is not None and used:
+                    meta[1] = time.monotonic()
+                self._idle.append(conn)
+
+    def _release_slot(self):
+        """a connection went away, let the oldest waiter open a new one in its place"""
+        with self._lock:
+            if self._waiters and not self._closed:
+                waiter = self._waiters.popleft()
+                waiter.may_connect = True
+                waiter.event.set()
+            else:
+                self._size -= 1
+
+    def request_validation(self):
+        """wakes the maintenance thread now, eg after a connection error"""
+        self._wakeup.set()
+
+    def start_maintenance(self):
+        if self._maintenance_thread is not None:
+            return
+        self._maintenance_thread = threading.Thread(
+            target=self._maintenance_loop, name="db-pool-maintenance", daemon=True
+        )
+        self._maintenance_thread.start()
+
+    def _maintenance_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.validation_interval)
+            self._wakeup.clear()
+            if self._closed:
+                break
+            try:
+                self.run_maintenance()
+            except Exception as e:
+                logger.warning(f"Connection pool maintenance failed: {e}")
+
+    def run_maintenance(self):
+        """one pass of validation and reaping over the idle connections"""
+        now = time.monotonic()
+        to_check = []
+        to_close = []
+
+        with self._lock:
+            keep = deque()
+            spare = self._size - self.min_size
+            # oldest idle first, recently used connections have just proven themselves
+            while self._idle:
+                conn = self._idle.popleft()
+                created_at, idle_since, validated_at = self._meta.get(conn, (now, now, now))
+                if conn.closed or now - created_at > self.max_lifetime:
+                    to_close.append(conn)
+                elif spare > 0 and now - idle_since > self.idle_timeout:
+                    to_close.append(conn)
+                    spare -= 1
+                elif now - max(idle_since, validated_at) >= self.validation_interval:
+                    to_check.append(conn)
+                else:
+                    keep.append(conn)
+            self._idle = keep
+
+        for conn in to_check:
+            with self._lock:
+                self._validations += 1
+            if self._validator(conn):
+                with self._lock:
+                    meta = self._meta.get(conn)
+                    if meta is not None:
+                        meta[2] = time.monotonic()
+                # validation does not count as use, the idle timeout keeps running
+                self._make_available(conn, used=False)
+            else:
+                logger.warning("Dropping broken idle database connection")
+                to_close.append(conn)
+
+        for conn in to_close:
+            self._discard(conn)
+            with self._lock:
+                self._reaped += 1
+            self._release_slot()
+
+        # top back up to min_size so the next burst does not pay for connects
+        while True:
+            with self._lock:
+                if self._closed or self._size >= self.min_size:
+                    break
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception as e:
+                self._release_slot()
+                logger.warning(f"Could not refill connection pool: {e}")
+                break
+            self._make_available(conn)
+
+    def closeall(self):
+        with self._lock:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+        self._wakeup.set()
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            idle = len(self._idle)
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "in_use": self._size - idle,
+                "idle": idle,
+                "waiters": len(self._waiters),
+                "acquires": self._acquires,
+                "timeouts": self._timeouts,
+                "acquire_wait_seconds_total": round(self._wait_seconds_total, 6),
+                "acquire_wait_seconds_max": round(self._wait_seconds_max, 6),
+                "acquire_wait_seconds_avg": round(self._wait_seconds_total / self._acquires, 6) if self._acquires else 0.0,
+                "validations": self._validations,
+                "reaped": self._reaped,
+            }
@@ -6,13 +6,55 @@ from dotenv import load_dotenv
 load_dotenv()
 
 class Settings(BaseModel):
+    """
+    service settings, read from the environment by get_settings.
+
+    the path detail and search caches live in each worker process and only the writes
+    of that process invalidate them. a write made by another worker or instance is
+    picked up when the entries expire, so PATH_DETAIL_CACHE_TTL_SECONDS is the upper
+    bound on how stale a path detail (body and ETag) can be, and SEARCH_CACHE_TTL_SECONDS
+    the one for cached search candidates. the Procfile runs a single worker, where
+    every write invalidates right away
+    """
     DATABASE_URL: str
 
     JWT_SECRET_KEY: str
     JWT_ALGORITHM: str = "HS256"
+    JWT_CACHE_MAX_ENTRIES: int = 10000
+    JWT_CACHE_TTL_SECONDS: float = 300.0
 
     TOLERANCE_RADIUS_METERS: float = 100.0
 
+    DB_POOL_MIN_SIZE: int = 1
+    DB_POOL_MAX_SIZE: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 10.0
+    DB_POOL_MAX_LIFETIME_SECONDS: float = 1800.0
+    DB_POOL_IDLE_TIMEOUT_SECONDS: float = 300.0
+    DB_POOL_VALIDATION_INTERVAL_SECONDS: float = 30.0
+
+    IMPORT_BATCH_SEGMENTS: int = 5000
+    IMPORT_MAX_RECORD_BYTES: int = 16 * 1024 * 1024
+    EXPORT_FETCH_SIZE: int = 500
+
+    PATH_DETAIL_CACHE_MAX_ENTRIES: int = 1000
+    PATH_DETAIL_CACHE_TTL_SECONDS: float = 300.0
+    SEARCH_CACHE_MAX_ENTRIES: int = 5000
+    SEARCH_CACHE_TTL_SECONDS: float = 120.0
+
+    ROUTING_SNAP_METERS: float = 5.0
+    ROUTING_MAX_EXPANSIONS: int = 200000
+
+    PATH_SNAPSHOT_FILE: str = "/tmp/bbp-path-snapshot.bin"
+    PATH_SNAPSHOT_OVERLAP_SECONDS: float = 300.0
+
+    COMPRESSION_MIN_BYTES: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+
+    SLOW_QUERY_MS: float = 200.0
+    DEBUG: bool = False
+    MAX_QUERIES_PER_REQUEST: int = 20
+
     PORT: int = 8001
 
     class Config:
@@ -23,7 +65,32 @@ def get_settings() -> Settings:
         DATABASE_URL=os.getenv("DATABASE_URL", ""),
         JWT_SECRET_KEY=os.getenv("JWT_SECRET_KEY", ""),
         JWT_ALGORITHM=os.getenv("JWT_ALGORITHM", "HS256"),
+        JWT_CACHE_MAX_ENTRIES=int(os.getenv("JWT_CACHE_MAX_ENTRIES", "10000")),
+        JWT_CACHE_TTL_SECONDS=float(os.getenv("JWT_CACHE_TTL_SECONDS", "300.0")),
         TOLERANCE_RADIUS_METERS=float(os.getenv("TOLERANCE_RADIUS_METERS", "100.0")),
+        DB_POOL_MIN_SIZE=int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+        DB_POOL_MAX_SIZE=int(os.getenv("DB_POOL_MAX_SIZE", "20")),
+        DB_POOL_TIMEOUT_SECONDS=float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "10.0")),
+        DB_POOL_MAX_LIFETIME_SECONDS=float(os.getenv("DB_POOL_MAX_LIFETIME_SECONDS", "1800.0")),
+        DB_POOL_IDLE_TIMEOUT_SECONDS=float(os.getenv("DB_POOL_IDLE_TIMEOUT_SECONDS", "300.0")),
+        DB_POOL_VALIDATION_INTERVAL_SECONDS=float(os.getenv("DB_POOL_VALIDATION_INTERVAL_SECONDS", "30.0")),
+        IMPORT_BATCH_SEGMENTS=int(os.getenv("IMPORT_BATCH_SEGMENTS", "5000")),
+        IMPORT_MAX_RECORD_BYTES=int(os.getenv("IMPORT_MAX_RECORD_BYTES", str(16 * 1024 * 1024))),
+        EXPORT_FETCH_SIZE=int(os.getenv("EXPORT_FETCH_SIZE", "500")),
+        PATH_DETAIL_CACHE_MAX_ENTRIES=int(os.getenv("PATH_DETAIL_CACHE_MAX_ENTRIES", "1000")),
+        PATH_DETAIL_CACHE_TTL_SECONDS=float(os.getenv("PATH_DETAIL_CACHE_TTL_SECONDS", "300.0")),
+        SEARCH_CACHE_MAX_ENTRIES=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "5000")),
+        SEARCH_CACHE_TTL_SECONDS=float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "120.0")),
+        ROUTING_SNAP_METERS=float(os.getenv("ROUTING_SNAP_METERS", "5.0")),
+        ROUTING_MAX_EXPANSIONS=int(os.getenv("ROUTING_MAX_EXPANSIONS", "200000")),
+        PATH_SNAPSHOT_FILE=os.getenv("PATH_SNAPSHOT_FILE", "/tmp/bbp-path-snapshot.bin"),
+        PATH_SNAPSHOT_OVERLAP_SECONDS=float(os.getenv("PATH_SNAPSHOT_OVERLAP_SECONDS", "300.0")),
+        COMPRESSION_MIN_BYTES=int(os.getenv("COMPRESSION_MIN_BYTES", "1024")),
+        COMPRESSION_GZIP_LEVEL=int(os.getenv("COMPRESSION_GZIP_LEVEL", "6")),
+        COMPRESSION_BROTLI_QUALITY=int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4")),
+        SLOW_QUERY_MS=float(os.getenv("SLOW_QUERY_MS", "200.0")),
+        DEBUG=os.getenv("DEBUG", "false").lower() in ("1", "true", "yes"),
+        MAX_QUERIES_PER_REQUEST=int(os.getenv("MAX_QUERIES_PER_REQUEST", "20")),
         PORT=int(os.getenv("PORT", "8001"))
     )
 
@@ -4,8 +4,12 @@ from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 import logging
 
-from app.routes import paths, health
+from app.routes import paths, health, metrics
 from app.config.database import init_db_pool, close_db_pool
+from app.services.path_snapshot import load_path_indexes
+from app.config.settings import settings
+from app.utils.compression import CompressionMiddleware
+from app.utils.metrics import MetricsMiddleware
 
 logging.basicConfig(
     level=logging.INFO,
@@ -18,6 +22,7 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     logger.info("Starting Path Management Service...")
     init_db_pool()
+    load_path_indexes()
     yield
     logger.info("Shutting down Path Management Service...")
     close_db_pool()
@@ -40,9 +45,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MIN_BYTES,
+    gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+    brotli_quality=settings.COMPRESSION_BROTLI_QUALITY
+)
+
+# outermost, so the timings include compression and the other middlewares.
+# in DEBUG every request gets a statement budget, N+1 query loops fail right away
+app.add_middleware(
+    MetricsMiddleware,
+    query_budget=settings.MAX_QUERIES_PER_REQUEST if settings.DEBUG else None
+)
+
 app.include_router(paths.router, prefix="/paths", tags=["Paths"])
 app.include_router(paths.router, prefix="/routes", tags=["Routes"])
 app.include_router(health.router, tags=["Health"])
+app.include_router(metrics.router, tags=["Health"])
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -62,7 +82,6 @@ async def root():
 
 if __name__ == "__main__":
     import uvicorn
-    from app.config.settings import settings
 
     uvicorn.run(
         "app.main:app",
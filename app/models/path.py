@@ -69,6 +69,25 @@ class SegmentInput(BaseModel):
             raise ValueError('Longitude must be between -180 and 180')
         return v
 
+    @field_validator('routeGeometry')
+    @classmethod
+    def validate_route_geometry(cls, v):
+        # the geometry kernels need every point as [lat, lng], so anything after
+        # that (like the altitude some gps exports add) is dropped here
+        if v is None:
+            return v
+        points = []
+        for point in v:
+            if len(point) < 2:
+                raise ValueError('routeGeometry points must be [latitude, longitude]')
+            lat, lng = point[0], point[1]
+            if lat < -90 or lat > 90:
+                raise ValueError('routeGeometry latitude must be between -90 and 90')
+            if lng < -180 or lng > 180:
+                raise ValueError('routeGeometry longitude must be between -180 and 180')
+            points.append([lat, lng])
+        return points
+
 class ObstacleInput(BaseModel):
     segmentId: Optional[str] = None
     type: ObstacleType
@@ -103,6 +122,17 @@ class PathInfoResponse(BaseModel):
     pathInfoId: str
     message: str
 
+class ImportRecordError(BaseModel):
+    record: int  # NDJSON line number or position of the GeoJSON feature, starting at 1
+    error: str
+
+class PathImportResponse(BaseModel):
+    importedPaths: int
+    importedSegments: int
+    importedObstacles: int
+    failedRecords: int
+    errors: List[ImportRecordError]  # only the first MAX_REPORTED_IMPORT_ERRORS are listed
+
 class ObstacleResponse(BaseModel):
     obstacleId: str
     type: str
@@ -120,6 +150,7 @@ class SegmentResponse(BaseModel):
     endLatitude: float
     endLongitude: float
     obstacles: List[ObstacleResponse]
+    routeGeometry: Optional[str] = None  # encoded polyline (precision 6), only sent when includeGeometry=true
 
 class RouteResponse(BaseModel):
     routeId: str
@@ -129,6 +160,17 @@ class RouteResponse(BaseModel):
 
 class RoutesSearchResponse(BaseModel):
     routes: List[RouteResponse]
+    nextCursor: Optional[str] = None  # pass back as cursor for the next page, only set when there is one
+
+class PlannedSegmentResponse(SegmentResponse):
+    pathInfoId: str
+    reversed: bool  # ridden from end to start
+
+class PlannedRouteResponse(BaseModel):
+    score: float
+    totalDistance: float
+    pathIds: List[str]  # paths the route uses, in riding order
+    segments: List[PlannedSegmentResponse]
 
 class PathDetailResponse(BaseModel):
     pathInfoId: str
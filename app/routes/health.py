@@ -1,33 +1,36 @@
 from fastapi import APIRouter, HTTPException
 from datetime import datetime
-from app.config.database import get_db_connection, return_db_connection
+from app.config.database import run_db, get_pool_stats
+from app.services.path_cache import get_cache_stats
+from app.services.routing_graph import routing_graph
+from app.utils.security import token_cache
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+def _ping(conn):
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT 1")
+    cursor.fetchone()
+
+    cursor.close()
+
 @router.get("/health")
 async def health_check():
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT 1")
-        cursor.fetchone()
-
-        cursor.close()
+        await run_db(_ping)
 
         return {
             "status": "healthy",
             "service": "path-management-service",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now().isoformat(),
+            "pool": get_pool_stats(),
+            "caches": dict(get_cache_stats(), tokens=token_cache.stats()),
+            "routing_graph": routing_graph.stats()
         }
 
     except Exception as e:
         logger.error(f"Health check failed: {e}")
         raise HTTPException(status_code=503, detail="Service unhealthy")
-
-    finally:
-        if conn:
-            return_db_connection(conn)
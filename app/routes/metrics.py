@@ -0,0 +1,45 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.config.database import get_pool_stats
+from app.services.path_cache import get_cache_stats
+from app.services.routing_graph import routing_graph
+from app.utils.security import token_cache
+from app.utils.metrics import render_registry, render_family
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# pool counters that only ever grow, everything else in get_pool_stats is a gauge
+_POOL_COUNTERS = {"acquires", "timeouts", "acquire_wait_seconds_total", "validations", "reaped"}
+_POOL_GAUGES = {"min_size", "max_size", "size", "in_use", "idle", "waiters", "acquire_wait_seconds_max"}
+
+def _pool_lines():
+    lines = []
+    for name, value in get_pool_stats().items():
+        if name in _POOL_COUNTERS:
+            metric = f"bbp_db_pool_{name}" if name.endswith("_total") else f"bbp_db_pool_{name}_total"
+            lines += render_family(metric, f"connection pool {name}", "counter", [({}, value)])
+        elif name in _POOL_GAUGES:
+            lines += render_family(f"bbp_db_pool_{name}", f"connection pool {name}", "gauge", [({}, value)])
+    return lines
+
+def _cache_lines():
+    caches = dict(get_cache_stats(), tokens=token_cache.stats())
+    lines = render_family("bbp_cache_entries", "entries held per in-process cache", "gauge",
+                          [({"cache": name}, stats["size"]) for name, stats in caches.items()])
+    for field in ("hits", "misses", "evictions", "expirations", "invalidations"):
+        lines += render_family(f"bbp_cache_{field}_total", f"cache {field} per in-process cache", "counter",
+                               [({"cache": name}, stats[field]) for name, stats in caches.items()])
+    return lines
+
+def _routing_graph_lines():
+    stats = routing_graph.stats()
+    return render_family("bbp_routing_graph_nodes", "junctions in the routing graph", "gauge", [({}, stats["nodes"])]) + \
+        render_family("bbp_routing_graph_edges", "segments in the routing graph", "gauge", [({}, stats["edges"])])
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint, numbers are per worker process"""
+    lines = render_registry() + _pool_lines() + _cache_lines() + _routing_graph_lines()
+    return PlainTextResponse("\n".join(lines) + "\n", media_type=PROMETHEUS_CONTENT_TYPE)
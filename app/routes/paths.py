@@ -1,16 +1,44 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from starlette.concurrency import run_in_threadpool
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional, Tuple
+import base64
+import json
 import uuid
-from datetime import datetime
 import logging
+import numpy as np
 
 from app.models.path import (
-    ManualPathCreate, PathInfoResponse, RouteResponse, RoutesSearchResponse,
-    PathDetailResponse, SegmentResponse, ObstacleResponse
+    ManualPathCreate, PathInfoResponse, RoutesSearchResponse, PathDetailResponse,
+    PathImportResponse, ImportRecordError, PlannedRouteResponse
 )
 from app.utils.security import get_current_user, get_current_user_optional
-from app.utils.geo_utils import calculate_segment_length, is_within_radius, calculate_path_score, find_nearest_segment
-from app.config.database import get_db_connection, return_db_connection
+from app.utils.geo_utils import within_radius_mask
+from app.utils.exceptions import SegmentNotFoundException, ImportFormatException
+from app.utils.compression import etag_matches
+from app.utils.metrics import search_candidates, search_matches, path_segments, set_query_budget
+from app.services.path_queries import (
+    fetch_endpoint_candidates, fetch_segments_by_path, fetch_obstacles_by_segment, fetch_segment_paths,
+    fetch_ranked_path_stats, fetch_segments_by_id
+)
+from app.services.path_writer import build_path_rows, insert_path_rows
+from app.services.path_import import (
+    iter_ndjson_records, iter_geojson_features, parse_import_record, describe_record_error,
+    load_import_batch, MAX_REPORTED_IMPORT_ERRORS
+)
+from app.services.path_export import open_export_stream, ExportStreamingResponse, EXPORT_MEDIA_TYPES
+from app.services.path_responses import (
+    PreRenderedJSONResponse, segment_json, route_json, path_detail_body, path_detail_etag, path_detail_response,
+    routes_search_body, planned_route_body
+)
+from app.services.spatial_index import path_endpoint_index
+from app.services.routing_graph import routing_graph
+from app.services.path_cache import (
+    path_detail_cache, path_detail_key, path_generation, cache_path_details, invalidate_path,
+    search_cache, search_cache_key, search_cell_boxes, search_generation, cache_search_candidates,
+    invalidate_search_area, invalidate_all_searches, invalidate_all_paths
+)
+from app.config.database import run_db
 from app.config.settings import settings
 
 router = APIRouter()
@@ -21,337 +49,425 @@ async def create_manual_path(
     path_data: ManualPathCreate,
     user_id: str = Depends(get_current_user)
 ):
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        path_info_id = str(uuid.uuid4())
-
-        cursor.execute("""
-            INSERT INTO PathInfo (path_info_id, user_id, name, description, data_source, publishable, created_date)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (
-            path_info_id,
-            user_id,
-            path_data.name,
-            path_data.description,
-            'MANUAL',
-            path_data.publishable,
-            datetime.now()
-        ))
-
-        segment_id_map = {}
-        segments_for_matching = []
-
-        for idx, segment in enumerate(path_data.segments):
-            segment_id = str(uuid.uuid4())
-            segment_id_map[idx] = segment_id
-
-            length_meters = calculate_segment_length(
-                segment.startLatitude,
-                segment.startLongitude,
-                segment.endLatitude,
-                segment.endLongitude
-            )
-
-            cursor.execute("""
-                INSERT INTO Segments (
-                    segment_id, path_info_id, street_name, status,
-                    start_latitude, start_longitude, end_latitude, end_longitude,
-                    segment_order, length_meters
-                )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                segment_id,
-                path_info_id,
-                segment.streetName,
-                segment.status.value,
-                segment.startLatitude,
-                segment.startLongitude,
-                segment.endLatitude,
-                segment.endLongitude,
-                segment.order,
-                length_meters
-            ))
-
-            segments_for_matching.append({
-                'segment_id': segment_id,
-                'start_latitude': segment.startLatitude,
-                'start_longitude': segment.startLongitude,
-                'end_latitude': segment.endLatitude,
-                'end_longitude': segment.endLongitude,
-                'route_geometry': segment.routeGeometry  # include all route pts for acurate matching
-            })
-            
-            # Debug log
-            logger.info(f"Segment {idx}: start=({segment.startLatitude}, {segment.startLongitude}), end=({segment.endLatitude}, {segment.endLongitude}), routeGeometry points: {len(segment.routeGeometry) if segment.routeGeometry else 0}")
-
-        if path_data.obstacles:
-            for obstacle in path_data.obstacles:
-                logger.info(f"Processing obstacle at ({obstacle.latitude}, {obstacle.longitude})")
-                target_segment_id = obstacle.segmentId
-
-                if target_segment_id is None:
-                    target_segment_id = find_nearest_segment(
-                        obstacle.latitude,
-                        obstacle.longitude,
-                        segments_for_matching,
-                        max_distance_meters=50.0
-                    )
-
-                    if target_segment_id is None:
-                        logger.error(f"No segment found within 50m of obstacle at ({obstacle.latitude}, {obstacle.longitude}). Segments: {len(segments_for_matching)}")
-                        conn.rollback()
-                        raise HTTPException(
-                            status_code=400,
-                            detail=f"No segment found within 50m of obstacle at ({obstacle.latitude}, {obstacle.longitude})"
-                        )
-
-                    logger.info(f"Auto-associated obstacle at ({obstacle.latitude}, {obstacle.longitude}) to segment {target_segment_id}")
-                else:
-                    cursor.execute("""
-                        SELECT segment_id FROM Segments WHERE segment_id = %s
-                    """, (target_segment_id,))
-
-                    if not cursor.fetchone():
-                        conn.rollback()
-                        raise HTTPException(status_code=400, detail=f"Segment {target_segment_id} not found")
-
-                obstacle_id = str(uuid.uuid4())
-
-                cursor.execute("""
-                    INSERT INTO Obstacles (
-                        obstacle_id, segment_id, type, severity,
-                        latitude, longitude, description, reported_date, confirmed
-                    )
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    obstacle_id,
-                    target_segment_id,
-                    obstacle.type.value,
-                    obstacle.severity.value,
-                    obstacle.latitude,
-                    obstacle.longitude,
-                    obstacle.description,
-                    datetime.now(),
-                    True
-                ))
-
-        conn.commit()
-        cursor.close()
+        rows, segment_paths = await run_db(_save_manual_path, path_data, user_id)
+
+        # the path is committed and the conection back in the pool by now
+        await run_in_threadpool(_apply_stored_paths, [rows], 'MANUAL')
+        if rows['endpoints']:
+            invalidate_search_area(*rows['endpoints'][3:7], user_id, path_data.publishable)
+        # obstacles given a segmentId land on existing paths, their details changed too
+        for segment_path_id in set(segment_paths.values()):
+            invalidate_path(segment_path_id)
 
         return PathInfoResponse(
-            pathInfoId=path_info_id,
+            pathInfoId=rows['path_info'][0],
             message="Path information saved successfully"
         )
 
     except HTTPException:
         raise
     except Exception as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Error creating manual path: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
-    finally:
-        if conn:
-            return_db_connection(conn)
 
-@router.get("/search", response_model=RoutesSearchResponse)
+def _save_manual_path(conn, path_data: ManualPathCreate, user_id: str) -> Tuple[dict, Dict[str, str]]:
+    """
+    runs on the db thread pool, run_db rolls the transaction back if anything raises.
+    returns the committed build_path_rows result and the path of every obstacle segmentId
+    """
+    cursor = conn.cursor()
+
+    # every supplied obstacle segmentId is checked in one lookup
+    segment_paths = fetch_segment_paths(
+        cursor, {o.segmentId for o in path_data.obstacles or [] if o.segmentId is not None}
+    )
+
+    try:
+        rows = build_path_rows(path_data, user_id, 'MANUAL', set(segment_paths))
+    except SegmentNotFoundException as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    insert_path_rows(cursor, rows)
+
+    conn.commit()
+    cursor.close()
+
+    return rows, segment_paths
+
+def _apply_stored_paths(stored: List[dict], source: str):
+    """
+    puts committed paths (build_path_rows results) into the in-memory endpoint index
+    and routing graph and drops their cached details. the paths are stored whatever
+    happens here, so a failure is logged instead of turning the write into a 500
+    """
+    for rows in stored:
+        path_id = rows['path_info'][0]
+        invalidate_path(path_id)
+        path_segments.observe(len(rows['segments']), (source,))
+
+        if rows['endpoints']:
+            try:
+                path_endpoint_index.add(*rows['endpoints'][:7])
+            except Exception as e:
+                # searches go back to the PathEndpoints query, which always has every path
+                logger.error(f"Error adding path {path_id} to the endpoint index, searching the database from now on: {e}")
+                path_endpoint_index.is_loaded = False
+
+        try:
+            routing_graph.add_path(rows)
+        except Exception as e:
+            logger.error(f"Error adding path {path_id} to the routing graph: {e}")
+
+@router.post("/import", response_model=PathImportResponse)
+async def import_paths(
+    request: Request,
+    import_format: str = Query("ndjson", alias="format", pattern="^(ndjson|geojson)$"),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    bulk import of AUTOMATED paths owned by the caller. the body is NDJSON (one
+    ManualPathCreate object per line) or a GeoJSON FeatureCollection (one path per
+    feature), it is parsed and stored batch by batch and never held in memory as a
+    whole. invalid records are reported and skipped, all the others are stored
+    """
+    # a few statements per batch, as many batches as the body has
+    set_query_budget(None)
+
+    totals = {'paths': 0, 'segments': 0, 'obstacles': 0}
+    errors: List[ImportRecordError] = []
+    failed_records = 0
+    batch = []
+    batch_segments = 0
+
+    def record_error(record_no: int, error: str):
+        nonlocal failed_records
+        failed_records += 1
+        if len(errors) < MAX_REPORTED_IMPORT_ERRORS:
+            errors.append(ImportRecordError(record=record_no, error=error))
+
+    async def add_result(result: dict):
+        for key in totals:
+            totals[key] += result[key]
+        for record_no, error in result['errors']:
+            record_error(record_no, error)
+        # the batch is committed, nothing here may fail it (flush would store it again)
+        await run_in_threadpool(_apply_stored_paths, result['stored'], 'AUTOMATED')
+        touches_other_paths = False
+        for rows in result['stored']:
+            # obstacles given a segmentId of an existing path change that path's details
+            own_segment_ids = {segment[0] for segment in rows['segments']}
+            if any(obstacle[1] not in own_segment_ids for obstacle in rows['obstacles']):
+                touches_other_paths = True
+        if result['stored']:
+            invalidate_all_searches()
+        if touches_other_paths:
+            invalidate_all_paths()
+
+    async def flush():
+        nonlocal batch, batch_segments
+        if not batch:
+            return
+        records, batch, batch_segments = batch, [], 0
+
+        try:
+            await add_result(await run_db(load_import_batch, records, user_id))
+            return
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error loading import batch of {len(records)} records: {e}")
+
+        # something in the batch broke the COPY, store the records one by one to find it
+        for record in records:
+            try:
+                await add_result(await run_db(load_import_batch, [record], user_id))
+            except HTTPException:
+                raise
+            except Exception as e:
+                record_error(record[0], describe_record_error(e))
+
+    try:
+        parse = iter_geojson_features if import_format == 'geojson' else iter_ndjson_records
+        last_record_no = 0
+
+        try:
+            async for record_no, record, error in parse(request.stream(), settings.IMPORT_MAX_RECORD_BYTES):
+                last_record_no = record_no
+                if error is None:
+                    try:
+                        path_data = parse_import_record(record, import_format)
+                    except ValueError as e:
+                        error = describe_record_error(e)
+
+                if error is not None:
+                    record_error(record_no, error)
+                    continue
+
+                batch.append((record_no, path_data))
+                batch_segments += len(path_data.segments)
+                if batch_segments >= settings.IMPORT_BATCH_SEGMENTS:
+                    await flush()
+
+        except ImportFormatException as e:
+            if not last_record_no:
+                raise HTTPException(status_code=400, detail=str(e))
+            # the rest of the document can not be read, what was parsed so far is still stored
+            record_error(last_record_no + 1, str(e))
+
+        await flush()
+        errors.sort(key=lambda e: e.record)
+
+        logger.info(f"Imported {totals['paths']} paths ({totals['segments']} segments, {totals['obstacles']} obstacles), {failed_records} records failed")
+
+        return PathImportResponse(
+            importedPaths=totals['paths'],
+            importedSegments=totals['segments'],
+            importedObstacles=totals['obstacles'],
+            failedRecords=failed_records,
+            errors=errors
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error importing paths: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/export")
+async def export_paths(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|geojson)$"),
+    after: Optional[str] = Query(None, description="resume after this pathInfoId"),
+    limit: Optional[int] = Query(None, ge=1)
+):
+    """
+    streams every publishable path with its segments and obstacles, ordered by
+    pathInfoId. NDJSON is one path per line, GeoJSON a FeatureCollection with one
+    LineString feature per path. pass the last pathInfoId received as after to resume
+    """
+    if after is not None:
+        try:
+            after = str(uuid.UUID(after))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid after, expected a pathInfoId")
+
+    try:
+        chunks = await open_export_stream(export_format, after, limit, settings.EXPORT_FETCH_SIZE)
+        return ExportStreamingResponse(chunks, media_type=EXPORT_MEDIA_TYPES[export_format])
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error exporting paths: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+MAX_SEARCH_LIMIT = 50
+
+def _check_coordinates(originLat: float, originLon: float, destLat: float, destLon: float):
+    if originLat < -90 or originLat > 90 or destLat < -90 or destLat > 90:
+        raise HTTPException(status_code=400, detail="Invalid latitude values")
+
+    if originLon < -180 or originLon > 180 or destLon < -180 or destLon > 180:
+        raise HTTPException(status_code=400, detail="Invalid longitude values")
+
+def _encode_search_cursor(score: Decimal, path_id: str) -> str:
+    """opaque page cursor, the (score, path id) keyset of the last route returned"""
+    payload = json.dumps([str(score), str(path_id)]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def _decode_search_cursor(cursor: str) -> Tuple[Decimal, str]:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        score, path_id = json.loads(payload)
+        return Decimal(score), str(uuid.UUID(path_id))
+    except (ValueError, TypeError, InvalidOperation):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/search", response_model=RoutesSearchResponse, response_model_exclude_unset=True)
 async def search_routes(
     originLat: float = Query(...),
     originLon: float = Query(...),
     destLat: float = Query(...),
     destLon: float = Query(...),
+    limit: int = Query(3, ge=1, le=MAX_SEARCH_LIMIT),
+    cursor: Optional[str] = Query(None),
     user_id: Optional[str] = Depends(get_current_user_optional)
 ):
     """
-    searches for routes bettween origin and destination
+    searches for routes bettween origin and destination, best score first
     
     visibilty rules (important!):
     - public paths (publishable=true) everyone can see them
     - private paths (publishable=false) only owner can see
     - if user is logged in they see public + their own privat paths
+
+    returns at most limit routes, when there are more the response has a
+    nextCursor to pass back as cursor (with the same search) for the next page
     """
-    conn = None
     try:
-        if originLat < -90 or originLat > 90 or destLat < -90 or destLat > 90:
-            raise HTTPException(status_code=400, detail="Invalid latitude values")
+        after = _decode_search_cursor(cursor) if cursor else None
 
-        if originLon < -180 or originLon > 180 or destLon < -180 or destLon > 180:
-            raise HTTPException(status_code=400, detail="Invalid longitude values")
-
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        _check_coordinates(originLat, originLon, destLat, destLon)
 
         tolerance = settings.TOLERANCE_RADIUS_METERS
 
-        # query paths with visibilty rules:
+        # visibilty rules are applied by the candidate lookup:
         # - all public paths where publishable = TRUE
         # - private paths ONLY if belong to current user
         if user_id:
-            # autenticated user: sees public + their own private paths
             logger.info(f"Search by authenticated user: {user_id}")
-            cursor.execute("""
-                SELECT DISTINCT pi.path_info_id
-                FROM PathInfo pi
-                JOIN Segments s ON pi.path_info_id = s.path_info_id
-                WHERE pi.publishable = TRUE 
-                   OR (pi.publishable = FALSE AND pi.user_id = %s)
-            """, (user_id,))
         else:
-            # anon user: can only see public paths
             logger.info("Search by anonymous user: showing only public paths")
-            cursor.execute("""
-                SELECT DISTINCT pi.path_info_id
-                FROM PathInfo pi
-                JOIN Segments s ON pi.path_info_id = s.path_info_id
-                WHERE pi.publishable = TRUE
-            """)
-
-        path_ids = [row[0] for row in cursor.fetchall()]
-        logger.info(f"Found {len(path_ids)} paths matching visibility criteria")
-
-        matching_paths = []
-
-        for path_id in path_ids:
-            cursor.execute("""
-                SELECT segment_id, street_name, status,
-                       start_latitude, start_longitude, end_latitude, end_longitude,
-                       segment_order, length_meters
-                FROM Segments
-                WHERE path_info_id = %s
-                ORDER BY segment_order
-            """, (path_id,))
-
-            segments = cursor.fetchall()
-
-            if not segments:
-                continue
-
-            first_segment = segments[0]
-            last_segment = segments[-1]
-
-            start_within = is_within_radius(
-                originLat, originLon,
-                float(first_segment[3]), float(first_segment[4]),
-                tolerance
-            )
-
-            end_within = is_within_radius(
-                destLat, destLon,
-                float(last_segment[5]), float(last_segment[6]),
-                tolerance
-            )
-
-            if start_within and end_within:
-                matching_paths.append({
-                    "path_id": path_id,
-                    "segments": segments
-                })
-
-        if not matching_paths:
-            raise HTTPException(status_code=404, detail="No routes found between specified locations")
 
-        routes = []
-
-        for path in matching_paths[:3]:
-            path_id = path["path_id"]
-            segments_data = []
-            total_distance = 0.0
-
-            for seg in path["segments"]:
-                segment_id = seg[0]
-
-                cursor.execute("""
-                    SELECT obstacle_id, type, severity, latitude, longitude, description
-                    FROM Obstacles
-                    WHERE segment_id = %s
-                """, (segment_id,))
-
-                obstacles_data = []
-                for obs in cursor.fetchall():
-                    obstacles_data.append({
-                        "obstacleId": obs[0],
-                        "type": obs[1],
-                        "severity": obs[2],
-                        "latitude": float(obs[3]),
-                        "longitude": float(obs[4]),
-                        "description": obs[5]
-                    })
-
-                segment_dict = {
-                    "segmentId": seg[0],
-                    "streetName": seg[1],
-                    "status": seg[2],
-                    "startLatitude": float(seg[3]),
-                    "startLongitude": float(seg[4]),
-                    "endLatitude": float(seg[5]),
-                    "endLongitude": float(seg[6]),
-                    "obstacles": obstacles_data
-                }
-
-                segments_data.append(segment_dict)
-                total_distance += float(seg[8])
-
-            all_obstacles = []
-            for seg in segments_data:
-                for obs in seg["obstacles"]:
-                    all_obstacles.append({
-                        "segment_id": seg["segmentId"],
-                        "severity": obs["severity"]
-                    })
-
-            score = calculate_path_score(
-                [{"length_meters": float(seg[8]), "status": seg[2], "segment_id": seg[0]} for seg in path["segments"]],
-                all_obstacles
-            )
-
-            routes.append(RouteResponse(
-                routeId=path_id,
-                score=score,
-                totalDistance=round(total_distance / 1000, 2),
-                segments=[
-                    SegmentResponse(
-                        segmentId=s["segmentId"],
-                        streetName=s["streetName"],
-                        status=s["status"],
-                        startLatitude=s["startLatitude"],
-                        startLongitude=s["startLongitude"],
-                        endLatitude=s["endLatitude"],
-                        endLongitude=s["endLongitude"],
-                        obstacles=[
-                            ObstacleResponse(
-                                obstacleId=o["obstacleId"],
-                                type=o["type"],
-                                severity=o["severity"],
-                                latitude=o["latitude"],
-                                longitude=o["longitude"],
-                                description=o["description"]
-                            ) for o in s["obstacles"]
-                        ]
-                    ) for s in segments_data
-                ]
-            ))
-
-        routes.sort(key=lambda r: r.score)
+        # candidates are cached per pair of tolerance sized cells and visibility class,
+        # on a miss they are looked up for the whole cells so any later search
+        # between the same two cells can reuse them
+        cache_key = search_cache_key(originLat, originLon, destLat, destLon, user_id)
+        cached = search_cache.get(cache_key)
 
-        cursor.close()
+        if cached is not None:
+            endpoints = cached[2]
+        else:
+            generation = search_generation()
+            origin_box, dest_box = search_cell_boxes(cache_key)
+
+            # the in-memory grid answers without touching postgres, the PathEndpoints
+            # query is only used if the index could not be built at startup.
+            # either way the exact haversine check below only runs on what is left
+            if path_endpoint_index.is_loaded:
+                endpoints = path_endpoint_index.find_candidates(user_id, origin_box, dest_box)
+            else:
+                endpoints = await run_db(_find_candidates_in_db, user_id, origin_box, dest_box)
+
+            cache_search_candidates(cache_key, origin_box, dest_box, endpoints, generation)
+        logger.info(f"Found {len(endpoints)} candidate paths matching visibility criteria")
+        search_candidates.observe(len(endpoints))
+
+        matching_path_ids = []
+
+        if endpoints:
+            coords = np.array([row[1:5] for row in endpoints], dtype=np.float64)
+            within = within_radius_mask(originLat, originLon, coords[:, 0], coords[:, 1], tolerance) & \
+                within_radius_mask(destLat, destLon, coords[:, 2], coords[:, 3], tolerance)
+            matching_path_ids = [row[0] for row, keep in zip(endpoints, within) if keep]
+        search_matches.observe(len(matching_path_ids))
+
+        if not matching_path_ids:
+            raise HTTPException(status_code=404, detail="No routes found between specified locations")
+
+        # every match is ranked, only the returned page gets hydrated
+        routes, next_key = await run_db(_hydrate_routes, matching_path_ids, limit, after)
 
-        return RoutesSearchResponse(routes=routes)
+        next_cursor = _encode_search_cursor(*next_key) if next_key is not None else None
+        return PreRenderedJSONResponse(routes_search_body(routes, next_cursor))
 
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error searching routes: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
-    finally:
-        if conn:
-            return_db_connection(conn)
 
-@router.get("/{path_id}", response_model=PathDetailResponse)
+def _find_candidates_in_db(conn, user_id: Optional[str], origin_box, dest_box) -> List[tuple]:
+    return fetch_endpoint_candidates(conn.cursor(), user_id, origin_box, dest_box)
+
+def _hydrate_routes(conn, path_ids: List[str], limit: int,
+                    after: Optional[Tuple[Decimal, str]] = None) -> Tuple[List[dict], Optional[tuple]]:
+    """
+    ranks all given paths by their stored score and builds the RouteResponse of the
+    best limit of them (after the keyset after, if given) as plain dicts. also returns
+    the (score, path id) keyset to continue from, None when this is the last page
+    """
+    cursor = conn.cursor()
+
+    # score and distance are stored on PathInfo, postgres does the ranking.
+    # one row more than the page tells if there is a next one
+    ranked_paths = fetch_ranked_path_stats(cursor, path_ids, limit + 1, after)
+    next_key = None
+    if len(ranked_paths) > limit:
+        ranked_paths = ranked_paths[:limit]
+        next_key = (ranked_paths[-1][1], ranked_paths[-1][0])
+    ranked_ids = [row[0] for row in ranked_paths]
+
+    segments_by_path = fetch_segments_by_path(cursor, ranked_ids)
+    obstacles_by_segment = fetch_obstacles_by_segment(
+        cursor,
+        [seg[0] for path_id in ranked_ids for seg in segments_by_path[path_id]]
+    )
+
+    routes = [
+        route_json(path_id, score, total_distance_m, segments_by_path[path_id], obstacles_by_segment)
+        for path_id, score, total_distance_m in ranked_paths
+    ]
+
+    cursor.close()
+
+    return routes, next_key
+
+@router.get("/plan", response_model=PlannedRouteResponse)
+async def plan_route(
+    originLat: float = Query(...),
+    originLon: float = Query(...),
+    destLat: float = Query(...),
+    destLon: float = Query(...),
+    user_id: Optional[str] = Depends(get_current_user_optional)
+):
+    """
+    plans the best scored route between origin and destination over the segments
+    of every path the caller can see, switching paths where their segments meet.
+    unlike search the route does not have to be one stored path.
+    same visibilty rules as search, the score is counted like a path score
+    """
+    try:
+        _check_coordinates(originLat, originLon, destLat, destLon)
+
+        if not routing_graph.is_loaded:
+            raise HTTPException(status_code=503, detail="Route planning is not available")
+
+        # A* runs in memory, off the event loop
+        planned = await run_in_threadpool(
+            routing_graph.find_route, originLat, originLon, destLat, destLon, user_id,
+            settings.TOLERANCE_RADIUS_METERS, settings.ROUTING_MAX_EXPANSIONS
+        )
+
+        if planned is None:
+            raise HTTPException(status_code=404, detail="No route found between specified locations")
+
+        return PreRenderedJSONResponse(await run_db(_hydrate_planned_route, planned))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error planning route: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+def _hydrate_planned_route(conn, planned: dict) -> bytes:
+    cursor = conn.cursor()
+
+    segment_ids = [segment_id for segment_id, _, _ in planned['edges']]
+    segments_by_id = fetch_segments_by_id(cursor, segment_ids)
+    obstacles_by_segment = fetch_obstacles_by_segment(cursor, segment_ids)
+
+    path_ids = []
+    segments = []
+    for segment_id, path_id, is_reversed in planned['edges']:
+        if not path_ids or path_ids[-1] != path_id:
+            path_ids.append(path_id)
+
+        segment = segment_json(segments_by_id[segment_id], obstacles_by_segment[segment_id])
+        segment["routeGeometry"] = None
+        segment["pathInfoId"] = path_id
+        segment["reversed"] = is_reversed
+        segments.append(segment)
+
+    cursor.close()
+
+    return planned_route_body(planned['score'], planned['length_meters'], path_ids, segments)
+
+@router.get("/{path_id}", response_model=PathDetailResponse, response_model_exclude_unset=True)
 async def get_path_details(
     path_id: str,
+    includeGeometry: bool = Query(False),
+    if_none_match: Optional[str] = Header(None),
     user_id: Optional[str] = Depends(get_current_user_optional)
 ):
     """
@@ -360,133 +476,81 @@ async def get_path_details(
     Visibility rules:
     - Public paths are visible to everyone
     - Private paths are visible ONLY to the user who created them
+
+    With includeGeometry=true every segment also carries its road-snapped
+    routeGeometry as an encoded polyline (precision 6), null if none was stored.
+
+    The response carries an ETag that changes with every change of the path, its
+    segments or obstacles. Sent back in If-None-Match it gets a 304 while the path
+    is unchanged (private paths of other users are still a 404).
     """
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        # cache hits are answered without touching postgres, visibility is still checked per caller
+        cached = path_detail_cache.get(path_detail_key(path_id, includeGeometry))
+        if cached is not None:
+            path_owner_id, is_publishable, etag, body = cached
+            _check_path_visibility(path_id, path_owner_id, is_publishable, user_id)
+            return path_detail_response(etag, body, if_none_match)
 
-        # First, get the path info without filtering by publishable
-        cursor.execute("""
-            SELECT path_info_id, user_id, name, description, data_source, publishable, created_date
-            FROM PathInfo
-            WHERE path_info_id = %s
-        """, (path_id,))
+        etag, body = await run_db(_load_path_details, path_id, includeGeometry, user_id, if_none_match)
+        return path_detail_response(etag, body, if_none_match)
 
-        path_info = cursor.fetchone()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting path details: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
 
-        if not path_info:
+def _check_path_visibility(path_id: str, path_owner_id: Optional[str], is_publishable: bool, user_id: Optional[str]):
+    """public paths are visible to all, private paths only to owner. anything else is a 404"""
+    if not is_publishable:
+        # Private path - only the owner can see it
+        if user_id != path_owner_id:
+            logger.warning(f"User {user_id} attempted to access private path {path_id} owned by {path_owner_id}")
             raise HTTPException(status_code=404, detail="Path not found")
-        
-        # Check visibility: public paths are visible to all, private paths only to owner
-        path_owner_id = path_info[1]
-        is_publishable = path_info[5]
-        
-        if not is_publishable:
-            # Private path - only the owner can see it
-            if user_id != path_owner_id:
-                logger.warning(f"User {user_id} attempted to access private path {path_id} owned by {path_owner_id}")
-                raise HTTPException(status_code=404, detail="Path not found")
-
-        cursor.execute("""
-            SELECT segment_id, street_name, status,
-                   start_latitude, start_longitude, end_latitude, end_longitude,
-                   segment_order, length_meters
-            FROM Segments
-            WHERE path_info_id = %s
-            ORDER BY segment_order
-        """, (path_id,))
-
-        segments = cursor.fetchall()
-
-        total_distance = 0.0
-        segments_data = []
-
-        for seg in segments:
-            segment_id = seg[0]
-
-            cursor.execute("""
-                SELECT obstacle_id, type, severity, latitude, longitude, description
-                FROM Obstacles
-                WHERE segment_id = %s
-            """, (segment_id,))
-
-            obstacles_data = []
-            for obs in cursor.fetchall():
-                obstacles_data.append({
-                    "obstacleId": obs[0],
-                    "type": obs[1],
-                    "severity": obs[2],
-                    "latitude": float(obs[3]),
-                    "longitude": float(obs[4]),
-                    "description": obs[5]
-                })
-
-            segment_dict = {
-                "segmentId": seg[0],
-                "streetName": seg[1],
-                "status": seg[2],
-                "startLatitude": float(seg[3]),
-                "startLongitude": float(seg[4]),
-                "endLatitude": float(seg[5]),
-                "endLongitude": float(seg[6]),
-                "obstacles": obstacles_data
-            }
-
-            segments_data.append(segment_dict)
-            total_distance += float(seg[8])
-
-        all_obstacles = []
-        for seg in segments_data:
-            for obs in seg["obstacles"]:
-                all_obstacles.append({
-                    "segment_id": seg["segmentId"],
-                    "severity": obs["severity"]
-                })
-
-        score = calculate_path_score(
-            [{"length_meters": float(seg[8]), "status": seg[2], "segment_id": seg[0]} for seg in segments],
-            all_obstacles
-        )
 
+def _load_path_details(conn, path_id: str, includeGeometry: bool, user_id: Optional[str],
+                       if_none_match: Optional[str] = None) -> Tuple[str, Optional[bytes]]:
+    """returns the ETag and the body, the body is None when if_none_match already has this version"""
+    # read before PathInfo, a write committing after it keeps this body out of the cache
+    generation = path_generation()
+
+    cursor = conn.cursor()
+
+    # First, get the path info without filtering by publishable
+    cursor.execute("""
+        SELECT path_info_id, user_id, name, description, data_source, publishable, created_date,
+               score, total_distance_m, version
+        FROM PathInfo
+        WHERE path_info_id = %s
+    """, (path_id,))
+
+    path_info = cursor.fetchone()
+
+    if not path_info:
+        raise HTTPException(status_code=404, detail="Path not found")
+
+    # Check visibility: public paths are visible to all, private paths only to owner
+    path_owner_id = path_info[1]
+    is_publishable = path_info[5]
+
+    _check_path_visibility(path_id, path_owner_id, is_publishable, user_id)
+
+    # the client has this version already, segments and obstacles are not needed
+    etag = path_detail_etag(path_info[0], path_info[9], includeGeometry)
+    if etag_matches(if_none_match, etag):
         cursor.close()
+        return etag, None
 
-        return PathDetailResponse(
-            pathInfoId=path_info[0],
-            name=path_info[2],
-            description=path_info[3],
-            dataSource=path_info[4],
-            createdDate=path_info[6],
-            totalDistance=round(total_distance / 1000, 2),
-            score=score,
-            segments=[
-                SegmentResponse(
-                    segmentId=s["segmentId"],
-                    streetName=s["streetName"],
-                    status=s["status"],
-                    startLatitude=s["startLatitude"],
-                    startLongitude=s["startLongitude"],
-                    endLatitude=s["endLatitude"],
-                    endLongitude=s["endLongitude"],
-                    obstacles=[
-                        ObstacleResponse(
-                            obstacleId=o["obstacleId"],
-                            type=o["type"],
-                            severity=o["severity"],
-                            latitude=o["latitude"],
-                            longitude=o["longitude"],
-                            description=o["description"]
-                        ) for o in s["obstacles"]
-                    ]
-                ) for s in segments_data
-            ]
-        )
+    segments = fetch_segments_by_path(cursor, [path_info[0]], include_geometry=includeGeometry)[path_info[0]]
+    obstacles_by_segment = fetch_obstacles_by_segment(cursor, [seg[0] for seg in segments])
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error getting path details: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error")
-    finally:
-        if conn:
-            return_db_connection(conn)
+    cursor.close()
+
+    body = path_detail_body(path_info, segments, obstacles_by_segment, includeGeometry)
+
+    cache_path_details(
+        path_detail_key(path_info[0], includeGeometry), (path_owner_id, is_publishable, etag, body), generation
+    )
+
+    return etag, body
@@ -0,0 +1,154 @@
+from typing import Optional, Tuple
+import math
+import threading
+import logging
+
+from app.config.settings import settings
+from app.utils.cache import TTLCache
+from app.utils.geo_utils import EARTH_RADIUS_METERS, get_bounding_box
+
+logger = logging.getLogger(__name__)
+
+# encoded PathDetailResponse body and its ETag per (path id, includeGeometry). entries are stored
+# together with the owner and publishable flag of the path so the visibility check still runs for
+# every caller on a hit, a private path is never served from here to anyone else
+path_detail_cache = TTLCache(settings.PATH_DETAIL_CACHE_MAX_ENTRIES, settings.PATH_DETAIL_CACHE_TTL_SECONDS)
+
+# search candidates per (origin cell, destination cell, visibility class). origin and
+# destination are snapped to a grid of TOLERANCE_RADIUS_METERS cells and the entry holds
+# every visible path whose start is within tolerance of *some* point of the origin cell
+# and whose end is within tolerance of some point of the destination cell, so it is a
+# superset of the answer for any query inside the two cells. the exact radius check
+# still runs on it for every search
+search_cache = TTLCache(settings.SEARCH_CACHE_MAX_ENTRIES, settings.SEARCH_CACHE_TTL_SECONDS)
+
+_search_cell_deg = math.degrees(settings.TOLERANCE_RADIUS_METERS / EARTH_RADIUS_METERS)
+
+# bumped by every search invalidation, a search that started computing its candidates
+# before a path was written does not cache them (they could miss the new path)
+_search_generation = 0
+_search_generation_lock = threading.Lock()
+
+# same for the detail cache, bumped by every path invalidation. a detail read that
+# started before a write to any path committed is not cached
+_path_generation = 0
+_path_generation_lock = threading.Lock()
+
+
+def path_detail_key(path_id: str, include_geometry: bool) -> tuple:
+    return (str(path_id).lower(), bool(include_geometry))
+
+
+def path_generation() -> int:
+    return _path_generation
+
+
+def cache_path_details(key: tuple, value: tuple, generation: int):
+    """
+    stores a detail response unless a path was invalidated since generation was read,
+    the response could have been read before that write committed
+    """
+    with _path_generation_lock:
+        if generation == _path_generation:
+            path_detail_cache.set(key, value)
+
+
+def invalidate_path(path_id: str):
+    """drops every cached response of the path, call it after any commited write that touches it"""
+    global _path_generation
+    with _path_generation_lock:
+        _path_generation += 1
+        for include_geometry in (False, True):
+            path_detail_cache.delete(path_detail_key(path_id, include_geometry))
+
+
+def invalidate_all_paths():
+    """for bulk writes that touch paths other than the ones written (obstacles on existing segments)"""
+    global _path_generation
+    with _path_generation_lock:
+        _path_generation += 1
+        path_detail_cache.clear()
+
+
+def _search_cell(lat: float, lon: float) -> Tuple[int, int]:
+    return (math.floor(lat / _search_cell_deg), math.floor(lon / _search_cell_deg))
+
+
+def _cell_box(cell: Tuple[int, int]) -> Tuple[float, float, float, float]:
+    """bounding box of every point within tolerance of some point of the cell"""
+    row, col = cell
+    tolerance = settings.TOLERANCE_RADIUS_METERS
+    corner_boxes = [
+        get_bounding_box(max(-90.0, min(90.0, lat)), lon, tolerance)
+        for lat in (row * _search_cell_deg, (row + 1) * _search_cell_deg)
+        for lon in (col * _search_cell_deg, (col + 1) * _search_cell_deg)
+    ]
+    # the longitude reach grows towards the poles so the corners cover the whole cell
+    return (
+        min(box[0] for box in corner_boxes),
+        max(box[1] for box in corner_boxes),
+        min(box[2] for box in corner_boxes),
+        max(box[3] for box in corner_boxes)
+    )
+
+
+def search_cache_key(origin_lat: float, origin_lon: float, dest_lat: float, dest_lon: float,
+                     user_id: Optional[str]) -> tuple:
+    visibility = str(user_id).lower() if user_id else None
+    return (_search_cell(origin_lat, origin_lon), _search_cell(dest_lat, dest_lon), visibility)
+
+
+def search_cell_boxes(key: tuple) -> Tuple[tuple, tuple]:
+    """(origin box, destination box) to look candidates up with for a search cache key"""
+    return _cell_box(key[0]), _cell_box(key[1])
+
+
+def search_generation() -> int:
+    return _search_generation
+
+
+def cache_search_candidates(key: tuple, origin_box: tuple, dest_box: tuple, candidates: list, generation: int):
+    """stores candidates unless a path was written since generation was read"""
+    with _search_generation_lock:
+        if generation == _search_generation:
+            search_cache.set(key, (origin_box, dest_box, candidates))
+
+
+def _in_box(box: tuple, lat: float, lon: float) -> bool:
+    return box[0] <= lat <= box[1] and box[2] <= lon <= box[3]
+
+
+def invalidate_search_area(start_lat: float, start_lon: float, end_lat: float, end_lon: float,
+                           user_id: Optional[str], publishable: bool):
+    """
+    drops the cached searches a new path could show up in: the ones whose cell boxes
+    hold its start and end and whose caller is allowed to see it
+    """
+    global _search_generation
+    owner = str(user_id).lower() if user_id else None
+    start_lat, start_lon, end_lat, end_lon = float(start_lat), float(start_lon), float(end_lat), float(end_lon)
+
+    def affected(key, value):
+        origin_box, dest_box, _ = value
+        if not publishable and (key[2] is None or key[2] != owner):
+            return False
+        return _in_box(origin_box, start_lat, start_lon) and _in_box(dest_box, end_lat, end_lon)
+
+    with _search_generation_lock:
+        _search_generation += 1
+        search_cache.delete_where(affected)
+
+
+def invalidate_all_searches():
+    """for bulk writes, cheaper than checking every cached cell against every new path"""
+    global _search_generation
+    with _search_generation_lock:
+        _search_generation += 1
+        search_cache.clear()
+
+
+def get_cache_stats() -> dict:
+    return {
+        'path_details': path_detail_cache.stats(),
+        'search': search_cache.stats()
+    }
@@ -0,0 +1,207 @@
+from typing import AsyncIterator, Iterator, Optional
+import logging
+
+import anyio
+import psycopg2
+from psycopg2 import OperationalError
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.config.database import acquire_db_connection, return_db_connection
+
+logger = logging.getLogger(__name__)
+
+# export of every publishable path with its segments and obstacles. each path is
+# turned into its JSON text by postgres (one row per path, nested json_agg) and read
+# through a named server-side cursor, so memory stays flat no matter how many paths
+# there are. paths come out ordered by path_info_id and the export can be resumed
+# from any id with after=<last pathInfoId received>
+
+EXPORT_FORMATS = ('ndjson', 'geojson')
+
+EXPORT_MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'geojson': 'application/geo+json',
+}
+
+# rows are written out in chunks of about this size instead of one send per path
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+_PATH_RECORD = """
+    json_build_object(
+        'pathInfoId', pi.path_info_id,
+        'name', pi.name,
+        'description', pi.description,
+        'dataSource', pi.data_source,
+        'createdDate', pi.created_date,
+        'totalDistance', round(pi.total_distance_m / 1000, 2)::float8,
+        'score', pi.score::float8,
+        'segments', COALESCE(seg.segments, '[]'::json)
+    )
+"""
+
+# GeoJSON positions are [lng, lat]: the start of the first segment then the end of every segment
+_PATH_FEATURE = f"""
+    json_build_object(
+        'type', 'Feature',
+        'id', pi.path_info_id,
+        'geometry', CASE WHEN seg.first_position IS NULL THEN NULL ELSE json_build_object(
+            'type', 'LineString',
+            'coordinates', (
+                SELECT json_agg(position ORDER BY n)
+                FROM (
+                    SELECT seg.first_position AS position, 0::bigint AS n
+                    UNION ALL
+                    SELECT position, n FROM json_array_elements(seg.end_positions) WITH ORDINALITY AS e(position, n)
+                ) positions
+            )
+        ) END,
+        'properties', {_PATH_RECORD}
+    )
+"""
+
+_EXPORT_QUERY = """
+    SELECT {record}::text
+    FROM PathInfo pi
+    LEFT JOIN LATERAL (
+        SELECT json_agg(json_build_object(
+                   'segmentId', s.segment_id,
+                   'streetName', s.street_name,
+                   'status', s.status,
+                   'startLatitude', s.start_latitude::float8,
+                   'startLongitude', s.start_longitude::float8,
+                   'endLatitude', s.end_latitude::float8,
+                   'endLongitude', s.end_longitude::float8,
+                   'order', s.segment_order,
+                   'lengthMeters', s.length_meters::float8,
+                   'routeGeometry', s.route_geometry,
+                   'obstacles', COALESCE(obs.obstacles, '[]'::json)
+               ) ORDER BY s.segment_order) AS segments,
+               (array_agg(json_build_array(s.start_longitude::float8, s.start_latitude::float8)
+                          ORDER BY s.segment_order))[1] AS first_position,
+               json_agg(json_build_array(s.end_longitude::float8, s.end_latitude::float8)
+                        ORDER BY s.segment_order) AS end_positions
+        FROM Segments s
+        LEFT JOIN LATERAL (
+            SELECT json_agg(json_build_object(
+                       'obstacleId', o.obstacle_id,
+                       'type', o.type,
+                       'severity', o.severity,
+                       'latitude', o.latitude::float8,
+                       'longitude', o.longitude::float8,
+                       'description', o.description,
+                       'reportedDate', o.reported_date
+                   ) ORDER BY o.reported_date, o.obstacle_id) AS obstacles
+            FROM Obstacles o
+            WHERE o.segment_id = s.segment_id
+        ) obs ON TRUE
+        WHERE s.path_info_id = pi.path_info_id
+    ) seg ON TRUE
+    WHERE pi.publishable = TRUE
+      AND (%(after)s::uuid IS NULL OR pi.path_info_id > %(after)s::uuid)
+    ORDER BY pi.path_info_id
+    LIMIT %(limit)s
+"""
+
+
+def stream_public_paths(conn, export_format: str, after: Optional[str], limit: Optional[int],
+                        fetch_size: int) -> Iterator[bytes]:
+    """
+    yields the export as byte chunks. it owns conn (checked out by the caller) and
+    gives it back to the pool when the stream ends or the client goes away.
+    an error halfway through can only end the stream early, the status is already sent
+    """
+    query = _EXPORT_QUERY.format(record=_PATH_FEATURE if export_format == 'geojson' else _PATH_RECORD)
+
+    broken = False
+    cursor = None
+    try:
+        # a named cursor keeps the result on the server, fetch_size rows per round trip
+        cursor = conn.cursor(name="path_export")
+        cursor.itersize = fetch_size
+        cursor.execute(query, {'after': after, 'limit': limit})
+
+        if export_format == 'geojson':
+            prefix, separator, suffix = '{"type":"FeatureCollection","features":[\n', ',\n', '\n]}\n'
+        else:
+            prefix, separator, suffix = '', '\n', '\n'
+
+        chunk = [prefix]
+        chunk_size = len(prefix)
+        count = 0
+        for (record,) in cursor:
+            if count:
+                chunk.append(separator)
+            chunk.append(record)
+            chunk_size += len(record)
+            count += 1
+            if chunk_size >= EXPORT_CHUNK_BYTES:
+                yield "".join(chunk).encode()
+                chunk = []
+                chunk_size = 0
+
+        if count or export_format == 'geojson':
+            chunk.append(suffix)
+        yield "".join(chunk).encode()
+
+        logger.info(f"Exported {count} paths as {export_format}")
+
+    except Exception as e:
+        broken = isinstance(e, (OperationalError, psycopg2.InterfaceError))
+        logger.error(f"Error exporting paths: {e}")
+        raise
+    finally:
+        try:
+            if cursor is not None and not cursor.closed:
+                cursor.close()
+            conn.rollback()
+        except Exception:
+            broken = True
+        return_db_connection(conn, broken=broken)
+
+
+async def _export_chunks(first_chunk: bytes, chunks: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    the rest of the stream, every chunk is read on the threadpool. the finally closes
+    chunks (so gives the conection back) as soon as the stream ends, also when the
+    client went away halfway, instead of whenever the generator gets garbage collected
+    """
+    try:
+        yield first_chunk
+        while True:
+            chunk = await run_in_threadpool(next, chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        # a cancelled request still has to wait for the cleanup to be done
+        with anyio.CancelScope(shield=True):
+            await run_in_threadpool(chunks.close)
+
+
+async def open_export_stream(export_format: str, after: Optional[str], limit: Optional[int],
+                             fetch_size: int) -> AsyncIterator[bytes]:
+    """
+    checks out a conection and starts stream_public_paths before the response begins,
+    so a full pool is still a 503 and a failing query still a 500. the stream has to
+    be sent with ExportStreamingResponse, which closes it however the response ends
+    """
+    conn = await acquire_db_connection()
+    chunks = stream_public_paths(conn, export_format, after, limit, fetch_size)
+    first_chunk = await run_in_threadpool(next, chunks)
+    return _export_chunks(first_chunk, chunks)
+
+
+class ExportStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse leaves a body iterator it stopped reading (the client
+    disconnected or a send failed) to the garbage collector, this one closes it
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            with anyio.CancelScope(shield=True):
+                await self.body_iterator.aclose()
@@ -0,0 +1,442 @@
+from typing import Any, AsyncIterator, Dict, List, Tuple
+import codecs
+import io
+import json
+import uuid
+import logging
+
+import psycopg2
+from pydantic import ValidationError
+
+from app.models.path import ManualPathCreate
+from app.services.path_writer import (
+    build_path_rows, PATH_INFO_COLUMNS, SEGMENT_COLUMNS, ENDPOINT_COLUMNS, OBSTACLE_COLUMNS
+)
+from app.utils.exceptions import ImportFormatException, SegmentNotFoundException
+
+logger = logging.getLogger(__name__)
+
+# bulk import of AUTOMATED paths. the request body is parsed incrementally, one
+# record (NDJSON line or GeoJSON feature) at a time, every record is validated with
+# ManualPathCreate and valid records are loaded in batches: COPY into session temp
+# tables, one set based check of the supplied segment ids, then INSERT ... SELECT
+# into the real tables. memory is bounded by one batch plus one record
+
+IMPORT_FORMATS = ('ndjson', 'geojson')
+
+# the response lists at most this many record errors, failedRecords has the full count
+MAX_REPORTED_IMPORT_ERRORS = 1000
+
+# staging tables live for the whole session (so pooled connections reuse them) and are
+# emptied on every commit. they only carry the columns the import writes, plus the
+# record number so errors and rejected rows can be traced back to the input
+_STAGING_DDL = """
+    CREATE TEMP TABLE IF NOT EXISTS import_path_info (
+        record_no INTEGER NOT NULL,
+        path_info_id UUID NOT NULL,
+        user_id UUID,
+        name TEXT,
+        description TEXT,
+        data_source data_source_type NOT NULL,
+        publishable BOOLEAN NOT NULL,
+        created_date TIMESTAMP NOT NULL
+    ) ON COMMIT DELETE ROWS;
+
+    CREATE TEMP TABLE IF NOT EXISTS import_segments (
+        record_no INTEGER NOT NULL,
+        segment_id UUID NOT NULL,
+        path_info_id UUID NOT NULL,
+        street_name TEXT,
+        status segment_status_type NOT NULL,
+        start_latitude NUMERIC(10, 7) NOT NULL,
+        start_longitude NUMERIC(10, 7) NOT NULL,
+        end_latitude NUMERIC(10, 7) NOT NULL,
+        end_longitude NUMERIC(10, 7) NOT NULL,
+        segment_order INTEGER NOT NULL,
+        length_meters NUMERIC(10, 2) NOT NULL,
+        route_geometry TEXT
+    ) ON COMMIT DELETE ROWS;
+
+    CREATE TEMP TABLE IF NOT EXISTS import_path_endpoints (
+        record_no INTEGER NOT NULL,
+        path_info_id UUID NOT NULL,
+        user_id UUID,
+        publishable BOOLEAN NOT NULL,
+        start_latitude NUMERIC(10, 7) NOT NULL,
+        start_longitude NUMERIC(10, 7) NOT NULL,
+        end_latitude NUMERIC(10, 7) NOT NULL,
+        end_longitude NUMERIC(10, 7) NOT NULL,
+        total_length_meters NUMERIC(12, 2) NOT NULL
+    ) ON COMMIT DELETE ROWS;
+
+    CREATE TEMP TABLE IF NOT EXISTS import_obstacles (
+        record_no INTEGER NOT NULL,
+        obstacle_id UUID NOT NULL,
+        segment_id UUID NOT NULL,
+        type obstacle_type NOT NULL,
+        severity obstacle_severity_type NOT NULL,
+        latitude NUMERIC(10, 7) NOT NULL,
+        longitude NUMERIC(10, 7) NOT NULL,
+        description TEXT,
+        reported_date TIMESTAMP NOT NULL,
+        confirmed BOOLEAN NOT NULL
+    ) ON COMMIT DELETE ROWS;
+"""
+
+# (staging table, target table, columns, key of the build_path_rows result)
+_STAGED_TABLES = (
+    ('import_path_info', 'PathInfo', PATH_INFO_COLUMNS, 'path_info'),
+    ('import_segments', 'Segments', SEGMENT_COLUMNS, 'segments'),
+    ('import_path_endpoints', 'PathEndpoints', ENDPOINT_COLUMNS, 'endpoints'),
+    ('import_obstacles', 'Obstacles', OBSTACLE_COLUMNS, 'obstacles'),
+)
+
+
+async def iter_ndjson_records(chunks: AsyncIterator[bytes], max_record_bytes: int) -> AsyncIterator[Tuple[int, Any, str]]:
+    """
+    yields (line number, parsed object, error) for every non blank line of an NDJSON
+    stream, error is None when the line parsed. an oversized line is reported once
+    and skipped, the stream carries on with the next line
+    """
+    buffer = bytearray()
+    line_no = 0
+    skipping = False
+
+    async for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end < 0:
+                break
+            line_no += 1
+            if skipping:
+                skipping = False
+            else:
+                record = _parse_ndjson_line(line_no, bytes(buffer[start:end]))
+                if record:
+                    yield record
+            start = end + 1
+        del buffer[:start]
+
+        if len(buffer) > max_record_bytes:
+            if not skipping:
+                yield line_no + 1, None, f"Record is larger than {max_record_bytes} bytes"
+                skipping = True
+            buffer.clear()
+
+    if buffer and not skipping:
+        record = _parse_ndjson_line(line_no + 1, bytes(buffer))
+        if record:
+            yield record
+
+
+def _parse_ndjson_line(line_no: int, line: bytes):
+    if not line.strip():
+        return None
+    try:
+        return line_no, json.loads(line), None
+    except ValueError as e:
+        return line_no, None, f"Invalid JSON: {e}"
+
+
+class _JsonStream:
+    """
+    pulls decoded text from a byte stream on demand so single JSON values can be
+    read with raw_decode without holding the whole document
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes], max_value_chars: int):
+        self._chunks = chunks.__aiter__()
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._max_value_chars = max_value_chars
+        self._buffer = ""
+        self._pos = 0
+        # text read but not yet joined onto _buffer, joining every chunk as it comes
+        # would copy the whole value again for each one
+        self._pending: List[str] = []
+        self._pending_chars = 0
+        self._eof = False
+
+    async def _fill(self) -> bool:
+        if self._eof:
+            return False
+        try:
+            chunk = await self._chunks.__anext__()
+            text = self._decoder.decode(chunk)
+        except StopAsyncIteration:
+            self._eof = True
+            text = self._decoder.decode(b"", final=True)
+        except UnicodeDecodeError as e:
+            raise ImportFormatException(f"Body is not valid UTF-8: {e}")
+        self._pending.append(text)
+        self._pending_chars += len(text)
+        return True
+
+    def _join_pending(self):
+        if self._pending:
+            self._buffer = self._buffer[self._pos:] + "".join(self._pending)
+            self._pos = 0
+            self._pending = []
+            self._pending_chars = 0
+
+    async def peek(self) -> str:
+        """next non whitespace character without consuming it, empty at the end of the stream"""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in " \t\r\n":
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not await self._fill():
+                return ""
+            self._join_pending()
+
+    async def expect(self, *chars: str) -> str:
+        char = await self.peek()
+        if char not in chars:
+            found = repr(char) if char else "end of input"
+            raise ImportFormatException(f"Expected {' or '.join(repr(c) for c in chars)} but found {found}")
+        self._pos += 1
+        return char
+
+    async def read_value(self) -> Any:
+        await self.peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._pos)
+                # a number or literal right at the end of the buffer may continue in the next chunk
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except ValueError as e:
+                if self._eof:
+                    raise ImportFormatException(f"Invalid JSON: {e}")
+
+            available = len(self._buffer) - self._pos
+            if available > self._max_value_chars:
+                raise ImportFormatException(f"Record is larger than {self._max_value_chars} bytes")
+
+            # an unfinished value is only decoded again once the text has doubled, so a large
+            # feature arriving in many small chunks is parsed a few times instead of once per chunk
+            wanted = min(2 * available, self._max_value_chars + 1)
+            while available + self._pending_chars < wanted and await self._fill():
+                pass
+            self._join_pending()
+
+
+async def iter_geojson_features(chunks: AsyncIterator[bytes], max_record_bytes: int) -> AsyncIterator[Tuple[int, Any, str]]:
+    """
+    yields (position in the features array starting at 1, feature, None) for every
+    feature of a GeoJSON FeatureCollection. the JSON can not be resynced after a
+    syntax error so those raise ImportFormatException and end the stream
+    """
+    stream = _JsonStream(chunks, max_record_bytes)
+    record_no = 0
+    has_features = False
+
+    await stream.expect("{")
+    if await stream.peek() == "}":
+        raise ImportFormatException("FeatureCollection has no features array")
+
+    while True:
+        key = await stream.read_value()
+        if not isinstance(key, str):
+            raise ImportFormatException("Expected an object key")
+        await stream.expect(":")
+
+        if key == "features":
+            has_features = True
+            await stream.expect("[")
+            if await stream.peek() == "]":
+                await stream.expect("]")
+            else:
+                while True:
+                    record_no += 1
+                    yield record_no, await stream.read_value(), None
+                    if await stream.expect(",", "]") == "]":
+                        break
+        else:
+            # other members (type, name, crs, ...) are small, read them whole
+            value = await stream.read_value()
+            if key == "type" and value != "FeatureCollection":
+                raise ImportFormatException("Body is not a GeoJSON FeatureCollection")
+
+        if await stream.expect(",", "}") == "}":
+            break
+
+    if await stream.peek():
+        raise ImportFormatException("Unexpected data after the FeatureCollection")
+    if not has_features:
+        raise ImportFormatException("FeatureCollection has no features array")
+
+
+def feature_to_path(feature: Any) -> dict:
+    """
+    maps a GeoJSON Feature onto the ManualPathCreate fields. properties carry the path
+    fields, if they have no segments the LineString is split into one segment per pair
+    of positions using properties.status and properties.streetName
+    """
+    if not isinstance(feature, dict) or feature.get("type") != "Feature":
+        raise ValueError("Record is not a GeoJSON Feature")
+
+    properties = dict(feature.get("properties") or {})
+    if "segments" in properties:
+        return properties
+
+    geometry = feature.get("geometry") or {}
+    if geometry.get("type") != "LineString":
+        raise ValueError("Feature geometry must be a LineString when properties.segments is not given")
+
+    coordinates = geometry.get("coordinates") or []
+    if len(coordinates) < 2:
+        raise ValueError("LineString must have at least 2 positions")
+
+    status = properties.pop("status", None)
+    street_name = properties.pop("streetName", None)
+    try:
+        # GeoJSON positions are [lng, lat]
+        properties["segments"] = [
+            {
+                "streetName": street_name,
+                "status": status,
+                "startLatitude": start[1],
+                "startLongitude": start[0],
+                "endLatitude": end[1],
+                "endLongitude": end[0],
+                "order": order
+            }
+            for order, (start, end) in enumerate(zip(coordinates, coordinates[1:]))
+        ]
+    except (TypeError, IndexError, KeyError):
+        raise ValueError("LineString has invalid positions")
+
+    return properties
+
+
+def parse_import_record(record: Any, import_format: str) -> ManualPathCreate:
+    """validates one record, raises ValueError (pydantic's ValidationError is one) with the reason"""
+    if import_format == 'geojson':
+        record = feature_to_path(record)
+    elif not isinstance(record, dict):
+        raise ValueError("Record must be a JSON object")
+
+    path_data = ManualPathCreate.model_validate(record)
+
+    # supplied segment ids are checked against the db in the batch, the format is checked here
+    # so one bad id can not fail the COPY of a whole batch
+    for obstacle in path_data.obstacles or []:
+        if obstacle.segmentId is not None:
+            try:
+                uuid.UUID(obstacle.segmentId)
+            except ValueError:
+                raise ValueError(f"Segment {obstacle.segmentId} not found")
+
+    return path_data
+
+
+def describe_record_error(e: Exception) -> str:
+    """client facing reason a record was rejected"""
+    if isinstance(e, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in error['loc']) or 'record'}: {error['msg']}"
+            for error in e.errors()
+        )
+    if isinstance(e, (psycopg2.DataError, psycopg2.IntegrityError)):
+        # e.g. a name longer than the column allows, only reached when a record is stored on its own
+        return f"Record could not be stored: {str(e).splitlines()[0]}"
+    if isinstance(e, ValueError):
+        return str(e)
+    return "Record could not be stored"
+
+
+def _copy_value(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, str):
+        return (value.replace("\\", "\\\\").replace("\t", "\\t")
+                .replace("\n", "\\n").replace("\r", "\\r"))
+    if isinstance(value, float):
+        return repr(float(value))
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _copy_rows(cursor, table: str, columns, rows: List[tuple]):
+    """streams rows into table with COPY (text format), row[0] is the record number"""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} (record_no, {', '.join(columns)}) FROM STDIN", buffer)
+
+
+def load_import_batch(conn, records: List[Tuple[int, ManualPathCreate]], user_id: str) -> Dict[str, Any]:
+    """
+    stores a batch of validated records as AUTOMATED paths in one transaction.
+    records that can not be stored (an obstacle without a segment within 50m or an
+    unknown segmentId) are left out and reported, the rest of the batch is committed.
+    returns counts, the per-record errors and the build_path_rows result of every stored path
+    """
+    errors = []
+    built = []
+    for record_no, path_data in records:
+        try:
+            built.append((record_no, build_path_rows(path_data, user_id, 'AUTOMATED')))
+        except SegmentNotFoundException as e:
+            errors.append((record_no, str(e)))
+
+    if not built:
+        return {'paths': 0, 'segments': 0, 'obstacles': 0, 'errors': errors, 'stored': []}
+
+    cursor = conn.cursor()
+    cursor.execute(_STAGING_DDL)
+
+    for staging_table, _, columns, key in _STAGED_TABLES:
+        staged = []
+        for record_no, rows in built:
+            table_rows = rows[key]
+            if key in ('path_info', 'endpoints'):
+                table_rows = [table_rows] if table_rows else []
+            staged.extend((record_no,) + row for row in table_rows)
+        if staged:
+            _copy_rows(cursor, staging_table, columns, staged)
+
+    # supplied segment ids have to exist already, matched ones point into this batch
+    cursor.execute("""
+        SELECT o.record_no, min(o.segment_id::text)
+        FROM import_obstacles o
+        WHERE NOT EXISTS (SELECT 1 FROM Segments s WHERE s.segment_id = o.segment_id)
+          AND NOT EXISTS (SELECT 1 FROM import_segments i WHERE i.segment_id = o.segment_id)
+        GROUP BY o.record_no
+    """)
+    rejected = dict(cursor.fetchall())
+
+    if rejected:
+        for staging_table, _, _, _ in _STAGED_TABLES:
+            cursor.execute(f"DELETE FROM {staging_table} WHERE record_no = ANY(%s)", (list(rejected),))
+        errors.extend((record_no, f"Segment {segment_id} not found") for record_no, segment_id in rejected.items())
+        built = [(record_no, rows) for record_no, rows in built if record_no not in rejected]
+
+    # parents first so the foreign keys hold
+    for staging_table, target_table, columns, _ in _STAGED_TABLES:
+        cursor.execute(f"""
+            INSERT INTO {target_table} ({', '.join(columns)})
+            SELECT {', '.join(columns)} FROM {staging_table}
+        """)
+
+    conn.commit()
+    cursor.close()
+
+    errors.sort()
+    return {
+        'paths': len(built),
+        'segments': sum(len(rows['segments']) for _, rows in built),
+        'obstacles': sum(len(rows['obstacles']) for _, rows in built),
+        'errors': errors,
+        'stored': [rows for _, rows in built]
+    }
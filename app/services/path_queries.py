@@ -0,0 +1,155 @@
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# every loader here runs a fixed number of statements no matter how many
+# paths or segments are involved, so the routes never fall back into N+1 loops
+
+
+def fetch_endpoint_candidates(cursor, user_id: Optional[str],
+                              origin_box: Tuple[float, float, float, float],
+                              dest_box: Tuple[float, float, float, float]) -> List[tuple]:
+    """
+    returns (path_info_id, start_lat, start_lon, end_lat, end_lon) from PathEndpoints
+    for the visible paths whose start lies in origin_box and whose end lies in dest_box.
+    boxes are (min_lat, max_lat, min_lon, max_lon) from get_bounding_box, the
+    caller still has to do the exact radius check on the rows returned
+    """
+    if user_id:
+        visibility_clause = "(pe.publishable = TRUE OR (pe.publishable = FALSE AND pe.user_id = %s))"
+        params = (user_id,)
+    else:
+        visibility_clause = "pe.publishable = TRUE"
+        params = ()
+
+    cursor.execute(f"""
+        SELECT pe.path_info_id, pe.start_latitude, pe.start_longitude,
+               pe.end_latitude, pe.end_longitude
+        FROM PathEndpoints pe
+        WHERE {visibility_clause}
+          AND pe.start_latitude BETWEEN %s AND %s
+          AND pe.start_longitude BETWEEN %s AND %s
+          AND pe.end_latitude BETWEEN %s AND %s
+          AND pe.end_longitude BETWEEN %s AND %s
+        ORDER BY pe.path_info_id
+    """, params + tuple(origin_box) + tuple(dest_box))
+
+    return cursor.fetchall()
+
+
+def fetch_ranked_path_stats(cursor, path_ids: List[str], limit: Optional[int] = None,
+                            after: Optional[Tuple[Decimal, str]] = None) -> List[tuple]:
+    """
+    returns (path_info_id, score, total_distance_m) of the given paths, best (lowest)
+    score first with ties broken by id. the stats are kept up to date on PathInfo by the
+    path stats triggers. with a limit postgres keeps only the best rows in a bounded
+    heap (top-N heapsort) instead of sorting every candidate, after is the
+    (score, path_info_id) keyset of the last row of the previous page
+    """
+    if not path_ids:
+        return []
+
+    keyset_clause = ""
+    params = [list(path_ids)]
+    if after is not None:
+        keyset_clause = "AND (score, path_info_id) > (%s, %s::uuid)"
+        params.extend(after)
+
+    cursor.execute(f"""
+        SELECT path_info_id, score, total_distance_m
+        FROM PathInfo
+        WHERE path_info_id = ANY(%s::uuid[])
+          {keyset_clause}
+        ORDER BY score, path_info_id
+        LIMIT %s
+    """, params + [limit])
+
+    return cursor.fetchall()
+
+
+def fetch_segments_by_path(cursor, path_ids: List[str], include_geometry: bool = False) -> Dict[str, List[tuple]]:
+    """
+    loads the ordered segments of all given paths in one query.
+    the encoded route_geometry is only read when asked for, it is then the 10th column
+    """
+    segments_by_path = {path_id: [] for path_id in path_ids}
+    if not path_ids:
+        return segments_by_path
+
+    geometry_column = "route_geometry," if include_geometry else ""
+
+    cursor.execute(f"""
+        SELECT segment_id, street_name, status,
+               start_latitude, start_longitude, end_latitude, end_longitude,
+               segment_order, length_meters, {geometry_column} path_info_id
+        FROM Segments
+        WHERE path_info_id = ANY(%s::uuid[])
+        ORDER BY path_info_id, segment_order
+    """, (list(path_ids),))
+
+    for row in cursor.fetchall():
+        segments_by_path[row[-1]].append(row[:-1])
+
+    return segments_by_path
+
+
+def fetch_segments_by_id(cursor, segment_ids: List[str]) -> Dict[str, tuple]:
+    """
+    loads the given segments in one query, keyed by segment id, with the same
+    columns as fetch_segments_by_path
+    """
+    if not segment_ids:
+        return {}
+
+    cursor.execute("""
+        SELECT segment_id, street_name, status,
+               start_latitude, start_longitude, end_latitude, end_longitude,
+               segment_order, length_meters
+        FROM Segments
+        WHERE segment_id = ANY(%s::uuid[])
+    """, (list(segment_ids),))
+
+    return {row[0]: row for row in cursor.fetchall()}
+
+
+def fetch_obstacles_by_segment(cursor, segment_ids: List[str]) -> Dict[str, List[tuple]]:
+    """
+    loads the obstacles of all given segments in one query, grouped by segment.
+    obstacles of a segment always come back in the same order (report date, then id)
+    so the response bodies built from them are stable
+    """
+    obstacles_by_segment = {segment_id: [] for segment_id in segment_ids}
+    if not segment_ids:
+        return obstacles_by_segment
+
+    cursor.execute("""
+        SELECT obstacle_id, type, severity, latitude, longitude, description, segment_id
+        FROM Obstacles
+        WHERE segment_id = ANY(%s::uuid[])
+        ORDER BY reported_date, obstacle_id
+    """, (list(segment_ids),))
+
+    for row in cursor.fetchall():
+        obstacles_by_segment[row[6]].append(row[:6])
+
+    return obstacles_by_segment
+
+
+def fetch_segment_paths(cursor, segment_ids: Iterable[str]) -> Dict[str, str]:
+    """
+    checks many segment ids in one query, returns the path of every given id
+    (keyed exactly as it was passed in) that exists in Segments
+    """
+    segment_ids = list(segment_ids)
+    if not segment_ids:
+        return {}
+
+    cursor.execute("""
+        SELECT requested.segment_id, s.path_info_id
+        FROM unnest(%s::text[]) AS requested(segment_id)
+        JOIN Segments s ON s.segment_id = requested.segment_id::uuid
+    """, (segment_ids,))
+
+    return {row[0]: row[1] for row in cursor.fetchall()}
@@ -0,0 +1,114 @@
+from typing import Dict, List, Optional, Sequence
+import orjson
+from fastapi.responses import Response
+
+from app.utils.compression import etag_matches
+
+# response bodies of the read endpoints built straight from the db rows of
+# path_queries into JSON bytes. the routes keep their response_model for the
+# OpenAPI schema, returning a Response skips FastAPI's validation and serialization.
+# keys and their order follow the pydantic models in app/models/path.py, so the
+# bytes are the same as what FastAPI would have sent for the model
+
+
+class PreRenderedJSONResponse(Response):
+    """a JSON response whose body is already encoded (or is encoded with orjson)"""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return orjson.dumps(content)
+
+
+def obstacle_json(obs: Sequence) -> dict:
+    """ObstacleResponse from a fetch_obstacles_by_segment row"""
+    return {
+        "obstacleId": obs[0],
+        "type": obs[1],
+        "severity": obs[2],
+        "latitude": float(obs[3]),
+        "longitude": float(obs[4]),
+        "description": obs[5]
+    }
+
+
+def segment_json(seg: Sequence, obstacles: List[Sequence], include_geometry: bool = False) -> dict:
+    """
+    SegmentResponse from a fetch_segments_by_path row. routeGeometry (the 10th column)
+    is only there when include_geometry is set, like an unset field with exclude_unset
+    """
+    segment = {
+        "segmentId": seg[0],
+        "streetName": seg[1],
+        "status": seg[2],
+        "startLatitude": float(seg[3]),
+        "startLongitude": float(seg[4]),
+        "endLatitude": float(seg[5]),
+        "endLongitude": float(seg[6]),
+        "obstacles": [obstacle_json(obs) for obs in obstacles]
+    }
+    if include_geometry:
+        segment["routeGeometry"] = seg[9]
+    return segment
+
+
+def path_detail_etag(path_id: str, version: int, include_geometry: bool) -> str:
+    """strong ETag of a PathDetailResponse, PathInfo.version changes with every change of the path"""
+    variant = "geometry" if include_geometry else "plain"
+    return f'"{path_id}-{version}-{variant}"'
+
+
+def path_detail_response(etag: str, body: Optional[bytes], if_none_match: Optional[str]) -> Response:
+    """the detail body with its ETag, or a 304 when the client already has that version (body may then be None)"""
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if body is None or etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return PreRenderedJSONResponse(body, headers=headers)
+
+
+def path_detail_body(path_info: Sequence, segments: List[Sequence],
+                     obstacles_by_segment: Dict[str, List[Sequence]], include_geometry: bool) -> bytes:
+    """PathDetailResponse, path_info is the row selected by _load_path_details"""
+    return orjson.dumps({
+        "pathInfoId": path_info[0],
+        "name": path_info[2],
+        "description": path_info[3],
+        "dataSource": path_info[4],
+        "createdDate": path_info[6],
+        "totalDistance": round(float(path_info[8]) / 1000, 2),
+        "score": float(path_info[7]),
+        "segments": [
+            segment_json(seg, obstacles_by_segment[seg[0]], include_geometry) for seg in segments
+        ]
+    })
+
+
+def route_json(path_id: str, score, total_distance_m, segments: List[Sequence],
+               obstacles_by_segment: Dict[str, List[Sequence]]) -> dict:
+    """RouteResponse of one ranked path"""
+    return {
+        "routeId": path_id,
+        "score": float(score),
+        "totalDistance": round(float(total_distance_m) / 1000, 2),
+        "segments": [segment_json(seg, obstacles_by_segment[seg[0]]) for seg in segments]
+    }
+
+
+def routes_search_body(routes: List[dict], next_cursor: Optional[str]) -> bytes:
+    """RoutesSearchResponse, nextCursor is left out on the last page"""
+    body = {"routes": routes}
+    if next_cursor is not None:
+        body["nextCursor"] = next_cursor
+    return orjson.dumps(body)
+
+
+def planned_route_body(score: float, length_meters: float, path_ids: List[str],
+                       segments: List[dict]) -> bytes:
+    """PlannedRouteResponse, segments are segment_json dicts already carrying pathInfoId and reversed"""
+    return orjson.dumps({
+        "score": round(score, 2),
+        "totalDistance": round(length_meters / 1000, 2),
+        "pathIds": path_ids,
+        "segments": segments
+    })
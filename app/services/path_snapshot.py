@@ -0,0 +1,281 @@
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+import gc
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import uuid
+import logging
+
+import numpy as np
+
+from app.config.database import get_db_connection, return_db_connection
+from app.config.settings import settings
+from app.services.routing_graph import (
+    routing_graph, build_routing_graph, HIGH_WATER_QUERY, SEGMENT_ROWS_QUERY, OBSTACLE_ROWS_QUERY
+)
+from app.services.spatial_index import path_endpoint_index, build_path_endpoint_index
+
+logger = logging.getLogger(__name__)
+
+# startup state of the in-memory read paths (routing graph and endpoint index) kept
+# in one columnar file next to the service. at startup the file is mmap'ed, its
+# columns are read as numpy views straight from the page cache and only what changed
+# since its high water mark is read from postgres. without a usable file everything
+# is built from the tables and a new file is written in the background.
+#
+# layout: SNAPSHOT_MAGIC, header length (uint64 LE), JSON header, then every column
+# as raw little endian array data at a 64 byte aligned offset listed in the header
+
+SNAPSHOT_MAGIC = b"BBPSNAP1"
+SNAPSHOT_VERSION = 1
+_ALIGNMENT = 64
+
+# a recreated database gets a new oid, a snapshot of the old one is not used
+_DATABASE_OID_QUERY = "SELECT oid FROM pg_database WHERE datname = current_database()"
+
+_ENDPOINT_ROWS_QUERY = """
+    SELECT pe.path_info_id, pe.user_id, pe.publishable,
+           pe.start_latitude, pe.start_longitude, pe.end_latitude, pe.end_longitude
+    FROM PathEndpoints pe
+    JOIN PathInfo pi ON pi.path_info_id = pe.path_info_id
+    WHERE pi.created_date >= %s
+"""
+
+_write_lock = threading.Lock()
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def write_snapshot(file_path: str, header: dict, columns: Dict[str, np.ndarray]):
+    """writes the file next to file_path and renames it over, readers never see half a snapshot"""
+    arrays = {}
+    offset = 0
+    for name, column in columns.items():
+        column = np.ascontiguousarray(column)
+        columns[name] = column
+        arrays[name] = {'dtype': column.dtype.str, 'shape': list(column.shape), 'offset': offset}
+        offset = _aligned(offset + column.nbytes)
+
+    header_bytes = json.dumps(dict(header, version=SNAPSHOT_VERSION, arrays=arrays)).encode()
+    data_start = _aligned(len(SNAPSHOT_MAGIC) + 8 + len(header_bytes))
+
+    directory = os.path.dirname(file_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    temp_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(struct.pack('<Q', len(header_bytes)))
+            f.write(header_bytes)
+            for name, column in columns.items():
+                if column.nbytes:
+                    f.seek(data_start + arrays[name]['offset'])
+                    f.write(memoryview(column).cast('B'))
+            # padding after the last column is part of the file, empty columns still fit in it
+            f.truncate(data_start + offset)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def read_snapshot(file_path: str) -> Tuple[dict, Dict[str, np.ndarray]]:
+    """
+    maps the file read only and returns its header and columns. the columns are views
+    on the mapping (nothing is copied), it is unmapped once the last of them is gone
+    """
+    with open(file_path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if mapped[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise ValueError("not a path snapshot")
+    (header_length,) = struct.unpack_from('<Q', mapped, len(SNAPSHOT_MAGIC))
+    header_start = len(SNAPSHOT_MAGIC) + 8
+    header = json.loads(mapped[header_start:header_start + header_length])
+    if header.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f"snapshot version {header.get('version')} is not {SNAPSHOT_VERSION}")
+
+    data_start = _aligned(header_start + header_length)
+    columns = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape']))
+        columns[name] = np.frombuffer(
+            mapped, dtype=dtype, count=count, offset=data_start + spec['offset']
+        ).reshape(spec['shape'])
+
+    return header, columns
+
+
+def _endpoint_rows(columns: Dict[str, np.ndarray]):
+    """endpoint index rows of every path: start of its first segment, end of its last one"""
+    offsets = columns['path_offsets']
+    points = columns['edge_points']
+    first_edges, last_edges = offsets[:-1], offsets[1:] - 1
+
+    return zip(
+        np.char.decode(columns['path_ids'], 'ascii').tolist(),
+        [owner or None for owner in np.char.decode(columns['path_owners'], 'ascii').tolist()],
+        columns['path_public'].astype(bool).tolist(),
+        points[first_edges, 0].tolist(), points[first_edges, 1].tolist(),
+        points[last_edges, 2].tolist(), points[last_edges, 3].tolist()
+    )
+
+
+def _read_changes(conn, since: datetime) -> dict:
+    """everything written from since on, read in one consistent transaction"""
+    cursor = conn.cursor()
+    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+
+    cursor.execute(_DATABASE_OID_QUERY)
+    database_oid = cursor.fetchone()[0]
+    cursor.execute(HIGH_WATER_QUERY)
+    high_water = cursor.fetchone()[0]
+    cursor.execute(SEGMENT_ROWS_QUERY.format(where="WHERE pi.created_date >= %s"), (since,))
+    segment_rows = cursor.fetchall()
+    cursor.execute(OBSTACLE_ROWS_QUERY.format(where="WHERE o.reported_date >= %s"), (since,))
+    obstacle_rows = cursor.fetchall()
+    cursor.execute(_ENDPOINT_ROWS_QUERY, (since,))
+    endpoint_rows = cursor.fetchall()
+
+    cursor.close()
+    conn.rollback()
+
+    return {
+        'database_oid': database_oid,
+        'high_water': high_water,
+        'segments': segment_rows,
+        'obstacles': obstacle_rows,
+        'endpoints': endpoint_rows
+    }
+
+
+def load_path_snapshot(file_path: str) -> Optional[bool]:
+    """
+    loads routing_graph and path_endpoint_index from the snapshot and catches up with
+    what was written after it. returns None when the snapshot can not be used,
+    otherwise whether anything newer than the snapshot was found
+    """
+    started = time.monotonic()
+    try:
+        header, columns = read_snapshot(file_path)
+    except FileNotFoundError:
+        logger.info(f"No path snapshot at {file_path}")
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable path snapshot {file_path}: {e}")
+        return None
+
+    if header.get('snap_meters') != routing_graph.snap_meters:
+        logger.info(f"Path snapshot was built with ROUTING_SNAP_METERS={header.get('snap_meters')}, rebuilding")
+        return None
+
+    snapshot_high_water = datetime.fromisoformat(header['high_water']) if header.get('high_water') else None
+
+    # writes can commit a little out of created_date order (and come from other hosts),
+    # so the catch up starts a bit before the high water mark and skips what is known
+    since = snapshot_high_water - timedelta(seconds=settings.PATH_SNAPSHOT_OVERLAP_SECONDS) \
+        if snapshot_high_water else datetime.min
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        changes = _read_changes(conn, since)
+    except Exception as e:
+        logger.error(f"Error reading changes since the path snapshot: {e}")
+        return None
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+    if changes['database_oid'] != header.get('database_oid'):
+        logger.info("Path snapshot belongs to another database, rebuilding")
+        return None
+
+    # segments already in the graph are skipped by it, obstacles have to be filtered here
+    obstacle_rows = changes['obstacles']
+    if obstacle_rows and len(columns['obstacle_ids']):
+        known = np.isin(np.array([str(row[0]) for row in obstacle_rows], dtype='S36'), columns['obstacle_ids'])
+        obstacle_rows = [row for row, is_known in zip(obstacle_rows, known.tolist()) if not is_known]
+
+    routing_graph.load_columns(columns, snapshot_high_water)
+    path_endpoint_index.load(_endpoint_rows(columns))
+
+    routing_graph.apply_changes(changes['segments'], obstacle_rows, changes['high_water'])
+    for row in changes['endpoints']:
+        path_endpoint_index.add(*row)
+
+    has_changes = routing_graph.high_water != snapshot_high_water
+    logger.info(
+        f"Loaded path snapshot {file_path} ({len(routing_graph)} segments, {len(path_endpoint_index)} paths) "
+        f"in {time.monotonic() - started:.2f}s, {len(changes['segments'])} segments and "
+        f"{len(obstacle_rows)} obstacles read since {since}"
+    )
+    return has_changes
+
+
+def save_path_snapshot(file_path: str):
+    """writes the current routing graph as the snapshot (the endpoint index is derived from it)"""
+    started = time.monotonic()
+    try:
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(_DATABASE_OID_QUERY)
+            database_oid = cursor.fetchone()[0]
+            cursor.close()
+            conn.rollback()
+        finally:
+            return_db_connection(conn)
+
+        with _write_lock:
+            high_water, columns = routing_graph.export_columns()
+            write_snapshot(file_path, {
+                'snap_meters': routing_graph.snap_meters,
+                'high_water': high_water.isoformat() if high_water else None,
+                'database_oid': database_oid,
+                'written_at': datetime.now().isoformat()
+            }, columns)
+
+        logger.info(f"Path snapshot written to {file_path} ({os.path.getsize(file_path)} bytes) in {time.monotonic() - started:.2f}s")
+
+    except Exception as e:
+        # the next start just builds from the tables again
+        logger.error(f"Error writing path snapshot: {e}")
+
+
+def load_path_indexes():
+    """
+    startup: fills routing_graph and path_endpoint_index from the snapshot when there
+    is a usable one, otherwise from the tables. a new snapshot is written in the
+    background whenever the one on disk was missing or behind
+    """
+    file_path = settings.PATH_SNAPSHOT_FILE
+
+    # millions of small objects are created here and none of them is garbage, collecting
+    # in between only costs time. frozen afterwards they are skipped by every later
+    # collection too
+    gc.disable()
+    try:
+        has_changes = load_path_snapshot(file_path) if file_path else None
+        if has_changes is None:
+            build_path_endpoint_index()
+            build_routing_graph()
+            has_changes = True
+    finally:
+        gc.freeze()
+        gc.enable()
+
+    if file_path and has_changes and routing_graph.is_loaded:
+        threading.Thread(target=save_path_snapshot, args=(file_path,), name="path-snapshot", daemon=True).start()
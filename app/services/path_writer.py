@@ -0,0 +1,187 @@
+from datetime import datetime
+from typing import Optional, Set
+import uuid
+import logging
+
+from psycopg2.extras import execute_values
+
+from app.models.path import ManualPathCreate
+from app.utils.exceptions import SegmentNotFoundException
+from app.utils.geo_utils import haversine_distances, match_obstacles_to_segments
+from app.utils.polyline import encode_polylines
+
+logger = logging.getLogger(__name__)
+
+# rows per multi-row INSERT statement, a few hundred segments go out in one round trip
+BULK_INSERT_PAGE_SIZE = 1000
+
+# max distance between an obstacle and the segment it gets attached to
+OBSTACLE_MATCH_DISTANCE_METERS = 50.0
+
+# column order of the row tuples built below, shared by the INSERTs and the import COPY
+PATH_INFO_COLUMNS = (
+    'path_info_id', 'user_id', 'name', 'description', 'data_source', 'publishable', 'created_date'
+)
+SEGMENT_COLUMNS = (
+    'segment_id', 'path_info_id', 'street_name', 'status',
+    'start_latitude', 'start_longitude', 'end_latitude', 'end_longitude',
+    'segment_order', 'length_meters', 'route_geometry'
+)
+ENDPOINT_COLUMNS = (
+    'path_info_id', 'user_id', 'publishable',
+    'start_latitude', 'start_longitude', 'end_latitude', 'end_longitude',
+    'total_length_meters'
+)
+OBSTACLE_COLUMNS = (
+    'obstacle_id', 'segment_id', 'type', 'severity',
+    'latitude', 'longitude', 'description', 'reported_date', 'confirmed'
+)
+
+
+def build_path_rows(path_data: ManualPathCreate, user_id: str, data_source: str = 'MANUAL',
+                    existing_segment_ids: Optional[Set[str]] = None) -> dict:
+    """
+    turns a validated path into the rows to write, without touching the db.
+    returns {'path_info': row, 'segments': [rows], 'endpoints': row or None, 'obstacles': [rows]}
+    in the *_COLUMNS order.
+
+    obstacles without a segmentId are attached to the nearest segment of the path.
+    raises SegmentNotFoundException (the message is the client facing error) when an
+    obstacle has no segment within 50m, or when existing_segment_ids is given and an
+    obstacle's segmentId is not in it
+    """
+    path_info_id = str(uuid.uuid4())
+
+    path_info_row = (
+        path_info_id,
+        user_id,
+        path_data.name,
+        path_data.description,
+        data_source,
+        path_data.publishable,
+        datetime.now()
+    )
+
+    segment_rows = []
+    segments_for_matching = []
+    total_length_meters = 0.0
+
+    # every geometry of the path is encoded in one vectorized pass, same for the lengths
+    encoded_geometries = encode_polylines([segment.routeGeometry for segment in path_data.segments])
+    segment_lengths = haversine_distances(
+        [segment.startLatitude for segment in path_data.segments],
+        [segment.startLongitude for segment in path_data.segments],
+        [segment.endLatitude for segment in path_data.segments],
+        [segment.endLongitude for segment in path_data.segments]
+    ).tolist()
+
+    for idx, segment in enumerate(path_data.segments):
+        segment_id = str(uuid.uuid4())
+
+        length_meters = segment_lengths[idx]
+        total_length_meters += round(length_meters, 2)
+
+        segment_rows.append((
+            segment_id,
+            path_info_id,
+            segment.streetName,
+            segment.status.value,
+            segment.startLatitude,
+            segment.startLongitude,
+            segment.endLatitude,
+            segment.endLongitude,
+            segment.order,
+            length_meters,
+            encoded_geometries[idx]
+        ))
+
+        segments_for_matching.append({
+            'segment_id': segment_id,
+            'start_latitude': segment.startLatitude,
+            'start_longitude': segment.startLongitude,
+            'end_latitude': segment.endLatitude,
+            'end_longitude': segment.endLongitude,
+            'route_geometry': segment.routeGeometry  # include all route pts for acurate matching
+        })
+
+        logger.debug(f"Segment {idx}: start=({segment.startLatitude}, {segment.startLongitude}), end=({segment.endLatitude}, {segment.endLongitude}), routeGeometry points: {len(segment.routeGeometry) if segment.routeGeometry else 0}")
+
+    endpoint_row = None
+    if path_data.segments:
+        # endpoint summary used by search to prefilter paths, same transaction as the segments
+        first_segment = min(path_data.segments, key=lambda s: s.order)
+        last_segment = max(path_data.segments, key=lambda s: s.order)
+
+        endpoint_row = (
+            path_info_id,
+            user_id,
+            path_data.publishable,
+            first_segment.startLatitude,
+            first_segment.startLongitude,
+            last_segment.endLatitude,
+            last_segment.endLongitude,
+            total_length_meters
+        )
+
+    obstacle_rows = []
+    if path_data.obstacles:
+        # all obstacles without a segmentId are matched in one batch against every edge
+        matched_segment_ids = iter(match_obstacles_to_segments(
+            [(o.latitude, o.longitude) for o in path_data.obstacles if o.segmentId is None],
+            segments_for_matching,
+            max_distance_meters=OBSTACLE_MATCH_DISTANCE_METERS
+        ))
+
+        for obstacle in path_data.obstacles:
+            target_segment_id = obstacle.segmentId
+
+            if target_segment_id is None:
+                target_segment_id = next(matched_segment_ids)
+
+                if target_segment_id is None:
+                    logger.error(f"No segment found within 50m of obstacle at ({obstacle.latitude}, {obstacle.longitude}). Segments: {len(segments_for_matching)}")
+                    raise SegmentNotFoundException(
+                        f"No segment found within 50m of obstacle at ({obstacle.latitude}, {obstacle.longitude})"
+                    )
+
+                logger.debug(f"Auto-associated obstacle at ({obstacle.latitude}, {obstacle.longitude}) to segment {target_segment_id}")
+            elif existing_segment_ids is not None and target_segment_id not in existing_segment_ids:
+                raise SegmentNotFoundException(f"Segment {target_segment_id} not found")
+
+            obstacle_rows.append((
+                str(uuid.uuid4()),
+                target_segment_id,
+                obstacle.type.value,
+                obstacle.severity.value,
+                obstacle.latitude,
+                obstacle.longitude,
+                obstacle.description,
+                datetime.now(),
+                True
+            ))
+
+    return {
+        'path_info': path_info_row,
+        'segments': segment_rows,
+        'endpoints': endpoint_row,
+        'obstacles': obstacle_rows
+    }
+
+
+def insert_path_rows(cursor, rows: dict):
+    """writes the rows of build_path_rows with one multi-row INSERT per table, the caller commits"""
+    cursor.execute(f"""
+        INSERT INTO PathInfo ({', '.join(PATH_INFO_COLUMNS)})
+        VALUES ({', '.join(['%s'] * len(PATH_INFO_COLUMNS))})
+    """, rows['path_info'])
+
+    for table, columns, table_rows in (
+        ('Segments', SEGMENT_COLUMNS, rows['segments']),
+        ('PathEndpoints', ENDPOINT_COLUMNS, [rows['endpoints']] if rows['endpoints'] else []),
+        ('Obstacles', OBSTACLE_COLUMNS, rows['obstacles'])
+    ):
+        if table_rows:
+            execute_values(cursor, f"""
+                INSERT INTO {table} ({', '.join(columns)})
+                VALUES %s
+            """, table_rows, page_size=BULK_INSERT_PAGE_SIZE)
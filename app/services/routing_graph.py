@@ -0,0 +1,457 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import heapq
+import math
+import threading
+import logging
+
+import numpy as np
+
+from app.config.database import get_db_connection, return_db_connection
+from app.config.settings import settings
+from app.utils.geo_utils import (
+    calculate_haversine_distance, calculate_segment_score, get_bounding_box,
+    EARTH_RADIUS_METERS, STATUS_MULTIPLIERS, SEVERITY_PENALTIES
+)
+
+logger = logging.getLogger(__name__)
+
+# int8 codes of statuses and severities in exported columns
+STATUS_CODES = {status: code for code, status in enumerate(STATUS_MULTIPLIERS)}
+SEVERITY_CODES = {severity: code for code, severity in enumerate(SEVERITY_PENALTIES)}
+
+
+class RoutingGraph:
+    """
+    in-memory graph over every stored segment, used to plan a route that stitches
+    segments of several paths together.
+
+    nodes are segment endpoints snapped together when they are within snap_meters of
+    each other, edges are the segments and can be ridden both ways. an edge weighs
+    what calculate_path_score charges for the segment (length x status multiplier +
+    obstacle penalties) so the score of a planned route reads like a path score.
+    every edge keeps the owner and publishable flag of its path and the search only
+    walks the edges the caller may see.
+
+    nodes are bucketed in a grid of cell_size_meters cells for snapping and for
+    finding where a route can start and end. like the endpoint index it is per
+    process and is kept up to date by the writes of this process. high_water is the
+    latest created_date / reported_date it holds, see path_snapshot
+    """
+
+    def __init__(self, snap_meters: float, cell_size_meters: float):
+        self.snap_meters = snap_meters
+        self._cell_deg = math.degrees(max(cell_size_meters, snap_meters) / EARTH_RADIUS_METERS)
+        self._lock = threading.Lock()
+        self._clear_locked()
+        self.is_loaded = False
+
+    def _clear_locked(self):
+        self.high_water: Optional[datetime] = None
+
+        self._node_lats: List[float] = []
+        self._node_lons: List[float] = []
+        self._node_points: List[Tuple[float, float, float]] = []  # on a sphere of EARTH_RADIUS_METERS
+        self._node_cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        self._adjacency: List[List[Tuple[int, int]]] = []  # node -> [(neighbour node, edge)]
+
+        # edges are columns indexed by edge number
+        self._edge_segments: List[str] = []
+        self._edge_paths: List[str] = []
+        self._edge_nodes: List[Tuple[int, int]] = []
+        self._edge_points: List[Tuple[float, float, float, float]] = []  # segment start and end as stored
+        self._edge_statuses: List[str] = []
+        self._edge_owners: List[Optional[str]] = []
+        self._edge_public: List[bool] = []
+        self._edge_lengths: List[float] = []
+        self._edge_weights: List[float] = []
+        self._edge_costs: List[float] = []
+        self._segment_edges: Dict[str, int] = {}
+
+        self._obstacle_ids: List[str] = []
+        self._obstacle_edges: List[int] = []
+        self._obstacle_severities: List[str] = []
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lat / self._cell_deg), math.floor(lon / self._cell_deg))
+
+    def _nodes_within(self, lat: float, lon: float, radius_meters: float) -> List[Tuple[float, int]]:
+        """(distance, node) of every node within radius_meters, nearest first"""
+        min_lat, max_lat, min_lon, max_lon = get_bounding_box(lat, lon, radius_meters)
+        min_row, max_row = math.floor(min_lat / self._cell_deg), math.floor(max_lat / self._cell_deg)
+        min_col, max_col = math.floor(min_lon / self._cell_deg), math.floor(max_lon / self._cell_deg)
+
+        found = []
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                for node in self._node_cells.get((row, col), ()):
+                    distance = calculate_haversine_distance(lat, lon, self._node_lats[node], self._node_lons[node])
+                    if distance <= radius_meters:
+                        found.append((distance, node))
+        found.sort()
+        return found
+
+    def _node_for(self, lat: float, lon: float) -> int:
+        """nearest node within snap_meters of the point, a new node when there is none"""
+        nearby = self._nodes_within(lat, lon, self.snap_meters)
+        if nearby:
+            return nearby[0][1]
+
+        node = len(self._node_lats)
+        self._node_lats.append(lat)
+        self._node_lons.append(lon)
+        self._node_points.append(_sphere_point(lat, lon))
+        self._adjacency.append([])
+        self._node_cells[self._cell(lat, lon)].append(node)
+        return node
+
+    def _set_weight_locked(self, edge: int, weight: float):
+        start_node, end_node = self._edge_nodes[edge]
+        # snapping can move an endpoint by a few meters, the search cost never goes under the
+        # straight line between the two nodes so the haversine heuristic stays exact
+        straight_line = calculate_haversine_distance(
+            self._node_lats[start_node], self._node_lons[start_node],
+            self._node_lats[end_node], self._node_lons[end_node]
+        )
+        self._edge_weights[edge] = weight
+        self._edge_costs[edge] = max(weight, straight_line)
+
+    def _add_segment_locked(self, segment_id, path_id, user_id, publishable, status,
+                            start_lat, start_lon, end_lat, end_lon, length_meters):
+        segment_id = str(segment_id)
+        if segment_id in self._segment_edges:
+            return
+
+        start_lat, start_lon, end_lat, end_lon = float(start_lat), float(start_lon), float(end_lat), float(end_lon)
+        start_node = self._node_for(start_lat, start_lon)
+        end_node = self._node_for(end_lat, end_lon)
+        # stored lengths have 2 decimals, the weight matches the score the db keeps
+        length_meters = round(float(length_meters), 2)
+
+        edge = len(self._edge_segments)
+        self._edge_segments.append(segment_id)
+        self._edge_paths.append(str(path_id))
+        self._edge_nodes.append((start_node, end_node))
+        self._edge_points.append((start_lat, start_lon, end_lat, end_lon))
+        self._edge_statuses.append(str(status))
+        self._edge_owners.append(str(user_id).lower() if user_id else None)
+        self._edge_public.append(bool(publishable))
+        self._edge_lengths.append(length_meters)
+        self._edge_weights.append(0.0)
+        self._edge_costs.append(0.0)
+        self._segment_edges[segment_id] = edge
+        self._set_weight_locked(edge, calculate_segment_score(length_meters, str(status), []))
+
+        # a segment shorter than the snap distance collapses to one node and never helps a route
+        if start_node != end_node:
+            self._adjacency[start_node].append((end_node, edge))
+            self._adjacency[end_node].append((start_node, edge))
+
+    def _add_obstacle_locked(self, obstacle_id, segment_id, severity):
+        edge = self._segment_edges.get(str(segment_id))
+        if edge is None:
+            return
+        self._obstacle_ids.append(str(obstacle_id))
+        self._obstacle_edges.append(edge)
+        self._obstacle_severities.append(str(severity))
+        self._set_weight_locked(edge, self._edge_weights[edge] + SEVERITY_PENALTIES.get(str(severity), 0))
+
+    def _apply_locked(self, segment_rows: Iterable[tuple], obstacle_rows: Iterable[tuple], high_water: Optional[datetime]):
+        for row in segment_rows:
+            self._add_segment_locked(*row)
+        # obstacles can also sit on segments of older paths, those edges get heavier too
+        for row in obstacle_rows:
+            self._add_obstacle_locked(*row)
+        if high_water is not None and (self.high_water is None or high_water > self.high_water):
+            self.high_water = high_water
+
+    def add_path(self, rows: dict):
+        """adds a path from the rows of build_path_rows, after they are committed"""
+        # columns as in path_writer.PATH_INFO_COLUMNS / SEGMENT_COLUMNS / OBSTACLE_COLUMNS
+        path_info = rows['path_info']
+        segment_rows = [
+            (segment[0], path_info[0], path_info[1], path_info[5], segment[3],
+             segment[4], segment[5], segment[6], segment[7], segment[9])
+            for segment in sorted(rows['segments'], key=lambda s: s[8])
+        ]
+        obstacle_rows = [(obstacle[0], obstacle[1], obstacle[3]) for obstacle in rows['obstacles']]
+        high_water = max([path_info[6]] + [obstacle[7] for obstacle in rows['obstacles']])
+
+        with self._lock:
+            self._apply_locked(segment_rows, obstacle_rows, high_water)
+
+    def apply_changes(self, segment_rows: Iterable[tuple], obstacle_rows: Iterable[tuple], high_water: Optional[datetime]):
+        """
+        adds segment rows of (segment_id, path_id, user_id, publishable, status, start_lat,
+        start_lon, end_lat, end_lon, length_meters), segments of a path in order, then
+        obstacle rows of (obstacle_id, segment_id, severity). segments already in the graph
+        are skipped, obstacles are not checked so each must only be passed once
+        """
+        with self._lock:
+            self._apply_locked(segment_rows, obstacle_rows, high_water)
+
+    def load(self, segment_rows: Iterable[tuple], obstacle_rows: Iterable[tuple], high_water: Optional[datetime]):
+        """replaces the whole graph, rows as for apply_changes"""
+        with self._lock:
+            self._clear_locked()
+            self._apply_locked(segment_rows, obstacle_rows, high_water)
+            self.is_loaded = True
+
+    def export_columns(self) -> Tuple[Optional[datetime], Dict[str, np.ndarray]]:
+        """
+        high_water and the whole graph as numpy columns, for path_snapshot. edges of a
+        path are always next to each other in segment order, so paths are stored once
+        with offsets into the edge columns
+        """
+        with self._lock:
+            edge_paths = self._edge_paths
+            path_starts = [edge for edge in range(len(edge_paths)) if edge == 0 or edge_paths[edge] != edge_paths[edge - 1]]
+
+            return self.high_water, {
+                'node_lats': np.array(self._node_lats, dtype=np.float64),
+                'node_lons': np.array(self._node_lons, dtype=np.float64),
+                'path_ids': np.array([edge_paths[edge] for edge in path_starts], dtype='S36'),
+                'path_owners': np.array([self._edge_owners[edge] or '' for edge in path_starts], dtype='S36'),
+                'path_public': np.array([self._edge_public[edge] for edge in path_starts], dtype=np.int8),
+                'path_offsets': np.array(path_starts + [len(edge_paths)], dtype=np.int64),
+                'edge_segments': np.array(self._edge_segments, dtype='S36'),
+                'edge_nodes': np.array(self._edge_nodes, dtype=np.int32).reshape(-1, 2),
+                'edge_points': np.array(self._edge_points, dtype=np.float64).reshape(-1, 4),
+                'edge_statuses': np.array([STATUS_CODES[status] for status in self._edge_statuses], dtype=np.int8),
+                'edge_lengths': np.array(self._edge_lengths, dtype=np.float64),
+                'edge_weights': np.array(self._edge_weights, dtype=np.float64),
+                'edge_costs': np.array(self._edge_costs, dtype=np.float64),
+                'obstacle_ids': np.array(self._obstacle_ids, dtype='S36'),
+                'obstacle_edges': np.array(self._obstacle_edges, dtype=np.int32),
+                'obstacle_severities': np.array([SEVERITY_CODES[severity] for severity in self._obstacle_severities], dtype=np.int8),
+            }
+
+    def load_columns(self, columns: Dict[str, np.ndarray], high_water: Optional[datetime]):
+        """replaces the whole graph with what export_columns returned (built with the same snap_meters)"""
+        node_lats, node_lons = columns['node_lats'], columns['node_lons']
+        lat_rad, lon_rad = np.radians(node_lats), np.radians(node_lons)
+        node_points = np.stack([
+            EARTH_RADIUS_METERS * np.cos(lat_rad) * np.cos(lon_rad),
+            EARTH_RADIUS_METERS * np.cos(lat_rad) * np.sin(lon_rad),
+            EARTH_RADIUS_METERS * np.sin(lat_rad)
+        ], axis=1)
+        node_rows = np.floor(node_lats / self._cell_deg).astype(np.int64).tolist()
+        node_cols = np.floor(node_lons / self._cell_deg).astype(np.int64).tolist()
+
+        path_counts = np.diff(columns['path_offsets'])
+        edge_nodes = columns['edge_nodes'].tolist()
+        status_names = list(STATUS_CODES)
+        severity_names = list(SEVERITY_CODES)
+
+        with self._lock:
+            self._clear_locked()
+            self.high_water = high_water
+
+            self._node_lats = node_lats.tolist()
+            self._node_lons = node_lons.tolist()
+            self._node_points = list(map(tuple, node_points.tolist()))
+            self._adjacency = [[] for _ in range(len(self._node_lats))]
+            for node, cell in enumerate(zip(node_rows, node_cols)):
+                self._node_cells[cell].append(node)
+
+            self._edge_segments = np.char.decode(columns['edge_segments'], 'ascii').tolist()
+            self._edge_paths = np.repeat(np.char.decode(columns['path_ids'], 'ascii'), path_counts).tolist()
+            self._edge_owners = [
+                owner or None for owner in np.repeat(np.char.decode(columns['path_owners'], 'ascii'), path_counts).tolist()
+            ]
+            self._edge_public = np.repeat(columns['path_public'].astype(bool), path_counts).tolist()
+            self._edge_nodes = list(map(tuple, edge_nodes))
+            self._edge_points = list(map(tuple, columns['edge_points'].tolist()))
+            self._edge_statuses = [status_names[code] for code in columns['edge_statuses'].tolist()]
+            self._edge_lengths = columns['edge_lengths'].tolist()
+            self._edge_weights = columns['edge_weights'].tolist()
+            self._edge_costs = columns['edge_costs'].tolist()
+            self._segment_edges = {segment_id: edge for edge, segment_id in enumerate(self._edge_segments)}
+
+            for edge, (start_node, end_node) in enumerate(edge_nodes):
+                if start_node != end_node:
+                    self._adjacency[start_node].append((end_node, edge))
+                    self._adjacency[end_node].append((start_node, edge))
+
+            self._obstacle_ids = np.char.decode(columns['obstacle_ids'], 'ascii').tolist()
+            self._obstacle_edges = columns['obstacle_edges'].tolist()
+            self._obstacle_severities = [severity_names[code] for code in columns['obstacle_severities'].tolist()]
+
+            self.is_loaded = True
+
+    def __len__(self):
+        return len(self._edge_segments)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'nodes': len(self._node_lats),
+                'edges': len(self._edge_segments),
+                'loaded': self.is_loaded,
+            }
+
+    def find_route(self, origin_lat: float, origin_lon: float, dest_lat: float, dest_lon: float,
+                   user_id: Optional[str], radius_meters: float, max_expansions: int) -> Optional[dict]:
+        """
+        A* from every node within radius_meters of the origin to any node within
+        radius_meters of the destination. the heuristic is the chord (straight line
+        through the earth, never longer than the haversine distance) to the destination
+        minus the radius. no edge costs less than the distance it spans so the first
+        route that reaches the destination is the cheapest one.
+
+        returns None when no visible route exists (or max_expansions nodes were settled
+        without reaching it), otherwise {'score', 'length_meters', 'edges'} where edges is
+        [(segment_id, path_id, reversed)] in riding order
+        """
+        caller = str(user_id).lower() if user_id else None
+
+        # the search runs on references to the columns taken under the lock, so writers
+        # are not held up for the whole search. columns only ever grow (a reload puts in
+        # new lists), edges added after this point are skipped by edge_count. an obstacle
+        # reported meanwhile may or may not be counted, its edge only gets heavier
+        with self._lock:
+            sources = self._nodes_within(origin_lat, origin_lon, radius_meters)
+            targets = {node for _, node in self._nodes_within(dest_lat, dest_lon, radius_meters)}
+            edge_count = len(self._edge_segments)
+            node_points = self._node_points
+            adjacency, costs = self._adjacency, self._edge_costs
+            owners, public = self._edge_owners, self._edge_public
+            edge_nodes, edge_weights, edge_lengths = self._edge_nodes, self._edge_weights, self._edge_lengths
+            edge_segments, edge_paths = self._edge_segments, self._edge_paths
+
+        if not sources or not targets:
+            return None
+
+        dest_x, dest_y, dest_z = _sphere_point(dest_lat, dest_lon)
+        estimates: Dict[int, float] = {}
+
+        def heuristic(node: int) -> float:
+            estimate = estimates.get(node)
+            if estimate is None:
+                x, y, z = node_points[node]
+                estimate = max(0.0, math.sqrt((x - dest_x) ** 2 + (y - dest_y) ** 2 + (z - dest_z) ** 2) - radius_meters)
+                estimates[node] = estimate
+            return estimate
+
+        best: Dict[int, float] = {}
+        came_from: Dict[int, Tuple[int, int]] = {}
+        heap = []
+        for _, node in sources:
+            best[node] = 0.0
+            heap.append((heuristic(node), 0.0, node))
+        heapq.heapify(heap)
+
+        settled = set()
+        reached = None
+        while heap:
+            _, cost, node = heapq.heappop(heap)
+            cost = -cost
+            if node in settled:
+                continue
+            if node in targets:
+                reached = node
+                break
+            settled.add(node)
+            if len(settled) > max_expansions:
+                logger.warning(f"Route planning gave up after settling {max_expansions} nodes")
+                break
+
+            for neighbour, edge in adjacency[node]:
+                if edge >= edge_count:
+                    continue
+                # visibilty: public paths for everyone, private ones only for the owner
+                if not public[edge] and (caller is None or owners[edge] != caller):
+                    continue
+                next_cost = cost + costs[edge]
+                if next_cost < best.get(neighbour, math.inf):
+                    best[neighbour] = next_cost
+                    came_from[neighbour] = (node, edge)
+                    # on equal estimates the node further along goes first, grids are full of ties
+                    heapq.heappush(heap, (next_cost + heuristic(neighbour), -next_cost, neighbour))
+
+        if reached is None:
+            return None
+
+        edges = []
+        node = reached
+        while node in came_from:
+            previous, edge = came_from[node]
+            # ridden end to start when the walk entered the segment at its end node
+            edges.append((edge, edge_nodes[edge][0] != previous))
+            node = previous
+        edges.reverse()
+
+        return {
+            'score': sum(edge_weights[edge] for edge, _ in edges),
+            'length_meters': sum(edge_lengths[edge] for edge, _ in edges),
+            'edges': [(edge_segments[edge], edge_paths[edge], is_reversed) for edge, is_reversed in edges]
+        }
+
+
+def _sphere_point(lat: float, lon: float) -> Tuple[float, float, float]:
+    lat, lon = math.radians(lat), math.radians(lon)
+    return (
+        EARTH_RADIUS_METERS * math.cos(lat) * math.cos(lon),
+        EARTH_RADIUS_METERS * math.cos(lat) * math.sin(lon),
+        EARTH_RADIUS_METERS * math.sin(lat)
+    )
+
+
+routing_graph = RoutingGraph(settings.ROUTING_SNAP_METERS, settings.TOLERANCE_RADIUS_METERS)
+
+
+# a high water mark and the rows read after it in the same REPEATABLE READ transaction match
+HIGH_WATER_QUERY = """
+    SELECT GREATEST((SELECT max(created_date) FROM PathInfo), (SELECT max(reported_date) FROM Obstacles))
+"""
+
+SEGMENT_ROWS_QUERY = """
+    SELECT s.segment_id, s.path_info_id, pi.user_id, pi.publishable, s.status::text,
+           s.start_latitude::float8, s.start_longitude::float8,
+           s.end_latitude::float8, s.end_longitude::float8, s.length_meters::float8
+    FROM Segments s
+    JOIN PathInfo pi ON pi.path_info_id = s.path_info_id
+    {where}
+    ORDER BY s.path_info_id, s.segment_order
+"""
+
+OBSTACLE_ROWS_QUERY = """
+    SELECT o.obstacle_id, o.segment_id, o.severity::text
+    FROM Obstacles o
+    {where}
+"""
+
+
+def build_routing_graph():
+    """loads every segment and obstacle into routing_graph, called at startup when there is no snapshot"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        cursor.execute(HIGH_WATER_QUERY)
+        high_water = cursor.fetchone()[0]
+
+        # streamed with named cursors, the graph is the only full copy kept in memory
+        segments = conn.cursor(name="routing_graph_segments")
+        segments.itersize = 10000
+        segments.execute(SEGMENT_ROWS_QUERY.format(where=""))
+        obstacles = conn.cursor(name="routing_graph_obstacles")
+        obstacles.itersize = 10000
+        obstacles.execute(OBSTACLE_ROWS_QUERY.format(where=""))
+
+        routing_graph.load(segments, obstacles, high_water)
+
+        segments.close()
+        obstacles.close()
+        cursor.close()
+        conn.rollback()
+        logger.info(f"Routing graph built with {routing_graph.stats()['nodes']} nodes and {len(routing_graph)} segments")
+
+    except Exception as e:
+        # /paths/plan answers 503 until the graph is loaded
+        logger.error(f"Error building routing graph: {e}")
+    finally:
+        if conn:
+            return_db_connection(conn)
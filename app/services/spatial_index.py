@@ -0,0 +1,172 @@
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+import math
+import threading
+import logging
+
+from app.config.database import get_db_connection, return_db_connection
+from app.config.settings import settings
+from app.utils.geo_utils import EARTH_RADIUS_METERS
+
+logger = logging.getLogger(__name__)
+
+# past this many cells per box it is cheaper to just scan every entry
+# (only happens near the poles or when the box wraps around the antimeridian)
+MAX_CELLS_PER_QUERY = 1024
+
+
+class PathEndpointIndex:
+    """
+    in-memory uniform grid over path start and end points.
+
+    cells are square in degrees and roughly TOLERANCE_RADIUS_METERS tall, a query
+    takes a bounding box (from get_bounding_box) and returns the paths whose start
+    falls in the origin box and whose end falls in the destination box, filtered by
+    the same visibilty rules as the PathEndpoints query. callers still do the exact
+    haversine check on what comes back.
+
+    the index is per process, it relies on every write going through this
+    process (the Procfile runs a single uvicorn worker)
+    """
+
+    def __init__(self, cell_size_meters: float):
+        self._cell_deg = math.degrees(cell_size_meters / EARTH_RADIUS_METERS)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, tuple] = {}
+        self._start_cells: Dict[Tuple[int, int], Set[str]] = defaultdict(set)
+        self._end_cells: Dict[Tuple[int, int], Set[str]] = defaultdict(set)
+        self.is_loaded = False
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lat / self._cell_deg), math.floor(lon / self._cell_deg))
+
+    def _add_locked(self, path_id, user_id, publishable, start_lat, start_lon, end_lat, end_lon):
+        path_id = str(path_id)
+        if path_id in self._entries:
+            self._remove_locked(path_id)
+
+        entry = (
+            path_id,
+            str(user_id).lower() if user_id else None,
+            bool(publishable),
+            float(start_lat), float(start_lon),
+            float(end_lat), float(end_lon)
+        )
+        self._entries[path_id] = entry
+        self._start_cells[self._cell(entry[3], entry[4])].add(path_id)
+        self._end_cells[self._cell(entry[5], entry[6])].add(path_id)
+
+    def _remove_locked(self, path_id: str):
+        entry = self._entries.pop(path_id, None)
+        if entry is None:
+            return
+        for cells, cell in ((self._start_cells, self._cell(entry[3], entry[4])),
+                            (self._end_cells, self._cell(entry[5], entry[6]))):
+            bucket = cells.get(cell)
+            if bucket is not None:
+                bucket.discard(path_id)
+                if not bucket:
+                    del cells[cell]
+
+    def add(self, path_id, user_id, publishable, start_lat, start_lon, end_lat, end_lon):
+        with self._lock:
+            self._add_locked(path_id, user_id, publishable, start_lat, start_lon, end_lat, end_lon)
+
+    def remove(self, path_id: str):
+        with self._lock:
+            self._remove_locked(str(path_id))
+
+    def load(self, rows):
+        """replaces the whole index with rows of (path_id, user_id, publishable, start_lat, start_lon, end_lat, end_lon)"""
+        with self._lock:
+            self._entries.clear()
+            self._start_cells.clear()
+            self._end_cells.clear()
+            for row in rows:
+                self._add_locked(*row)
+            self.is_loaded = True
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _ids_in_box(self, cells: Dict[Tuple[int, int], Set[str]], box, start: bool) -> Set[str]:
+        min_lat, max_lat, min_lon, max_lon = box
+        min_row, max_row = math.floor(min_lat / self._cell_deg), math.floor(max_lat / self._cell_deg)
+        min_col, max_col = math.floor(min_lon / self._cell_deg), math.floor(max_lon / self._cell_deg)
+
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > MAX_CELLS_PER_QUERY:
+            lat_idx, lon_idx = (3, 4) if start else (5, 6)
+            return {
+                path_id for path_id, entry in self._entries.items()
+                if min_lat <= entry[lat_idx] <= max_lat and min_lon <= entry[lon_idx] <= max_lon
+            }
+
+        ids = set()
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                bucket = cells.get((row, col))
+                if bucket:
+                    ids.update(bucket)
+        return ids
+
+    def find_candidates(self, user_id: Optional[str], origin_box, dest_box) -> List[tuple]:
+        """
+        same contract as fetch_endpoint_candidates: returns
+        (path_info_id, start_lat, start_lon, end_lat, end_lon) ordered by path id
+        """
+        caller = str(user_id).lower() if user_id else None
+        origin_min_lat, origin_max_lat, origin_min_lon, origin_max_lon = origin_box
+        dest_min_lat, dest_max_lat, dest_min_lon, dest_max_lon = dest_box
+
+        with self._lock:
+            origin_ids = self._ids_in_box(self._start_cells, origin_box, start=True)
+            if not origin_ids:
+                return []
+            dest_ids = self._ids_in_box(self._end_cells, dest_box, start=False)
+
+            candidates = []
+            for path_id in origin_ids & dest_ids:
+                _, owner_id, publishable, start_lat, start_lon, end_lat, end_lon = self._entries[path_id]
+
+                # visibilty: public paths for everyone, private ones only for the owner
+                if not publishable and (caller is None or owner_id != caller):
+                    continue
+
+                # cells are coarser than the boxes, trim to the box like the SQL does
+                if not (origin_min_lat <= start_lat <= origin_max_lat and origin_min_lon <= start_lon <= origin_max_lon):
+                    continue
+                if not (dest_min_lat <= end_lat <= dest_max_lat and dest_min_lon <= end_lon <= dest_max_lon):
+                    continue
+
+                candidates.append((path_id, start_lat, start_lon, end_lat, end_lon))
+
+        candidates.sort(key=lambda c: c[0])
+        return candidates
+
+
+path_endpoint_index = PathEndpointIndex(settings.TOLERANCE_RADIUS_METERS)
+
+
+def build_path_endpoint_index():
+    """loads every PathEndpoints row into path_endpoint_index, called once at startup"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT path_info_id, user_id, publishable,
+                   start_latitude, start_longitude, end_latitude, end_longitude
+            FROM PathEndpoints
+        """)
+        path_endpoint_index.load(cursor.fetchall())
+
+        cursor.close()
+        logger.info(f"Path endpoint index built with {len(path_endpoint_index)} paths")
+
+    except Exception as e:
+        # search falls back to the PathEndpoints query while the index is not loaded
+        logger.error(f"Error building path endpoint index: {e}")
+    finally:
+        if conn:
+            return_db_connection(conn)
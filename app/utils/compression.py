@@ -0,0 +1,199 @@
+from typing import Optional
+import zlib
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# response compression negotiated from Accept-Encoding. detail, search and export
+# bodies are mostly repeated keys and coordinates and shrink 5-10x, small bodies are
+# sent as they are since the compressed one would hardly be smaller.
+# a compressed body is a different representation than the identity one, so a
+# strong ETag set by the route is weakened (like nginx does), If-None-Match still
+# matches it with etag_matches
+
+# preference order when the client gives both the same q value
+ENCODINGS = ("br", "gzip")
+
+COMPRESSIBLE_MEDIA_TYPES = {
+    "application/json",
+    "application/geo+json",
+    "application/x-ndjson",
+}
+
+# no body, or a body that is only part of the representation
+_SKIPPED_STATUSES = {204, 206, 304}
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """the best of ENCODINGS the client accepts, None when it only takes identity"""
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+
+    wildcard = qualities.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for coding in ENCODINGS:
+        quality = qualities.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def is_compressible(content_type: str) -> bool:
+    media_type = content_type.split(";")[0].strip().lower()
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_MEDIA_TYPES
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """weak comparison of If-None-Match against etag, so the weakened ETags of compressed bodies match too"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    if etag.startswith("W/"):
+        etag = etag[2:]
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+class _Compressor:
+    """one streaming compressor for a response body"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+            self._zlib = None
+        else:
+            self._brotli = None
+            # wbits 16 + 15 writes the gzip header and trailer
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.process(data)
+        return self._zlib.compress(data)
+
+    def finish(self) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+class CompressionMiddleware:
+    """
+    gzip / brotli for responses of at least minimum_size bytes. streamed responses
+    (the exports) are compressed chunk by chunk as they go out
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # clients that only take identity still go through the responder, their
+        # responses need the same Vary header as the compressed ones
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        responder = _CompressingResponder(send, encoding, self)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressingResponder:
+    """send wrapper holding back http.response.start until the first body shows whether to compress"""
+
+    def __init__(self, send: Send, encoding: Optional[str], middleware: CompressionMiddleware):
+        self._send = send
+        self._encoding = encoding
+        self._middleware = middleware
+        self._start_message: Optional[Message] = None
+        self._compressor: Optional[_Compressor] = None
+        self._passthrough = False
+
+    async def send(self, message: Message):
+        message_type = message["type"]
+
+        if message_type == "http.response.start":
+            self._start_message = message
+            message.setdefault("headers", [])
+            headers = MutableHeaders(scope=message)
+            compressible = is_compressible(headers.get("content-type", ""))
+            already_encoded = "content-encoding" in headers
+            # whether this one gets compressed or not (too small, identity client) the
+            # representation depends on Accept-Encoding, shared caches must key on it.
+            # a 304 carries the Vary of the response it stands for
+            if (compressible or message["status"] == 304) and not already_encoded:
+                headers.add_vary_header("Accept-Encoding")
+            self._passthrough = (
+                self._encoding is None
+                or message["status"] in _SKIPPED_STATUSES
+                or already_encoded
+                or not compressible
+            )
+            if self._passthrough:
+                await self._send(message)
+            return
+
+        if message_type != "http.response.body" or self._passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self._compressor is None:
+            if not more_body and len(body) < self._middleware.minimum_size:
+                self._passthrough = True
+                await self._send(self._start_message)
+                await self._send(message)
+                return
+
+            self._compressor = _Compressor(
+                self._encoding, self._middleware.gzip_level, self._middleware.brotli_quality
+            )
+            headers = MutableHeaders(raw=self._start_message["headers"])
+            headers["Content-Encoding"] = self._encoding
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+
+            if not more_body:
+                body = self._compressor.compress(body) + self._compressor.finish()
+                headers["Content-Length"] = str(len(body))
+                await self._send(self._start_message)
+                await self._send({"type": "http.response.body", "body": body})
+                return
+
+            # the length of a streamed body is not known up front
+            del headers["Content-Length"]
+            await self._send(self._start_message)
+
+        if more_body:
+            data = self._compressor.compress(body)
+            if data:
+                await self._send({"type": "http.response.body", "body": data, "more_body": True})
+        else:
+            data = self._compressor.compress(body) + self._compressor.finish()
+            await self._send({"type": "http.response.body", "body": data})
@@ -12,3 +12,12 @@ class RoadsServiceException(Exception):
 
 class DatabaseException(Exception):
     pass
+
+class PoolTimeoutException(DatabaseException):
+    pass
+
+class ImportFormatException(Exception):
+    pass
+
+class QueryBudgetExceededException(DatabaseException):
+    pass
@@ -1,31 +1,99 @@
 import math
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 import logging
+import numpy as np
 from app.models.path import SegmentStatus, ObstacleSeverity
 
 logger = logging.getLogger(__name__)
 
-def calculate_haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    R = 6371000
+EARTH_RADIUS_METERS = 6371000
+
+# obstacles are matched in chunks so the obstacle x edge matrix stays around this many cells
+MATCHING_CHUNK_CELLS = 1_000_000
+
+# below this many edges a full scan is cheaper than building a SegmentEdgeGrid
+GRID_MIN_EDGES = 256
+# edges covering more cells than this go in the grid's always-checked list
+GRID_MAX_CELLS_PER_EDGE = 16
+# lookups whose box covers more cells than this (near the poles) fall back to a full scan
+GRID_MAX_CELLS_PER_QUERY = 64
+
+# batch kernels: all of them take scalars or numpy arrays and broadcast, so the same
+# code handles one pair of points, N points against one, or an N x M matrix
+# (pass lat1[:, None] and lat2[None, :]). the scalar helpers below are thin
+# wrappers over these, and per element the batch results agree with the original
+# math-module formulas to within 1e-6 m (differences come only from the last
+# bit of numpy's vectorized sin/cos)
+
+def haversine_distances(lat1, lon1, lat2, lon2) -> np.ndarray:
+    lat1 = np.asarray(lat1, dtype=np.float64)
+    lon1 = np.asarray(lon1, dtype=np.float64)
+    lat2 = np.asarray(lat2, dtype=np.float64)
+    lon2 = np.asarray(lon2, dtype=np.float64)
 
-    lat1 = float(lat1)
-    lon1 = float(lon1)
-    lat2 = float(lat2)
-    lon2 = float(lon2)
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    delta_phi = np.radians(lat2 - lat1)
+    delta_lambda = np.radians(lon2 - lon1)
 
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    delta_phi = math.radians(lat2 - lat1)
-    delta_lambda = math.radians(lon2 - lon1)
+    a = np.sin(delta_phi / 2) ** 2 + \
+        np.cos(phi1) * np.cos(phi2) * np.sin(delta_lambda / 2) ** 2
 
-    a = math.sin(delta_phi / 2) ** 2 + \
-        math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
 
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return EARTH_RADIUS_METERS * c
+
+def haversine_matrix(lats1, lons1, lats2, lons2) -> np.ndarray:
+    """N x M distances between two point sets"""
+    return haversine_distances(
+        np.asarray(lats1, dtype=np.float64)[:, None],
+        np.asarray(lons1, dtype=np.float64)[:, None],
+        np.asarray(lats2, dtype=np.float64)[None, :],
+        np.asarray(lons2, dtype=np.float64)[None, :]
+    )
+
+def within_radius_mask(lat, lon, lats, lons, radius_meters: float) -> np.ndarray:
+    """boolean mask of the points (lats, lons) within radius_meters of (lat, lon)"""
+    return haversine_distances(lat, lon, lats, lons) <= radius_meters
+
+def point_to_segments_distances(px, py, x1, y1, x2, y2) -> np.ndarray:
+    """
+    batch version of point_to_segment_distance, same planar projection in
+    lat/lon degrees followed by the haversine distance to the closest point
+    """
+    px = np.asarray(px, dtype=np.float64)
+    py = np.asarray(py, dtype=np.float64)
+    x1 = np.asarray(x1, dtype=np.float64)
+    y1 = np.asarray(y1, dtype=np.float64)
 
-    distance = R * c
+    dx = np.asarray(x2, dtype=np.float64) - x1
+    dy = np.asarray(y2, dtype=np.float64) - y1
 
-    return distance
+    # degenerate segments get t = 0, ie the distance to their start point
+    denominator = dx * dx + dy * dy
+    numerator = (px - x1) * dx + (py - y1) * dy
+    numerator, denominator = np.broadcast_arrays(numerator, denominator)
+    t = np.divide(numerator, denominator, out=np.zeros(numerator.shape), where=denominator != 0)
+    t = np.clip(t, 0, 1)
+
+    return haversine_distances(px, py, x1 + t * dx, y1 + t * dy)
+
+def point_to_polyline_distances(lats, lons, polyline) -> np.ndarray:
+    """distance from each point to the closest edge of a [[lat, lng], ...] polyline"""
+    line = np.asarray(polyline, dtype=np.float64)
+    if len(line) < 2:
+        return haversine_distances(lats, lons, line[0, 0], line[0, 1])
+
+    distances = point_to_segments_distances(
+        np.asarray(lats, dtype=np.float64)[..., None],
+        np.asarray(lons, dtype=np.float64)[..., None],
+        line[:-1, 0], line[:-1, 1],
+        line[1:, 0], line[1:, 1]
+    )
+    return distances.min(axis=-1)
+
+def calculate_haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    return float(haversine_distances(lat1, lon1, lat2, lon2))
 
 def calculate_segment_length(start_lat: float, start_lon: float, end_lat: float, end_lon: float) -> float:
     return calculate_haversine_distance(start_lat, start_lon, end_lat, end_lon)
@@ -34,65 +102,228 @@ def is_within_radius(lat1: float, lon1: float, lat2: float, lon2: float, radius_
     distance = calculate_haversine_distance(lat1, lon1, lat2, lon2)
     return distance <= radius_meters
 
-def find_nearest_segment(obstacle_lat: float, obstacle_lon: float, segments: List[Dict], max_distance_meters: float = 50.0) -> str:
+def get_bounding_box(lat: float, lon: float, radius_meters: float) -> Tuple[float, float, float, float]:
     """
-    finds the closest segment to an obstacal point
-    if we have routeGeometry it uses all the points for beter matching
-    otherwhise it just uses start and end points
+    returns (min_lat, max_lat, min_lon, max_lon) enclosing every point within
+    radius_meters of (lat, lon) by haversine distance, so it can be used as a
+    cheap prefilter before the exact is_within_radius check.
+    if the box would reach a pole or cross the antimeridian it covers all longitudes
     """
-    obstacle_lat = float(obstacle_lat)
-    obstacle_lon = float(obstacle_lon)
+    R = EARTH_RADIUS_METERS
 
-    min_distance = float('inf')
-    nearest_segment_id = None
+    lat = float(lat)
+    lon = float(lon)
 
-    logger.debug(f"Finding nearest segment for obstacle at ({obstacle_lat}, {obstacle_lon})")
-    logger.debug(f"Number of segments to check: {len(segments)}")
+    angular_radius = radius_meters / R
+    delta_lat = math.degrees(angular_radius)
 
-    for segment in segments:
-        segment_id = segment['segment_id']
+    min_lat = lat - delta_lat
+    max_lat = lat + delta_lat
+
+    sin_ratio = math.sin(angular_radius) / math.cos(math.radians(lat)) if abs(lat) < 90 else float('inf')
+    if min_lat <= -90 or max_lat >= 90 or sin_ratio >= 1:
+        return max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0
+
+    delta_lon = math.degrees(math.asin(sin_ratio))
+    min_lon = lon - delta_lon
+    max_lon = lon + delta_lon
+
+    if min_lon < -180 or max_lon > 180:
+        return min_lat, max_lat, -180.0, 180.0
+
+    return min_lat, max_lat, min_lon, max_lon
+
+def build_segment_edges(segments: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    flattens segments into an (E, 4) array of [lat1, lon1, lat2, lon2] edges plus the
+    index of the segment each edge belongs to. segments with routeGeometry contribute
+    every consecutive pair of points, the others just their start -> end line
+    """
+    edges = []
+    owners = []
+
+    for idx, segment in enumerate(segments):
         route_geometry = segment.get('route_geometry')
-        
-        logger.debug(f"Checking segment {segment_id}, route_geometry: {route_geometry is not None}, points: {len(route_geometry) if route_geometry else 0}")
-        
+
         if route_geometry and len(route_geometry) >= 2:
-            # use detailed route geomtry for more acurate matching
-            for i in range(len(route_geometry) - 1):
-                p1 = route_geometry[i]
-                p2 = route_geometry[i + 1]
-                
-                # route_geometry format is like [[lat, lng], [lat, lng], ...]
-                distance = point_to_segment_distance(
-                    obstacle_lat, obstacle_lon,
-                    float(p1[0]), float(p1[1]),
-                    float(p2[0]), float(p2[1])
-                )
-                
-                if distance < min_distance:
-                    min_distance = distance
-                    nearest_segment_id = segment_id
+            # route_geometry format is like [[lat, lng], [lat, lng], ...]
+            points = np.asarray(route_geometry, dtype=np.float64)[:, :2]
+            edges.append(np.hstack((points[:-1], points[1:])))
+            owners.append(np.full(len(points) - 1, idx, dtype=np.int64))
         else:
             # fallback - just use start and end points if no geometry
-            start_lat = float(segment['start_latitude'])
-            start_lon = float(segment['start_longitude'])
-            end_lat = float(segment['end_latitude'])
-            end_lon = float(segment['end_longitude'])
+            edges.append(np.array([[
+                float(segment['start_latitude']), float(segment['start_longitude']),
+                float(segment['end_latitude']), float(segment['end_longitude'])
+            ]]))
+            owners.append(np.array([idx], dtype=np.int64))
+
+    if not edges:
+        return np.empty((0, 4)), np.empty(0, dtype=np.int64)
+
+    return np.vstack(edges), np.concatenate(owners)
+
+class SegmentEdgeGrid:
+    """
+    packed bucket grid over the edges from build_segment_edges, built per request.
+
+    cells are max_distance_meters tall (in degrees), every edge is registered in
+    each cell its bounding box touches and the (cell key, edge) pairs are stored as
+    two sorted arrays, so a lookup is a few binary searches. a point only needs
+    the edges registered in the cells of its max_distance bounding box: any edge
+    closer than max_distance_meters has its closest point inside that box, so
+    nothing outside it can win and the rest of the geometry is never touched.
+    edges spanning too many cells (long start -> end fallback lines) are kept in a
+    small list that every lookup checks
+    """
+
+    def __init__(self, edges: np.ndarray, max_distance_meters: float):
+        self.max_distance_meters = max_distance_meters
+        self.cell_deg = math.degrees(max_distance_meters / EARTH_RADIUS_METERS)
+        self._row_offset = int(math.ceil(90 / self.cell_deg)) + 1
+        self._col_offset = int(math.ceil(180 / self.cell_deg)) + 1
+        self._stride = 2 * self._col_offset + 1
 
-            distance = point_to_segment_distance(
-                obstacle_lat, obstacle_lon,
-                start_lat, start_lon,
-                end_lat, end_lon
-            )
+        min_rows = np.floor(np.minimum(edges[:, 0], edges[:, 2]) / self.cell_deg).astype(np.int64)
+        max_rows = np.floor(np.maximum(edges[:, 0], edges[:, 2]) / self.cell_deg).astype(np.int64)
+        min_cols = np.floor(np.minimum(edges[:, 1], edges[:, 3]) / self.cell_deg).astype(np.int64)
+        max_cols = np.floor(np.maximum(edges[:, 1], edges[:, 3]) / self.cell_deg).astype(np.int64)
+        row_spans = max_rows - min_rows + 1
+        col_spans = max_cols - min_cols + 1
 
-            if distance < min_distance:
-                min_distance = distance
-                nearest_segment_id = segment_id
+        large = row_spans * col_spans > GRID_MAX_CELLS_PER_EDGE
+        self.large_edges = np.nonzero(large)[0]
 
-    logger.info(f"Nearest segment for obstacle at ({obstacle_lat}, {obstacle_lon}): {nearest_segment_id}, distance: {min_distance:.2f}m")
+        keys = []
+        edge_ids = []
+        small = np.nonzero(~large)[0]
+        for dr in range(int(row_spans[small].max(initial=1))):
+            for dc in range(int(col_spans[small].max(initial=1))):
+                covered = small[(dr < row_spans[small]) & (dc < col_spans[small])]
+                keys.append(self._keys(min_rows[covered] + dr, min_cols[covered] + dc))
+                edge_ids.append(covered)
 
-    if min_distance > max_distance_meters:
-        logger.warning(f"Min distance {min_distance:.2f}m exceeds max {max_distance_meters}m")
-        return None
+        keys = np.concatenate(keys) if keys else np.empty(0, dtype=np.int64)
+        edge_ids = np.concatenate(edge_ids) if edge_ids else np.empty(0, dtype=np.int64)
+        order = np.lexsort((edge_ids, keys))
+        self.cell_keys = keys[order]
+        self.cell_edges = edge_ids[order]
+
+    def _keys(self, rows, cols):
+        return (rows + self._row_offset) * self._stride + (cols + self._col_offset)
+
+    def candidate_edges(self, lat: float, lon: float) -> Optional[np.ndarray]:
+        """sorted indices of the edges that could be within max_distance of the point, None means check them all"""
+        min_lat, max_lat, min_lon, max_lon = get_bounding_box(lat, lon, self.max_distance_meters)
+        rows = np.arange(math.floor(min_lat / self.cell_deg), math.floor(max_lat / self.cell_deg) + 1)
+        cols = np.arange(math.floor(min_lon / self.cell_deg), math.floor(max_lon / self.cell_deg) + 1)
+
+        if len(rows) * len(cols) > GRID_MAX_CELLS_PER_QUERY:
+            return None
+
+        query_keys = self._keys(rows[:, None], cols[None, :]).ravel()
+        starts = np.searchsorted(self.cell_keys, query_keys, side='left')
+        ends = np.searchsorted(self.cell_keys, query_keys, side='right')
+
+        found = [self.cell_edges[lo:hi] for lo, hi in zip(starts, ends) if hi > lo]
+        found.append(self.large_edges)
+        return np.unique(np.concatenate(found))
+
+def match_obstacles_to_segments(obstacle_points: List[Tuple[float, float]], segments: List[Dict],
+                                max_distance_meters: float = 50.0,
+                                use_index: Optional[bool] = None) -> List[Optional[str]]:
+    """
+    batch version of find_nearest_segment: returns the nearest segment_id for
+    every (lat, lon) obstacle point, or None when nothing is within max_distance_meters.
+    ties go to the first edge in segment order, like the scalar loop.
+
+    with enough edges a SegmentEdgeGrid is built so each obstacle only looks at
+    nearby edges, the answers are the same as the full obstacle x edge scan.
+    use_index forces one way or the other (None picks by size)
+    """
+    if not obstacle_points:
+        return []
+
+    edges, owners = build_segment_edges(segments)
+    if len(edges) == 0:
+        return [None] * len(obstacle_points)
+
+    points = np.asarray(obstacle_points, dtype=np.float64)
+
+    if use_index is None:
+        use_index = len(edges) >= GRID_MIN_EDGES
+
+    if use_index:
+        nearest_edges, min_distances = _nearest_edges_indexed(points, edges, max_distance_meters)
+    else:
+        nearest_edges, min_distances = _nearest_edges_full_scan(points, edges)
+
+    matches = []
+    for nearest_edge, min_distance in zip(nearest_edges, min_distances):
+        if min_distance > max_distance_meters:
+            matches.append(None)
+        else:
+            matches.append(segments[owners[nearest_edge]]['segment_id'])
+
+    return matches
+
+def _nearest_edges_full_scan(points: np.ndarray, edges: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    nearest_edges = []
+    min_distances = []
+
+    chunk = max(1, MATCHING_CHUNK_CELLS // len(edges))
+    for offset in range(0, len(points), chunk):
+        block = points[offset:offset + chunk]
+        distances = point_to_segments_distances(
+            block[:, 0:1], block[:, 1:2],
+            edges[:, 0], edges[:, 1], edges[:, 2], edges[:, 3]
+        )
+        block_nearest = distances.argmin(axis=1)
+        nearest_edges.append(block_nearest)
+        min_distances.append(distances[np.arange(len(block)), block_nearest])
+
+    return np.concatenate(nearest_edges), np.concatenate(min_distances)
+
+def _nearest_edges_indexed(points: np.ndarray, edges: np.ndarray,
+                           max_distance_meters: float) -> Tuple[np.ndarray, np.ndarray]:
+    grid = SegmentEdgeGrid(edges, max_distance_meters)
+    nearest_edges = np.zeros(len(points), dtype=np.int64)
+    min_distances = np.full(len(points), np.inf)
+
+    for i, (lat, lon) in enumerate(points):
+        candidates = grid.candidate_edges(lat, lon)
+        if candidates is None:
+            nearest, distance = _nearest_edges_full_scan(points[i:i + 1], edges)
+            nearest_edges[i], min_distances[i] = nearest[0], distance[0]
+            continue
+        if len(candidates) == 0:
+            continue
+
+        # candidates are sorted, so argmin still breaks ties on the lowest edge index
+        distances = point_to_segments_distances(
+            lat, lon,
+            edges[candidates, 0], edges[candidates, 1], edges[candidates, 2], edges[candidates, 3]
+        )
+        best = distances.argmin()
+        nearest_edges[i] = candidates[best]
+        min_distances[i] = distances[best]
+
+    return nearest_edges, min_distances
+
+def find_nearest_segment(obstacle_lat: float, obstacle_lon: float, segments: List[Dict], max_distance_meters: float = 50.0) -> str:
+    """
+    finds the closest segment to an obstacal point
+    if we have routeGeometry it uses all the points for beter matching
+    otherwhise it just uses start and end points
+    """
+    obstacle_lat = float(obstacle_lat)
+    obstacle_lon = float(obstacle_lon)
+
+    nearest_segment_id = match_obstacles_to_segments(
+        [(obstacle_lat, obstacle_lon)], segments, max_distance_meters
+    )[0]
+
+    logger.info(f"Nearest segment for obstacle at ({obstacle_lat}, {obstacle_lon}): {nearest_segment_id}")
 
     return nearest_segment_id
 
@@ -102,42 +333,30 @@ def point_to_segment_distance(px: float, py: float, x1: float, y1: float, x2: fl
     calcualtes min distance from a point to a line segmnet
     coords are lat/lon and it returns meters
     """
-    # vector from start to end of segment
-    dx = x2 - x1
-    dy = y2 - y1
-    
-    # if the segment is basicaly a point just return distnace to it
-    if dx == 0 and dy == 0:
-        return calculate_haversine_distance(px, py, x1, y1)
-    
-    # calculate projection paramater t
-    # t=0 means closet point is at start, t=1 at end
-    # t between 0-1 means its somwhere on the segment
-    t = ((px - x1) * dx + (py - y1) * dy) / (dx * dx + dy * dy)
-    
-    # clamp t to stay on the segment (cant be outside 0-1)
-    t = max(0, min(1, t))
-    
-    # now we can get the closets point on segment
-    closest_lat = x1 + t * dx
-    closest_lon = y1 + t * dy
-    
-    # finaly return the distance to closet point
-    return calculate_haversine_distance(px, py, closest_lat, closest_lon)
+    return float(point_to_segments_distances(px, py, x1, y1, x2, y2))
+
+# score model, lower is better. also mirrored by refresh_path_stats in database/init_path_tables.sql
+STATUS_MULTIPLIERS = {
+    "OPTIMAL": 1.0,
+    "MEDIUM": 1.2,
+    "SUFFICIENT": 1.5,
+    "REQUIRES_MAINTENANCE": 2.0
+}
+
+SEVERITY_PENALTIES = {
+    "MINOR": 50,
+    "MODERATE": 150,
+    "SEVERE": 400
+}
+
+def calculate_segment_score(length_meters: float, status: str, severities: List[str]) -> float:
+    """score of one segment on its own, a path scores the sum of its segments"""
+    return length_meters * STATUS_MULTIPLIERS.get(status, 1.0) + \
+        sum(SEVERITY_PENALTIES.get(severity, 0) for severity in severities)
 
 def calculate_path_score(segments: List[Dict], obstacles: List[Dict]) -> float:
-    status_multipliers = {
-        "OPTIMAL": 1.0,
-        "MEDIUM": 1.2,
-        "SUFFICIENT": 1.5,
-        "REQUIRES_MAINTENANCE": 2.0
-    }
-
-    severity_penalties = {
-        "MINOR": 50,
-        "MODERATE": 150,
-        "SEVERE": 400
-    }
+    status_multipliers = STATUS_MULTIPLIERS
+    severity_penalties = SEVERITY_PENALTIES
 
     total_score = 0.0
 
@@ -0,0 +1,270 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextvars import ContextVar
+from threading import get_ident
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import re
+import time
+import uuid
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# process local metrics rendered in the Prometheus text format by /metrics.
+# every thread (the event loop, the db executor and threadpool threads) writes to
+# its own shard of a metric without taking a lock, a scrape sums the shards.
+# like the caches every uvicorn worker has its own numbers
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 64, 128)
+SIZE_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 10000)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float) and value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._shards: Dict[int, Dict[tuple, list]] = {}  # thread id -> label values -> slot
+        _registry.append(self)
+
+    @abstractmethod
+    def _new_slot(self) -> list:
+        """a zeroed slot of the metric's values"""
+
+    def _slot(self, labels: tuple) -> list:
+        """the calling thread's slot, only that thread ever writes to it"""
+        shard = self._shards.get(get_ident())
+        if shard is None:
+            shard = self._shards.setdefault(get_ident(), {})
+        slot = shard.get(labels)
+        if slot is None:
+            slot = shard[labels] = self._new_slot()
+        return slot
+
+    def _merged(self) -> Dict[tuple, list]:
+        merged: Dict[tuple, list] = {}
+        for shard in list(self._shards.values()):
+            for labels, slot in shard.copy().items():
+                slot = list(slot)
+                total = merged.get(labels)
+                if total is None:
+                    merged[labels] = slot
+                else:
+                    for i, value in enumerate(slot):
+                        total[i] += value
+        return merged
+
+    @abstractmethod
+    def _samples(self) -> Iterable[str]:
+        """the sample lines of the metric in the text format"""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_slot(self) -> list:
+        return [0]
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        self._slot(labels)[0] += amount
+
+    def _samples(self):
+        for labels, (value,) in sorted(self._merged().items()):
+            yield f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """a slot holds a count per bucket (the last one is +Inf) and the sum"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets)
+
+    def _new_slot(self) -> list:
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def observe(self, value: float, labels: tuple = ()):
+        slot = self._slot(labels)
+        slot[bisect_left(self.buckets, value)] += 1
+        slot[-1] += value
+
+    def _samples(self):
+        bounds = self.buckets + (float("inf"),)
+        for labels, slot in sorted(self._merged().items()):
+            cumulative = 0
+            for bound, count in zip(bounds, slot):
+                cumulative += count
+                bucket_labels = _format_labels(self.label_names + ("le",), labels + (_format_value(bound),))
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            label_text = _format_labels(self.label_names, labels)
+            yield f"{self.name}_sum{label_text} {_format_value(slot[-1])}"
+            yield f"{self.name}_count{label_text} {cumulative}"
+
+
+def render_family(name: str, documentation: str, kind: str,
+                  samples: Iterable[Tuple[Dict[str, str], float]]) -> List[str]:
+    """one family of values that are read at scrape time (pool, caches), samples are (labels, value)"""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}")
+    return lines
+
+
+def render_registry() -> List[str]:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return lines
+
+
+http_requests = Counter(
+    "bbp_http_requests_total", "HTTP requests by route and status code", ("method", "route", "status")
+)
+http_request_duration = Histogram(
+    "bbp_http_request_duration_seconds", "HTTP request latency until the last body byte", ("method", "route")
+)
+request_db_queries = Histogram(
+    "bbp_http_request_db_queries", "database statements run per HTTP request", ("route",), COUNT_BUCKETS
+)
+request_db_seconds = Histogram(
+    "bbp_http_request_db_seconds", "time spent in database statements per HTTP request", ("route",)
+)
+db_query_duration = Histogram(
+    "bbp_db_query_duration_seconds", "duration of every database statement", (), QUERY_BUCKETS
+)
+search_candidates = Histogram(
+    "bbp_search_candidates", "candidate paths scanned by the radius check per search", (), SIZE_BUCKETS
+)
+search_matches = Histogram(
+    "bbp_search_matches", "paths within tolerance of origin and destination per search", (), SIZE_BUCKETS
+)
+path_segments = Histogram(
+    "bbp_path_segments", "segments per created or imported path", ("source",), SIZE_BUCKETS
+)
+
+
+class RequestStats:
+    """
+    database work of one request, filled in by the instrumented cursor. with a
+    query_budget the cursor refuses to run more statements than that and keeps
+    (statement, seconds, rowcount) of every one run so far to report them
+    """
+    __slots__ = ("request_id", "queries", "db_seconds", "query_budget", "statements")
+
+    def __init__(self, request_id: str, query_budget: Optional[int] = None):
+        self.request_id = request_id
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.query_budget = query_budget
+        self.statements: List[tuple] = []
+
+
+# set for every HTTP request by MetricsMiddleware. run_db copies the context into the
+# db thread, so the cursor adds to the stats of the request it runs for
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def record_query(seconds: float):
+    db_query_duration.observe(seconds)
+    stats = request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += seconds
+
+
+def set_query_budget(limit: Optional[int]):
+    """changes the statement budget of the current request, None lifts it (bulk endpoints)"""
+    stats = request_stats.get()
+    if stats is not None:
+        stats.query_budget = limit
+
+
+def _route_template(scope: Scope) -> str:
+    """
+    path template of the matched route, which keeps the label count bounded.
+    the paths router is included under /paths and /routes and its routes only know
+    the unprefixed template, so the prefix is taken from the request path
+    """
+    template = getattr(scope.get("route"), "path", None)
+    if not template:
+        return "unmatched"
+    path_parts = scope["path"].split("/")
+    prefix_length = len(path_parts) - template.count("/")
+    return "/".join(path_parts[:prefix_length]) + template
+
+
+# a request id sent by the gateway is kept if it looks like one, otherwise a new one is made
+_REQUEST_ID_PATTERN = re.compile(r"^[\w.:-]{1,128}$")
+
+
+class MetricsMiddleware:
+    """
+    times every HTTP request and records it under the path template of its route.
+    each request gets a RequestStats with its X-Request-ID (the incoming one or a new
+    one), the id is sent back in the response headers
+    """
+
+    def __init__(self, app: ASGIApp, query_budget: Optional[int] = None):
+        self.app = app
+        self.query_budget = query_budget
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = Headers(scope=scope).get("x-request-id")
+        if not request_id or not _REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+
+        stats = RequestStats(request_id, self.query_budget)
+        token = request_stats.set(stats)
+        status = 500  # when the app raises before starting a response
+        started = time.perf_counter()
+
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", [])
+                MutableHeaders(scope=message)["X-Request-ID"] = request_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            request_stats.reset(token)
+            route = _route_template(scope)
+            method = scope["method"]
+            http_requests.inc((method, route, str(status)))
+            http_request_duration.observe(elapsed, (method, route))
+            request_db_queries.observe(stats.queries, (route,))
+            request_db_seconds.observe(stats.db_seconds, (route,))
@@ -0,0 +1,79 @@
+from typing import List, Optional, Sequence
+import numpy as np
+
+# route geometries are stored and sent as encoded polylines (the Google / OSRM
+# format): coordinates become fixed-point integers, each point is stored as the
+# delta from the previous one, and each delta is written as 5-bit ascii chunks.
+# precision 6 (~0.1 m) matches what OSRM calls "polyline6".
+# a typical road-snapped point takes 4-8 characters instead of the ~40 bytes
+# of a JSON [lat, lng] float pair
+
+GEOMETRY_PRECISION = 6
+
+# 7 chunks of 5 bits cover any zigzagged delta that fits in 35 bits, far more
+# than a full 360 degree swing at precision 6
+_MAX_CHUNKS = 7
+
+
+def encode_polylines(geometries: Sequence[Optional[Sequence[Sequence[float]]]],
+                     precision: int = GEOMETRY_PRECISION) -> List[Optional[str]]:
+    """
+    encodes many [[lat, lng], ...] geometries in one vectorized pass,
+    empty or missing geometries come back as None
+    """
+    results: List[Optional[str]] = [None] * len(geometries)
+    present = [i for i, geometry in enumerate(geometries) if geometry]
+    if not present:
+        return results
+
+    arrays = [np.asarray(geometries[i], dtype=np.float64)[:, :2] for i in present]
+    lengths = np.array([len(a) for a in arrays])
+    points = np.rint(np.vstack(arrays) * 10 ** precision).astype(np.int64)
+
+    # deltas restart at the first point of every geometry
+    deltas = np.diff(points, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    first_points = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    deltas[first_points] = points[first_points]
+
+    # zigzag so negative deltas become small positive ints, then split into 5-bit chunks
+    values = deltas.ravel()
+    values = (values << 1) ^ (values >> 63)
+    chunks = (values[:, None] >> (5 * np.arange(_MAX_CHUNKS))) & 0x1f
+    chunk_counts = 1 + (values[:, None] >= (1 << (5 * np.arange(1, _MAX_CHUNKS)))).sum(axis=1)
+
+    used = np.arange(_MAX_CHUNKS)[None, :] < chunk_counts[:, None]
+    continued = np.arange(_MAX_CHUNKS)[None, :] < (chunk_counts[:, None] - 1)
+    chars = (chunks | (continued * 0x20)) + 63
+    encoded = chars[used].astype(np.uint8).tobytes().decode('ascii')
+
+    # every point is 2 values, cut the ascii stream back into one string per geometry
+    chars_per_point = chunk_counts.reshape(-1, 2).sum(axis=1)
+    boundaries = np.concatenate(([0], np.cumsum(np.add.reduceat(chars_per_point, first_points))))
+    for i, start, end in zip(present, boundaries[:-1], boundaries[1:]):
+        results[i] = encoded[start:end]
+
+    return results
+
+
+def encode_polyline(geometry: Sequence[Sequence[float]], precision: int = GEOMETRY_PRECISION) -> Optional[str]:
+    return encode_polylines([geometry], precision)[0]
+
+
+def decode_polyline(encoded: str, precision: int = GEOMETRY_PRECISION) -> List[List[float]]:
+    """decodes an encoded polyline back into [[lat, lng], ...]"""
+    if not encoded:
+        return []
+
+    data = np.frombuffer(encoded.encode('ascii'), dtype=np.uint8).astype(np.int64) - 63
+    last_chunks = np.nonzero(data < 0x20)[0]
+    starts = np.concatenate(([0], last_chunks[:-1] + 1))
+
+    # shift every chunk into place relative to the first chunk of its value, then sum per value
+    chunk_value = np.repeat(np.arange(len(starts)), last_chunks - starts + 1)
+    shifts = 5 * (np.arange(len(data)) - starts[chunk_value])
+    values = np.add.reduceat((data & 0x1f) << shifts, starts)
+
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    points = np.cumsum(deltas.reshape(-1, 2), axis=0) / 10 ** precision
+
+    return points.tolist()
@@ -1,9 +1,23 @@
 from jose import jwt, JWTError
 from fastapi import HTTPException, Depends, Header
 from typing import Optional
+import hashlib
+import time
 from app.config.settings import settings
+from app.utils.cache import TTLCache
+
+# tokens that already passed jwt.decode, keyed by their sha256 so the cache never holds
+# a usable token. an entry lives until the token's own exp, at most JWT_CACHE_TTL_SECONDS,
+# so a cached token is never accepted after it would have stopped verifying.
+# failed verifications are not cached, they go through jwt.decode every time
+token_cache = TTLCache(settings.JWT_CACHE_MAX_ENTRIES, settings.JWT_CACHE_TTL_SECONDS)
 
 def get_user_id_from_token(token: str) -> str:
+    token_key = hashlib.sha256(token.encode()).digest()
+    user_id = token_cache.get(token_key)
+    if user_id is not None:
+        return user_id
+
     try:
         payload = jwt.decode(
             token,
@@ -13,10 +27,17 @@ def get_user_id_from_token(token: str) -> str:
         user_id: str = payload.get("user_id")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token: user_id not found")
-        return user_id
     except JWTError as e:
         raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
 
+    ttl_seconds = settings.JWT_CACHE_TTL_SECONDS
+    if payload.get("exp") is not None:
+        ttl_seconds = min(ttl_seconds, float(payload["exp"]) - time.time())
+    if ttl_seconds > 0:
+        token_cache.set(token_key, user_id, ttl_seconds)
+
+    return user_id
+
 def get_current_user(authorization: Optional[str] = Header(None)) -> str:
     if not authorization:
         raise HTTPException(status_code=401, detail="Authorization header missing")
@@ -0,0 +1,89 @@
+"""
+compares obstacle matching with and without the SegmentEdgeGrid on a
+road-snapped path (40 segments x 500 points, 100 obstacles by default).
+that both give the same segments is checked in tests/test_obstacle_matching.py
+
+    python -m benchmarks.bench_obstacle_matching --segments 40 --points 500 --obstacles 100
+"""
+import argparse
+import logging
+import random
+import time
+
+from app.utils.geo_utils import match_obstacles_to_segments
+
+
+def make_path(segment_count: int, points_per_segment: int, seed: int):
+    rng = random.Random(seed)
+    lat, lon = 45.4642, 9.19  # somewhere in a city, ~1 m steps along a wiggly road
+    segments = []
+
+    for idx in range(segment_count):
+        geometry = [[lat, lon]]
+        for _ in range(points_per_segment - 1):
+            lat += rng.uniform(-0.00001, 0.00003)
+            lon += rng.uniform(-0.00001, 0.00003)
+            geometry.append([lat, lon])
+
+        segments.append({
+            'segment_id': f"segment-{idx}",
+            'start_latitude': geometry[0][0],
+            'start_longitude': geometry[0][1],
+            'end_latitude': geometry[-1][0],
+            'end_longitude': geometry[-1][1],
+            'route_geometry': geometry
+        })
+
+    return segments
+
+
+def make_obstacles(segments, count: int, seed: int):
+    rng = random.Random(seed + 1)
+    obstacles = []
+    for _ in range(count):
+        point = rng.choice(rng.choice(segments)['route_geometry'])
+        obstacles.append((point[0] + rng.uniform(-0.0003, 0.0003), point[1] + rng.uniform(-0.0003, 0.0003)))
+    return obstacles
+
+
+def best_of(repeats: int, fn):
+    timings = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segments", type=int, default=40)
+    parser.add_argument("--points", type=int, default=500)
+    parser.add_argument("--obstacles", type=int, default=100)
+    parser.add_argument("--max-distance", type=float, default=50.0)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    segments = make_path(args.segments, args.points, args.seed)
+    obstacles = make_obstacles(segments, args.obstacles, args.seed)
+
+    full_scan_time, _ = best_of(args.repeats, lambda: match_obstacles_to_segments(
+        obstacles, segments, args.max_distance, use_index=False
+    ))
+    indexed_time, indexed = best_of(args.repeats, lambda: match_obstacles_to_segments(
+        obstacles, segments, args.max_distance, use_index=True
+    ))
+
+    edges = args.segments * (args.points - 1)
+    print(f"edges: {edges}, obstacles: {args.obstacles}, matched: {sum(m is not None for m in indexed)}")
+    print(f"full scan: {full_scan_time * 1000:.2f} ms")
+    print(f"edge grid: {indexed_time * 1000:.2f} ms")
+    print(f"speedup:   {full_scan_time / indexed_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+compares building a path detail response the previous way (row dicts, then pydantic
+models, then FastAPI's response_model validation and JSONResponse) with
+path_responses (rows straight to JSON bytes with orjson), on a path of
+1000 segments by default
+
+    python -m benchmarks.bench_serialization --segments 1000 --obstacles-every 5 --geometry
+"""
+from datetime import datetime
+from decimal import Decimal
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+import uuid
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app.models.path import PathDetailResponse, SegmentResponse, ObstacleResponse
+from app.services.path_responses import path_detail_body
+from app.utils.polyline import encode_polyline
+
+
+def make_rows(segment_count: int, obstacles_every: int, seed: int):
+    """rows shaped like the ones fetch_segments_by_path / fetch_obstacles_by_segment return"""
+    rng = random.Random(seed)
+    lat, lon = Decimal("45.4642000"), Decimal("9.1900000")
+    step = Decimal("0.0003000")
+
+    segments = []
+    obstacles_by_segment = {}
+    for idx in range(segment_count):
+        segment_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        end_lat, end_lon = lat + step, lon + step
+        geometry = [[float(lat) + i * 0.00003, float(lon) + i * 0.00003] for i in range(11)]
+        segments.append((
+            segment_id, f"Street {idx}", rng.choice(["OPTIMAL", "MEDIUM", "SUFFICIENT"]),
+            lat, lon, end_lat, end_lon, idx, Decimal("41.72"), encode_polyline(geometry)
+        ))
+        obstacles_by_segment[segment_id] = [
+            (str(uuid.UUID(int=rng.getrandbits(128))), "POTHOLE", "MINOR", lat, lon, "deep one")
+        ] if obstacles_every and idx % obstacles_every == 0 else []
+        lat, lon = end_lat, end_lon
+
+    path_info = (
+        str(uuid.UUID(int=rng.getrandbits(128))), str(uuid.uuid4()), "Benchmark path", None,
+        "MANUAL", True, datetime(2024, 5, 1, 12, 30, 15, 123456),
+        Decimal("50012.40"), Decimal("41720.00")
+    )
+    return path_info, segments, obstacles_by_segment
+
+
+def previous_response(path_info, segments, obstacles_by_segment, include_geometry: bool) -> PathDetailResponse:
+    """what _load_path_details built before: nested dicts, then the same data again as models"""
+    segments_data = []
+    for seg in segments:
+        obstacles_data = [{
+            "obstacleId": obs[0],
+            "type": obs[1],
+            "severity": obs[2],
+            "latitude": float(obs[3]),
+            "longitude": float(obs[4]),
+            "description": obs[5]
+        } for obs in obstacles_by_segment[seg[0]]]
+
+        segment_dict = {
+            "segmentId": seg[0],
+            "streetName": seg[1],
+            "status": seg[2],
+            "startLatitude": float(seg[3]),
+            "startLongitude": float(seg[4]),
+            "endLatitude": float(seg[5]),
+            "endLongitude": float(seg[6]),
+            "obstacles": obstacles_data
+        }
+        if include_geometry:
+            segment_dict["routeGeometry"] = seg[9]
+        segments_data.append(segment_dict)
+
+    return PathDetailResponse(
+        pathInfoId=path_info[0],
+        name=path_info[2],
+        description=path_info[3],
+        dataSource=path_info[4],
+        createdDate=path_info[6],
+        totalDistance=round(float(path_info[8]) / 1000, 2),
+        score=float(path_info[7]),
+        segments=[
+            SegmentResponse(
+                segmentId=s["segmentId"],
+                streetName=s["streetName"],
+                status=s["status"],
+                startLatitude=s["startLatitude"],
+                startLongitude=s["startLongitude"],
+                endLatitude=s["endLatitude"],
+                endLongitude=s["endLongitude"],
+                obstacles=[ObstacleResponse(**o) for o in s["obstacles"]],
+                **({"routeGeometry": s["routeGeometry"]} if "routeGeometry" in s else {})
+            ) for s in segments_data
+        ]
+    )
+
+
+def best_of(repeats: int, fn):
+    timings = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segments", type=int, default=1000)
+    parser.add_argument("--obstacles-every", type=int, default=5)
+    parser.add_argument("--geometry", action="store_true", help="include the encoded routeGeometry")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    path_info, segments, obstacles_by_segment = make_rows(args.segments, args.obstacles_every, args.seed)
+
+    # the response_model field and serialization FastAPI runs for get_path_details
+    response_field = create_model_field("Response_get_path_details", PathDetailResponse, mode="serialization")
+    loop = asyncio.new_event_loop()
+
+    def previous():
+        response = previous_response(path_info, segments, obstacles_by_segment, args.geometry)
+        content = loop.run_until_complete(serialize_response(
+            field=response_field, response_content=response, exclude_unset=True
+        ))
+        return JSONResponse(content).body
+
+    def prerendered():
+        return path_detail_body(path_info, segments, obstacles_by_segment, args.geometry)
+
+    previous_time, previous_body = best_of(args.repeats, previous)
+    prerendered_time, prerendered_body = best_of(args.repeats, prerendered)
+    loop.close()
+
+    if json.loads(previous_body) != json.loads(prerendered_body):
+        raise SystemExit("pre-rendered body differs from the response_model one")
+
+    obstacles = sum(len(o) for o in obstacles_by_segment.values())
+    print(f"segments: {args.segments}, obstacles: {obstacles}, geometry: {args.geometry}, body: {len(prerendered_body)} bytes")
+    print(f"identical bytes: {previous_body == prerendered_body}")
+    print(f"dicts + models + response_model: {previous_time * 1000:.2f} ms")
+    print(f"rows to orjson bytes:            {prerendered_time * 1000:.2f} ms")
+    print(f"speedup:                         {previous_time / prerendered_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
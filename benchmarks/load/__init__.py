@@ -0,0 +1,6 @@
+"""
+end to end load benchmark of a running service with a synthetic city dataset,
+see benchmarks.load.run
+
+    python -m benchmarks.load --base-url http://localhost:8001 --output baseline.json
+"""
@@ -0,0 +1,202 @@
+"""
+synthetic city for the load benchmark: a grid of streets around a city centre, paths
+are random walks along it (one segment per block) with a road-snapped looking
+geometry, random statuses and obstacles. everything comes from one seed, so the
+same arguments always give the same dataset
+
+    python -m benchmarks.load.city --paths 2000 --output city.ndjson
+"""
+from typing import Dict, Iterator, List, Tuple
+import argparse
+import json
+import math
+import random
+import uuid
+
+CENTER = (45.4642, 9.19)
+METERS_PER_DEGREE = 111320.0
+
+STATUS_WEIGHTS = {"OPTIMAL": 50, "MEDIUM": 30, "SUFFICIENT": 15, "REQUIRES_MAINTENANCE": 5}
+OBSTACLE_TYPES = ["POTHOLE", "ROUGH_SURFACE", "DEBRIS", "CONSTRUCTION", "OTHER"]
+OBSTACLE_SEVERITIES = ["MINOR", "MODERATE", "SEVERE"]
+
+# east, north, west, south
+_DIRECTIONS = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+
+
+class City:
+    """street grid of grid_size x grid_size junctions, block_meters apart"""
+
+    def __init__(self, grid_size: int = 60, block_meters: float = 120.0, center: Tuple[float, float] = CENTER):
+        self.grid_size = grid_size
+        self.block_meters = block_meters
+        self.lat_step = block_meters / METERS_PER_DEGREE
+        self.lon_step = block_meters / (METERS_PER_DEGREE * math.cos(math.radians(center[0])))
+        self.origin = (
+            center[0] - self.lat_step * grid_size / 2,
+            center[1] - self.lon_step * grid_size / 2
+        )
+
+    def junction(self, row: int, col: int) -> Tuple[float, float]:
+        return (self.origin[0] + row * self.lat_step, self.origin[1] + col * self.lon_step)
+
+    def offset(self, lat: float, lon: float, meters: float, rng: random.Random) -> Tuple[float, float]:
+        """a random point up to meters away from lat, lon"""
+        distance = meters * math.sqrt(rng.random())
+        angle = rng.uniform(0, 2 * math.pi)
+        return (
+            lat + distance * math.cos(angle) / METERS_PER_DEGREE,
+            lon + distance * math.sin(angle) / (METERS_PER_DEGREE * math.cos(math.radians(lat)))
+        )
+
+    def random_point(self, rng: random.Random) -> Tuple[float, float]:
+        return (
+            self.origin[0] + rng.uniform(0, self.grid_size) * self.lat_step,
+            self.origin[1] + rng.uniform(0, self.grid_size) * self.lon_step
+        )
+
+    def walk(self, rng: random.Random, length: int) -> List[Tuple[int, int]]:
+        """junctions of a random walk that mostly goes straight and never turns back"""
+        row, col = rng.randrange(self.grid_size), rng.randrange(self.grid_size)
+        heading = rng.randrange(4)
+        junctions = [(row, col)]
+        for _ in range(length):
+            options = [heading] * 3 + [(heading + 1) % 4, (heading + 3) % 4]
+            rng.shuffle(options)
+            for direction in options:
+                d_row, d_col = _DIRECTIONS[direction]
+                if 0 <= row + d_row < self.grid_size and 0 <= col + d_col < self.grid_size:
+                    break
+            else:
+                # a corner facing outwards, the only way left is back
+                direction = (heading + 2) % 4
+                d_row, d_col = _DIRECTIONS[direction]
+            heading = direction
+            row, col = row + d_row, col + d_col
+            junctions.append((row, col))
+        return junctions
+
+    def street_name(self, a: Tuple[int, int], b: Tuple[int, int]) -> str:
+        return f"Via {a[0]}" if a[0] == b[0] else f"Corso {a[1]}"
+
+
+def make_users(count: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    return [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(count)]
+
+
+def make_path(city: City, rng: random.Random, min_segments: int, max_segments: int,
+              points_per_segment: int, obstacle_rate: float, publishable: bool) -> dict:
+    """one ManualPathCreate body"""
+    junctions = city.walk(rng, rng.randint(min_segments, max_segments))
+    statuses, weights = list(STATUS_WEIGHTS), list(STATUS_WEIGHTS.values())
+
+    segments = []
+    obstacles = []
+    for order, (a, b) in enumerate(zip(junctions, junctions[1:])):
+        (start_lat, start_lon), (end_lat, end_lon) = city.junction(*a), city.junction(*b)
+
+        # straight along the block with a meter or so of noise, ends exactly on the junctions
+        geometry = [[start_lat, start_lon]]
+        for i in range(1, points_per_segment - 1):
+            t = i / (points_per_segment - 1)
+            lat, lon = city.offset(start_lat + (end_lat - start_lat) * t, start_lon + (end_lon - start_lon) * t, 1.5, rng)
+            geometry.append([round(lat, 7), round(lon, 7)])
+        geometry.append([end_lat, end_lon])
+
+        segments.append({
+            "streetName": city.street_name(a, b),
+            "status": rng.choices(statuses, weights)[0],
+            "startLatitude": start_lat,
+            "startLongitude": start_lon,
+            "endLatitude": end_lat,
+            "endLongitude": end_lon,
+            "order": order,
+            "routeGeometry": geometry if points_per_segment > 2 else None
+        })
+
+        if rng.random() < obstacle_rate:
+            lat, lon = city.offset(*rng.choice(geometry), 3.0, rng)
+            obstacles.append({
+                "type": rng.choice(OBSTACLE_TYPES),
+                "severity": rng.choice(OBSTACLE_SEVERITIES),
+                "latitude": lat,
+                "longitude": lon,
+                "description": "reported by the load benchmark"
+            })
+
+    return {
+        "name": f"Benchmark path {rng.getrandbits(32):08x}",
+        "segments": segments,
+        "obstacles": obstacles,
+        "publishable": publishable
+    }
+
+
+def generate_paths(city: City, count: int, users: List[str], seed: int, min_segments: int = 5,
+                   max_segments: int = 40, points_per_segment: int = 20, obstacle_rate: float = 0.1,
+                   public_ratio: float = 0.8) -> Iterator[Tuple[str, dict]]:
+    """(owner, ManualPathCreate body) for count paths"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        owner = rng.choice(users)
+        yield owner, make_path(
+            city, rng, min_segments, max_segments, points_per_segment, obstacle_rate, rng.random() < public_ratio
+        )
+
+
+def path_endpoints(path: dict) -> Tuple[float, float, float, float]:
+    first, last = path["segments"][0], path["segments"][-1]
+    return first["startLatitude"], first["startLongitude"], last["endLatitude"], last["endLongitude"]
+
+
+def summarize(paths: List[Tuple[str, dict]]) -> Dict[str, float]:
+    segments = sum(len(path["segments"]) for _, path in paths)
+    return {
+        "paths": len(paths),
+        "public_paths": sum(1 for _, path in paths if path["publishable"]),
+        "segments": segments,
+        "obstacles": sum(len(path["obstacles"]) for _, path in paths),
+        "geometry_points": sum(len(s["routeGeometry"] or []) for _, path in paths for s in path["segments"]),
+        "owners": len({owner for owner, _ in paths}),
+    }
+
+
+def add_dataset_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--paths", type=int, default=2000, help="paths to generate")
+    parser.add_argument("--users", type=int, default=50, help="owners the paths are spread over")
+    parser.add_argument("--min-segments", type=int, default=5)
+    parser.add_argument("--max-segments", type=int, default=40)
+    parser.add_argument("--points-per-segment", type=int, default=20, help="routeGeometry density, 2 for none")
+    parser.add_argument("--obstacle-rate", type=float, default=0.1, help="chance of an obstacle per segment")
+    parser.add_argument("--public-ratio", type=float, default=0.8, help="share of publishable paths")
+    parser.add_argument("--grid-size", type=int, default=60, help="junctions per side of the street grid")
+    parser.add_argument("--block-meters", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def dataset_from_arguments(args) -> Tuple[City, List[str], List[Tuple[str, dict]]]:
+    city = City(args.grid_size, args.block_meters)
+    users = make_users(args.users, args.seed)
+    paths = list(generate_paths(
+        city, args.paths, users, args.seed, args.min_segments, args.max_segments,
+        args.points_per_segment, args.obstacle_rate, args.public_ratio
+    ))
+    return city, users, paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_dataset_arguments(parser)
+    parser.add_argument("--output", required=True, help="NDJSON file, one {owner, path} object per line")
+    args = parser.parse_args()
+
+    _, _, paths = dataset_from_arguments(args)
+    with open(args.output, "w") as f:
+        for owner, path in paths:
+            f.write(json.dumps({"owner": owner, "path": path}) + "\n")
+    print(json.dumps(summarize(paths), indent=2))
+
+
+if __name__ == "__main__":
+    main()
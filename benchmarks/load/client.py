@@ -0,0 +1,81 @@
+"""
+plain http.client access to a running service for the load benchmark: one keep-alive
+connection per worker thread, bearer tokens signed with the service's secret and a
+reader for the counters of /metrics
+"""
+from typing import Dict, Optional, Tuple
+import http.client
+import re
+import urllib.parse
+
+from jose import jwt
+
+_METRIC_SAMPLE = re.compile(r'^([a-zA-Z_:][\w:]*)(?:\{(.*)\})?\s+(\S+)$')
+_METRIC_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def make_token(user_id: str, secret: str, algorithm: str = "HS256") -> str:
+    return jwt.encode({"user_id": user_id}, secret, algorithm=algorithm)
+
+
+class ServiceClient:
+    """one persistent connection, only to be used from a single thread"""
+
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        parsed = urllib.parse.urlsplit(base_url)
+        self._https = parsed.scheme == "https"
+        self._host = parsed.hostname or "localhost"
+        self._port = parsed.port
+        self._prefix = parsed.path.rstrip("/")
+        self._timeout = timeout
+        self._conn: Optional[http.client.HTTPConnection] = None
+
+    def _connect(self) -> http.client.HTTPConnection:
+        connection_class = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+        return connection_class(self._host, self._port, timeout=self._timeout)
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+        # the server may have closed an idle keep-alive connection, that gets one retry
+        # on a fresh connection. anything else is the caller's to count as an error
+        for attempt in range(2):
+            if self._conn is None:
+                self._conn = self._connect()
+            try:
+                self._conn.request(method, self._prefix + path, body=body, headers=headers or {})
+                response = self._conn.getresponse()
+                return response.status, response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self.close()
+                if attempt:
+                    raise
+            except Exception:
+                self.close()
+                raise
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def parse_metrics(text: str) -> Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float]:
+    """Prometheus text format to {(sample name, sorted label pairs): value}"""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = _METRIC_SAMPLE.match(line)
+        if not match:
+            continue
+        name, labels, value = match.groups()
+        label_pairs = tuple(sorted(_METRIC_LABEL.findall(labels or "")))
+        samples[(name, label_pairs)] = float(value)
+    return samples
+
+
+def scrape_metrics(client: ServiceClient) -> Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float]:
+    status, body = client.request("GET", "/metrics", headers={"Accept-Encoding": "identity"})
+    if status != 200:
+        return {}
+    return parse_metrics(body.decode())
@@ -0,0 +1,291 @@
+"""
+end to end load benchmark against a running service. generates a synthetic city
+(see benchmarks.load.city), loads it through POST /paths/import, then drives
+POST /paths/manual, GET /paths/search and GET /paths/{id} from --concurrency threads
+for --duration seconds and prints a JSON report: p50/p95/p99 latency, throughput,
+status codes and the database statements per request taken from /metrics.
+
+run the service with a single worker (every worker has its own /metrics) against an
+empty database, with the same JWT_SECRET_KEY as given here:
+
+    python database/setup_db.py
+    uvicorn app.main:app --port 8001
+    python -m benchmarks.load --base-url http://localhost:8001 --paths 2000 \\
+        --concurrency 16 --duration 30 --output baseline.json
+"""
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+
+from benchmarks.load.city import (
+    City, add_dataset_arguments, dataset_from_arguments, make_path, path_endpoints, summarize
+)
+from benchmarks.load.client import ServiceClient, make_token, scrape_metrics
+
+OPERATIONS = ("manual", "search", "detail")
+
+# route label of every operation in the service's metrics
+OPERATION_ROUTES = {
+    "manual": "/paths/manual",
+    "search": "/paths/search",
+    "detail": "/paths/{path_id}",
+}
+
+
+def log(message: str):
+    print(message, file=sys.stderr, flush=True)
+
+
+def load_dataset(client: ServiceClient, paths: List[Tuple[str, dict]], tokens: Dict[str, str],
+                 batch_paths: int) -> dict:
+    """imports every path as its owner, batch_paths paths per request"""
+    by_owner = defaultdict(list)
+    for owner, path in paths:
+        by_owner[owner].append(path)
+
+    started = time.perf_counter()
+    imported = failed = 0
+    for owner, owner_paths in by_owner.items():
+        for i in range(0, len(owner_paths), batch_paths):
+            body = "\n".join(json.dumps(path) for path in owner_paths[i:i + batch_paths]).encode()
+            status, data = client.request("POST", "/paths/import?format=ndjson", body, {
+                "Authorization": f"Bearer {tokens[owner]}",
+                "Content-Type": "application/x-ndjson",
+                "Accept-Encoding": "identity",
+            })
+            if status != 200:
+                raise SystemExit(f"import failed with {status}: {data[:500]!r}")
+            result = json.loads(data)
+            imported += result["importedPaths"]
+            failed += result["failedRecords"]
+
+    return {"imported_paths": imported, "failed_records": failed, "seconds": round(time.perf_counter() - started, 3)}
+
+
+def public_path_ids(client: ServiceClient) -> List[str]:
+    status, data = client.request("GET", "/paths/export?format=ndjson", headers={"Accept-Encoding": "identity"})
+    if status != 200:
+        raise SystemExit(f"export failed with {status}: {data[:500]!r}")
+    return [json.loads(line)["pathInfoId"] for line in data.splitlines() if line.strip()]
+
+
+class Workload:
+    """builds the requests of every operation, shared by all worker threads"""
+
+    def __init__(self, args, city: City, users: List[str], paths: List[Tuple[str, dict]],
+                 detail_targets: List[Tuple[str, Optional[str]]]):
+        self.args = args
+        self.city = city
+        self.users = users
+        self.paths = paths
+        self.tokens = {user: make_token(user, args.jwt_secret, args.jwt_algorithm) for user in users}
+        # (path id, owner or None for public paths), paths created by the run are added
+        self.detail_targets = detail_targets
+        self.weights = [args.manual_weight, args.search_weight, args.detail_weight]
+
+    def headers(self, user_id: Optional[str]) -> Dict[str, str]:
+        headers = {"Accept-Encoding": self.args.accept_encoding}
+        if user_id:
+            headers["Authorization"] = f"Bearer {self.tokens[user_id]}"
+        return headers
+
+    def manual(self, rng: random.Random):
+        owner = rng.choice(self.users)
+        path = make_path(
+            self.city, rng, self.args.min_segments, self.args.max_segments, self.args.points_per_segment,
+            self.args.obstacle_rate, rng.random() < self.args.public_ratio
+        )
+        headers = dict(self.headers(owner), **{"Content-Type": "application/json", "Accept-Encoding": "identity"})
+        return "POST", "/paths/manual", json.dumps(path).encode(), headers, owner
+
+    def search(self, rng: random.Random):
+        if rng.random() < self.args.search_miss_ratio:
+            # somewhere in the city, most of these find nothing (a 404)
+            (origin_lat, origin_lon), (dest_lat, dest_lon) = self.city.random_point(rng), self.city.random_point(rng)
+            caller = rng.choice([None, rng.choice(self.users)])
+        else:
+            owner, path = rng.choice(self.paths)
+            start_lat, start_lon, end_lat, end_lon = path_endpoints(path)
+            origin_lat, origin_lon = self.city.offset(start_lat, start_lon, self.args.search_jitter_meters, rng)
+            dest_lat, dest_lon = self.city.offset(end_lat, end_lon, self.args.search_jitter_meters, rng)
+            caller = owner if not path["publishable"] else rng.choice([None, rng.choice(self.users)])
+
+        query = urllib.parse.urlencode({
+            "originLat": origin_lat, "originLon": origin_lon, "destLat": dest_lat, "destLon": dest_lon
+        })
+        return "GET", f"/paths/search?{query}", None, self.headers(caller), None
+
+    def detail(self, rng: random.Random):
+        path_id, owner = rng.choice(self.detail_targets)
+        caller = owner or rng.choice([None, rng.choice(self.users)])
+        geometry = "true" if rng.random() < self.args.geometry_ratio else "false"
+        return "GET", f"/paths/{path_id}?includeGeometry={geometry}", None, self.headers(caller), None
+
+
+def drive(workload: Workload, concurrency: int, duration: float, seed: int) -> List[Tuple[str, int, float]]:
+    """runs the mix from concurrency threads for duration seconds, returns (operation, status, seconds)"""
+    deadline = time.monotonic() + duration
+    per_worker: List[List[Tuple[str, int, float]]] = [[] for _ in range(concurrency)]
+
+    def worker(index: int):
+        rng = random.Random(seed * 1000 + index)
+        client = ServiceClient(workload.args.base_url, workload.args.timeout)
+        records = per_worker[index]
+        builders = [workload.manual, workload.search, workload.detail]
+        try:
+            while time.monotonic() < deadline:
+                operation = rng.choices(OPERATIONS, workload.weights)[0]
+                method, path, body, headers, owner = builders[OPERATIONS.index(operation)](rng)
+
+                started = time.perf_counter()
+                try:
+                    status, data = client.request(method, path, body, headers)
+                except Exception:
+                    status, data = 0, b""
+                records.append((operation, status, time.perf_counter() - started))
+
+                if operation == "manual" and status == 201:
+                    workload.detail_targets.append((json.loads(data)["pathInfoId"], owner))
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=worker, args=(i,), name=f"load-{i}") for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return [record for records in per_worker for record in records]
+
+
+def _metric_delta(before: dict, after: dict, name: str, route: str) -> float:
+    key = (name, (("route", route),))
+    return after.get(key, 0.0) - before.get(key, 0.0)
+
+
+def report(records: List[Tuple[str, int, float]], duration: float, before: dict, after: dict) -> dict:
+    operations = {}
+    for operation in OPERATIONS:
+        latencies = np.array([seconds for op, _, seconds in records if op == operation]) * 1000
+        statuses = defaultdict(int)
+        for op, status, _ in records:
+            if op == operation:
+                statuses[str(status)] += 1
+        errors = sum(count for status, count in statuses.items() if status == "0" or status.startswith("5"))
+
+        route = OPERATION_ROUTES[operation]
+        measured = _metric_delta(before, after, "bbp_http_request_db_queries_count", route)
+        queries = _metric_delta(before, after, "bbp_http_request_db_queries_sum", route)
+        db_seconds = _metric_delta(before, after, "bbp_http_request_db_seconds_sum", route)
+
+        entry = {
+            "requests": len(latencies),
+            "errors": errors,
+            "statuses": dict(sorted(statuses.items())),
+            "throughput_rps": round(len(latencies) / duration, 2),
+            "latency_ms": None,
+            "db_queries_per_request": round(queries / measured, 3) if measured else None,
+            "db_ms_per_request": round(db_seconds * 1000 / measured, 3) if measured else None,
+        }
+        if len(latencies):
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            entry["latency_ms"] = {
+                "p50": round(float(p50), 3),
+                "p95": round(float(p95), 3),
+                "p99": round(float(p99), 3),
+                "mean": round(float(latencies.mean()), 3),
+                "max": round(float(latencies.max()), 3),
+            }
+        operations[operation] = entry
+
+    return {
+        "operations": operations,
+        "total": {
+            "requests": len(records),
+            "errors": sum(entry["errors"] for entry in operations.values()),
+            "throughput_rps": round(len(records) / duration, 2),
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--jwt-secret", default=os.getenv("JWT_SECRET_KEY"), help="defaults to $JWT_SECRET_KEY")
+    parser.add_argument("--jwt-algorithm", default=os.getenv("JWT_ALGORITHM", "HS256"))
+    add_dataset_arguments(parser)
+    parser.add_argument("--skip-load", action="store_true", help="the dataset of these arguments is already loaded")
+    parser.add_argument("--import-batch-paths", type=int, default=500, help="paths per /paths/import request")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds driven before measuring")
+    parser.add_argument("--manual-weight", type=float, default=1.0)
+    parser.add_argument("--search-weight", type=float, default=6.0)
+    parser.add_argument("--detail-weight", type=float, default=3.0)
+    parser.add_argument("--search-jitter-meters", type=float, default=40.0,
+                        help="how far search origins / destinations are from a stored path's ends")
+    parser.add_argument("--search-miss-ratio", type=float, default=0.1, help="share of searches at random points")
+    parser.add_argument("--geometry-ratio", type=float, default=0.3, help="share of details with includeGeometry")
+    parser.add_argument("--accept-encoding", default="gzip", help="Accept-Encoding of the read requests")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    if not args.jwt_secret:
+        parser.error("--jwt-secret or JWT_SECRET_KEY is required to sign the benchmark users' tokens")
+
+    city, users, paths = dataset_from_arguments(args)
+    dataset = summarize(paths)
+    log(f"dataset: {dataset}")
+
+    client = ServiceClient(args.base_url, args.timeout)
+    workload = Workload(args, city, users, paths, [])
+
+    if not args.skip_load:
+        dataset["load"] = load_dataset(client, paths, workload.tokens, args.import_batch_paths)
+        log(f"loaded: {dataset['load']}")
+
+    workload.detail_targets.extend((path_id, None) for path_id in public_path_ids(client))
+    if not workload.detail_targets:
+        raise SystemExit("no public paths in the service, nothing to request details of")
+
+    if args.warmup > 0:
+        log(f"warming up for {args.warmup}s")
+        drive(workload, args.concurrency, args.warmup, args.seed + 1)
+
+    log(f"measuring for {args.duration}s with {args.concurrency} threads")
+    before = scrape_metrics(client)
+    started = time.perf_counter()
+    records = drive(workload, args.concurrency, args.duration, args.seed + 2)
+    elapsed = time.perf_counter() - started
+    after = scrape_metrics(client)
+    client.close()
+
+    if not before:
+        log("no /metrics on the service, db_queries_per_request is left out")
+
+    result = {
+        "config": {key: value for key, value in vars(args).items() if key != "jwt_secret"},
+        "dataset": dataset,
+        "duration_seconds": round(elapsed, 3),
+        **report(records, elapsed, before, after),
+    }
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
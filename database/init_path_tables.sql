@@ -26,9 +26,22 @@ CREATE TABLE IF NOT EXISTS PathInfo (
     description TEXT,
     data_source data_source_type NOT NULL DEFAULT 'MANUAL',
     publishable BOOLEAN NOT NULL DEFAULT FALSE,
-    created_date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    created_date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    -- precomputed from the segments and obstacles by refresh_path_stats (see the triggers below)
+    score NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    total_distance_m NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    segment_count INTEGER NOT NULL DEFAULT 0,
+    obstacle_count INTEGER NOT NULL DEFAULT 0,
+    -- bumped on every change of the path, its segments or obstacles (see pathinfo_bump_version)
+    version BIGINT NOT NULL DEFAULT 1
 );
 
+ALTER TABLE PathInfo ADD COLUMN IF NOT EXISTS score NUMERIC(12, 2) NOT NULL DEFAULT 0;
+ALTER TABLE PathInfo ADD COLUMN IF NOT EXISTS total_distance_m NUMERIC(12, 2) NOT NULL DEFAULT 0;
+ALTER TABLE PathInfo ADD COLUMN IF NOT EXISTS segment_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE PathInfo ADD COLUMN IF NOT EXISTS obstacle_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE PathInfo ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 1;
+
 -- Table: Segments
 CREATE TABLE IF NOT EXISTS Segments (
     segment_id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -40,9 +53,12 @@ CREATE TABLE IF NOT EXISTS Segments (
     end_latitude NUMERIC(10, 7) NOT NULL,
     end_longitude NUMERIC(10, 7) NOT NULL,
     segment_order INTEGER NOT NULL,
-    length_meters NUMERIC(10, 2) NOT NULL DEFAULT 0
+    length_meters NUMERIC(10, 2) NOT NULL DEFAULT 0,
+    route_geometry TEXT  -- road-snapped shape as an encoded polyline (precision 6), NULL if not provided
 );
 
+ALTER TABLE Segments ADD COLUMN IF NOT EXISTS route_geometry TEXT;
+
 -- Table: Obstacles
 CREATE TABLE IF NOT EXISTS Obstacles (
     obstacle_id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -56,14 +72,200 @@ CREATE TABLE IF NOT EXISTS Obstacles (
     confirmed BOOLEAN NOT NULL DEFAULT TRUE
 );
 
+-- Table: PathEndpoints
+-- One summary row per PathInfo (first segment start, last segment end, total length and
+-- visibility) so route search can prefilter candidates with an index range scan
+CREATE TABLE IF NOT EXISTS PathEndpoints (
+    path_info_id UUID PRIMARY KEY REFERENCES PathInfo(path_info_id) ON DELETE CASCADE,
+    user_id UUID,
+    publishable BOOLEAN NOT NULL DEFAULT FALSE,
+    start_latitude NUMERIC(10, 7) NOT NULL,
+    start_longitude NUMERIC(10, 7) NOT NULL,
+    end_latitude NUMERIC(10, 7) NOT NULL,
+    end_longitude NUMERIC(10, 7) NOT NULL,
+    total_length_meters NUMERIC(12, 2) NOT NULL DEFAULT 0
+);
+
+-- Backfill summaries for paths created before PathEndpoints existed
+INSERT INTO PathEndpoints (
+    path_info_id, user_id, publishable,
+    start_latitude, start_longitude, end_latitude, end_longitude, total_length_meters
+)
+SELECT DISTINCT ON (pi.path_info_id)
+       pi.path_info_id, pi.user_id, pi.publishable,
+       first_value(s.start_latitude) OVER w,
+       first_value(s.start_longitude) OVER w,
+       last_value(s.end_latitude) OVER w,
+       last_value(s.end_longitude) OVER w,
+       sum(s.length_meters) OVER w
+FROM PathInfo pi
+JOIN Segments s ON pi.path_info_id = s.path_info_id
+WINDOW w AS (
+    PARTITION BY s.path_info_id ORDER BY s.segment_order
+    ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+)
+ORDER BY pi.path_info_id
+ON CONFLICT (path_info_id) DO NOTHING;
+
+-- Path stats: score, total distance and counts stored on PathInfo.
+-- The score mirrors calculate_path_score in app/utils/geo_utils.py: segment length
+-- times a status multiplier, plus a penalty per obstacle by severity
+CREATE OR REPLACE FUNCTION refresh_path_stats(path_ids UUID[]) RETURNS VOID AS $$
+BEGIN
+    -- the rows are locked first (in id order, so two refreshes never deadlock) and the
+    -- stats are aggregated in a new statement. under READ COMMITTED that statement gets a
+    -- new snapshot which has the segments and obstacles of a transaction that held the
+    -- lock until it committed. an UPDATE that waits for the lock itself would aggregate on
+    -- its snapshot from before the wait and drop the other transaction's rows
+    PERFORM 1 FROM PathInfo WHERE path_info_id = ANY(path_ids) ORDER BY path_info_id FOR UPDATE;
+
+    UPDATE PathInfo pi
+    SET total_distance_m = COALESCE(seg.total_distance_m, 0),
+        segment_count = COALESCE(seg.segment_count, 0),
+        obstacle_count = COALESCE(obs.obstacle_count, 0),
+        score = round(COALESCE(seg.weighted_length, 0) + COALESCE(obs.penalty, 0), 2)
+    FROM unnest(path_ids) AS ids(path_info_id)
+    LEFT JOIN (
+        SELECT s.path_info_id,
+               sum(s.length_meters) AS total_distance_m,
+               count(*) AS segment_count,
+               sum(s.length_meters * CASE s.status
+                   WHEN 'OPTIMAL' THEN 1.0
+                   WHEN 'MEDIUM' THEN 1.2
+                   WHEN 'SUFFICIENT' THEN 1.5
+                   WHEN 'REQUIRES_MAINTENANCE' THEN 2.0
+                   ELSE 1.0
+               END) AS weighted_length
+        FROM Segments s
+        WHERE s.path_info_id = ANY(path_ids)
+        GROUP BY s.path_info_id
+    ) seg ON seg.path_info_id = ids.path_info_id
+    LEFT JOIN (
+        SELECT s.path_info_id,
+               count(*) AS obstacle_count,
+               sum(CASE o.severity
+                   WHEN 'MINOR' THEN 50
+                   WHEN 'MODERATE' THEN 150
+                   WHEN 'SEVERE' THEN 400
+                   ELSE 0
+               END) AS penalty
+        FROM Obstacles o
+        JOIN Segments s ON s.segment_id = o.segment_id
+        WHERE s.path_info_id = ANY(path_ids)
+        GROUP BY s.path_info_id
+    ) obs ON obs.path_info_id = ids.path_info_id
+    WHERE pi.path_info_id = ids.path_info_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement level triggers: one refresh per statement for every path it touched,
+-- so a bulk insert of many segments recomputes each path once.
+-- Transition tables only work with a single event per trigger, hence one trigger per event
+CREATE OR REPLACE FUNCTION segments_refresh_path_stats() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_path_stats(ARRAY(SELECT DISTINCT path_info_id FROM new_rows));
+    ELSIF TG_OP = 'UPDATE' THEN
+        PERFORM refresh_path_stats(ARRAY(
+            SELECT path_info_id FROM new_rows UNION SELECT path_info_id FROM old_rows
+        ));
+    ELSE
+        PERFORM refresh_path_stats(ARRAY(SELECT DISTINCT path_info_id FROM old_rows));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION obstacles_refresh_path_stats() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_path_stats(ARRAY(
+            SELECT DISTINCT s.path_info_id FROM new_rows r JOIN Segments s ON s.segment_id = r.segment_id
+        ));
+    ELSIF TG_OP = 'UPDATE' THEN
+        PERFORM refresh_path_stats(ARRAY(
+            SELECT s.path_info_id FROM new_rows r JOIN Segments s ON s.segment_id = r.segment_id
+            UNION
+            SELECT s.path_info_id FROM old_rows r JOIN Segments s ON s.segment_id = r.segment_id
+        ));
+    ELSE
+        -- obstacles removed by a segment delete cascade have no segment left, the
+        -- Segments trigger refreshes those paths
+        PERFORM refresh_path_stats(ARRAY(
+            SELECT DISTINCT s.path_info_id FROM old_rows r JOIN Segments s ON s.segment_id = r.segment_id
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS segments_stats_insert ON Segments;
+CREATE TRIGGER segments_stats_insert AFTER INSERT ON Segments
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION segments_refresh_path_stats();
+
+DROP TRIGGER IF EXISTS segments_stats_update ON Segments;
+CREATE TRIGGER segments_stats_update AFTER UPDATE ON Segments
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION segments_refresh_path_stats();
+
+DROP TRIGGER IF EXISTS segments_stats_delete ON Segments;
+CREATE TRIGGER segments_stats_delete AFTER DELETE ON Segments
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION segments_refresh_path_stats();
+
+DROP TRIGGER IF EXISTS obstacles_stats_insert ON Obstacles;
+CREATE TRIGGER obstacles_stats_insert AFTER INSERT ON Obstacles
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION obstacles_refresh_path_stats();
+
+DROP TRIGGER IF EXISTS obstacles_stats_update ON Obstacles;
+CREATE TRIGGER obstacles_stats_update AFTER UPDATE ON Obstacles
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION obstacles_refresh_path_stats();
+
+DROP TRIGGER IF EXISTS obstacles_stats_delete ON Obstacles;
+CREATE TRIGGER obstacles_stats_delete AFTER DELETE ON Obstacles
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION obstacles_refresh_path_stats();
+
+-- PathInfo.version, the ETag of the path details is built from it. every segment or
+-- obstacle change goes through refresh_path_stats, which updates the PathInfo row,
+-- so this one row trigger covers those as well as direct updates of PathInfo
+CREATE OR REPLACE FUNCTION pathinfo_bump_version() RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.version = OLD.version THEN
+        NEW.version := OLD.version + 1;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS pathinfo_version ON PathInfo;
+CREATE TRIGGER pathinfo_version BEFORE UPDATE ON PathInfo
+    FOR EACH ROW EXECUTE FUNCTION pathinfo_bump_version();
+
+-- Backfill stats for paths created before the columns existed
+SELECT refresh_path_stats(ARRAY(
+    SELECT pi.path_info_id FROM PathInfo pi
+    WHERE pi.segment_count = 0
+      AND EXISTS (SELECT 1 FROM Segments s WHERE s.path_info_id = pi.path_info_id)
+));
+
 -- Create indexes for performance
 CREATE INDEX IF NOT EXISTS idx_pathinfo_user_id ON PathInfo(user_id);
 CREATE INDEX IF NOT EXISTS idx_pathinfo_publishable ON PathInfo(publishable);
+CREATE INDEX IF NOT EXISTS idx_pathinfo_score ON PathInfo(score);
+CREATE INDEX IF NOT EXISTS idx_pathinfo_created_date ON PathInfo(created_date);
 CREATE INDEX IF NOT EXISTS idx_segments_path_info_id ON Segments(path_info_id);
 CREATE INDEX IF NOT EXISTS idx_segments_coordinates ON Segments(start_latitude, start_longitude, end_latitude, end_longitude);
 CREATE INDEX IF NOT EXISTS idx_obstacles_segment_id ON Obstacles(segment_id);
 CREATE INDEX IF NOT EXISTS idx_obstacles_coordinates ON Obstacles(latitude, longitude);
+CREATE INDEX IF NOT EXISTS idx_obstacles_reported_date ON Obstacles(reported_date);
+CREATE INDEX IF NOT EXISTS idx_pathendpoints_start ON PathEndpoints(start_latitude, start_longitude);
+CREATE INDEX IF NOT EXISTS idx_pathendpoints_end ON PathEndpoints(end_latitude, end_longitude);
 
 COMMENT ON TABLE PathInfo IS 'Stores metadata about bike paths entered manually or collected automatically';
 COMMENT ON TABLE Segments IS 'Stores individual segments of a path with status and coordinates';
 COMMENT ON TABLE Obstacles IS 'Stores obstacles reported on path segments';
+COMMENT ON TABLE PathEndpoints IS 'Stores start/end coordinates, length and visibility per path for search prefiltering';
@@ -25,6 +25,8 @@ def setup_database():
         print("  - PathInfo table")
         print("  - Segments table")
         print("  - Obstacles table")
+        print("  - PathEndpoints table")
+        print("  - Path stats and version triggers")
         print("  - Indexes created")
 
         cursor.close()
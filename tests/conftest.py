@@ -0,0 +1,108 @@
+"""
+the tests run without postgres: the app is used without its lifespan (no pool, no
+indexes) and run_db gets connections from a FakeDatabase instead of the pool.
+settings are read at import time, so the environment is set before app is imported
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/bbp_test")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+os.environ["PATH_SNAPSHOT_FILE"] = ""
+
+import pytest
+
+from app.config import database
+from app.services import path_cache, path_export
+from app.services.spatial_index import path_endpoint_index
+from app.utils.security import token_cache
+
+
+class FakeCursor:
+    """answers every statement with the rows handler(sql, params) returns and counts it"""
+
+    def __init__(self, db: "FakeDatabase"):
+        self._db = db
+        self._rows = []
+        self.rowcount = -1
+        self.itersize = 2000
+        self.closed = False
+
+    def execute(self, query, vars=None):
+        self._db.statements.append(" ".join(query.split()))
+        self._rows = list(self._db.handler(query, vars))
+        self.rowcount = len(self._rows)
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def __iter__(self):
+        while self._rows:
+            yield self._rows.pop(0)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self, db: "FakeDatabase"):
+        self._db = db
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self._db)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.statements = []
+        self.handler = lambda query, vars: []
+        self.checked_out = 0
+
+    def get_db_connection(self):
+        self.checked_out += 1
+        return FakeConnection(self)
+
+    def return_db_connection(self, conn, broken=False):
+        self.checked_out -= 1
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    db = FakeDatabase()
+    executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="db")
+    monkeypatch.setattr(database, "get_db_connection", db.get_db_connection)
+    monkeypatch.setattr(database, "return_db_connection", db.return_db_connection)
+    monkeypatch.setattr(path_export, "return_db_connection", db.return_db_connection)
+    monkeypatch.setattr(database, "db_executor", executor)
+    yield db
+    executor.shutdown(wait=True)
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    """the caches and the endpoint index are module globals, every test starts empty"""
+    def reset():
+        path_cache.search_cache.clear()
+        path_cache.path_detail_cache.clear()
+        token_cache.clear()
+        path_endpoint_index.load([])
+        path_endpoint_index.is_loaded = False
+
+    reset()
+    yield
+    reset()
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
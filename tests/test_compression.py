@@ -0,0 +1,54 @@
+"""
+every response whose body could be compressed says Vary: Accept-Encoding, also
+when it is sent as it is (too small, or the client only takes identity)
+"""
+import gzip
+
+from fastapi.testclient import TestClient
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+
+from app.utils.compression import CompressionMiddleware
+
+LARGE = {"points": [[45.4642, 9.19]] * 500}
+
+
+def make_client():
+    app = Starlette(routes=[
+        Route("/large", lambda request: JSONResponse(LARGE)),
+        Route("/small", lambda request: JSONResponse({"ok": True})),
+        Route("/image", lambda request: Response(b"\x89PNG" * 1000, media_type="image/png")),
+        Route("/not-modified", lambda request: Response(status_code=304, headers={"ETag": '"1"'})),
+        Route("/encoded", lambda request: PlainTextResponse(
+            gzip.compress(b"x" * 2000), headers={"Content-Encoding": "gzip"}
+        )),
+    ])
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    return TestClient(app)
+
+
+def vary(response) -> str:
+    return response.headers.get("vary", "")
+
+
+@pytest.mark.parametrize("accept_encoding", ["gzip", "br", "identity"])
+@pytest.mark.parametrize("path", ["/large", "/small", "/not-modified"])
+def test_vary_on_every_compressible_response(path, accept_encoding):
+    response = make_client().get(path, headers={"Accept-Encoding": accept_encoding})
+    assert vary(response) == "Accept-Encoding"
+
+
+def test_large_body_is_compressed_only_when_accepted():
+    client = make_client()
+    assert client.get("/large", headers={"Accept-Encoding": "gzip"}).headers["content-encoding"] == "gzip"
+    identity = client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in identity.headers
+    assert identity.json() == LARGE
+
+
+@pytest.mark.parametrize("path", ["/image", "/encoded"])
+def test_no_vary_on_bodies_that_are_never_compressed(path):
+    response = make_client().get(path, headers={"Accept-Encoding": "gzip"})
+    assert "accept-encoding" not in vary(response).lower()
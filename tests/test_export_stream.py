@@ -0,0 +1,76 @@
+"""
+the export stream holds a pooled conection while it runs, it has to go back as
+soon as the response ends, also when the client disconnects halfway
+"""
+import gc
+
+import pytest
+
+from app.main import app
+from app.services.path_export import EXPORT_CHUNK_BYTES
+
+RECORD = '{"pathInfoId":"%d","padding":"' + "x" * (EXPORT_CHUNK_BYTES // 2) + '"}'
+RECORDS = 20
+
+
+def export_scope():
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.4"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/paths/export",
+        "raw_path": b"/paths/export",
+        "query_string": b"format=ndjson",
+        "root_path": "",
+        "headers": [(b"host", b"test"), (b"accept-encoding", b"identity")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("test", 80),
+    }
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+@pytest.fixture
+def no_gc():
+    # the conection must come back without the garbage collector's help
+    gc.disable()
+    yield
+    gc.enable()
+
+
+@pytest.mark.anyio
+async def test_full_export_returns_the_connection(fake_db, no_gc):
+    fake_db.handler = lambda query, params: [(RECORD % i,) for i in range(RECORDS)]
+    body = []
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message["body"])
+
+    await app(export_scope(), receive, send)
+
+    assert len(b"".join(body).splitlines()) == RECORDS
+    assert fake_db.checked_out == 0
+
+
+@pytest.mark.anyio
+async def test_client_disconnect_returns_the_connection(fake_db, no_gc):
+    fake_db.handler = lambda query, params: [(RECORD % i,) for i in range(RECORDS)]
+    sent_chunks = 0
+
+    async def send(message):
+        nonlocal sent_chunks
+        if message["type"] == "http.response.body":
+            sent_chunks += 1
+            if sent_chunks == 2:
+                raise OSError("client went away")
+
+    with pytest.raises(Exception):
+        await app(export_scope(), receive, send)
+
+    assert sent_chunks == 2
+    assert fake_db.checked_out == 0
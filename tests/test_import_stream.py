@@ -0,0 +1,79 @@
+"""
+the GeoJSON import reads one feature at a time from the body chunks, a large
+feature split into many small chunks must be decoded in linear time
+"""
+import json
+
+import anyio
+import pytest
+
+from app.services import path_import
+from app.services.path_import import iter_geojson_features
+from app.utils.exceptions import ImportFormatException
+
+
+def feature(points: int, name: str) -> dict:
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "LineString",
+            "coordinates": [[9.19 + i * 1e-5, 45.4642 - i * 1e-5] for i in range(points)]
+        },
+        "properties": {"name": name, "status": "OPTIMAL", "publishable": True}
+    }
+
+
+async def chunked(body: bytes, size: int):
+    for i in range(0, len(body), size):
+        yield body[i:i + size]
+
+
+def read_features(body: bytes, chunk_size: int, max_record_bytes: int = 16 * 1024 * 1024):
+    async def read():
+        return [record async for record in iter_geojson_features(chunked(body, chunk_size), max_record_bytes)]
+    return anyio.run(read)
+
+
+@pytest.fixture
+def decoded_chars(monkeypatch):
+    """how many characters raw_decode was handed, over all its calls"""
+    counts = {"calls": 0, "chars": 0}
+
+    class CountingDecoder(json.JSONDecoder):
+        def raw_decode(self, s, idx=0):
+            counts["calls"] += 1
+            counts["chars"] += len(s) - idx
+            return super().raw_decode(s, idx)
+
+    monkeypatch.setattr(path_import.json, "JSONDecoder", CountingDecoder)
+    return counts
+
+
+def test_large_feature_in_small_chunks_is_decoded_a_few_times(decoded_chars):
+    large = feature(100_000, "Lungo il Naviglio")
+    body = json.dumps({"type": "FeatureCollection", "features": [large, feature(3, "corto")]}).encode()
+    chunk_size = 4096
+    assert len(body) // chunk_size > 500
+
+    records = read_features(body, chunk_size)
+
+    assert [record_no for record_no, _, _ in records] == [1, 2]
+    assert records[0][1] == large
+    # doubling the text before every retry keeps the work linear in the body size
+    assert decoded_chars["chars"] < 4 * len(body)
+    assert decoded_chars["calls"] < 60
+
+
+def test_values_split_anywhere_are_read_whole():
+    features = [feature(5, "Città Studi"), feature(4, "Ripa di Porta Ticinese")]
+    body = json.dumps({"type": "FeatureCollection", "name": "milano", "features": features}).encode()
+
+    for chunk_size in (1, 3, 7, 64):
+        assert [record for _, record, _ in read_features(body, chunk_size)] == features
+
+
+def test_feature_over_the_limit_is_refused():
+    body = json.dumps({"type": "FeatureCollection", "features": [feature(10_000, "troppo lungo")]}).encode()
+
+    with pytest.raises(ImportFormatException, match="larger than"):
+        read_features(body, 4096, max_record_bytes=50_000)
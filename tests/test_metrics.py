@@ -0,0 +1,47 @@
+"""metric classes and their text format"""
+import pytest
+
+from app.utils import metrics
+from app.utils.metrics import Counter, Histogram, _Metric
+
+
+@pytest.fixture
+def registered():
+    """metrics made by a test are taken out of the global registry again"""
+    before = list(metrics._registry)
+    yield
+    metrics._registry[:] = before
+
+
+def test_incomplete_metric_fails_when_instantiated(registered):
+    class NoSamples(_Metric):
+        def _new_slot(self):
+            return [0]
+
+    with pytest.raises(TypeError):
+        NoSamples("bbp_test_incomplete", "never registered")
+    with pytest.raises(TypeError):
+        _Metric("bbp_test_base", "never registered")
+    assert all(metric.name not in ("bbp_test_incomplete", "bbp_test_base") for metric in metrics._registry)
+
+
+def test_counter_and_histogram_render(registered):
+    counter = Counter("bbp_test_total", "test counter", ("route",))
+    counter.inc(("/a",))
+    counter.inc(("/a",), 2)
+    histogram = Histogram("bbp_test_seconds", "test histogram", (), (0.1, 1.0))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+
+    assert counter.render() == [
+        "# HELP bbp_test_total test counter",
+        "# TYPE bbp_test_total counter",
+        'bbp_test_total{route="/a"} 3',
+    ]
+    assert histogram.render()[2:] == [
+        'bbp_test_seconds_bucket{le="0.1"} 1',
+        'bbp_test_seconds_bucket{le="1.0"} 2',
+        'bbp_test_seconds_bucket{le="+Inf"} 2',
+        "bbp_test_seconds_sum 0.55",
+        "bbp_test_seconds_count 2",
+    ]
@@ -0,0 +1,154 @@
+"""
+obstacle matching through the numpy full scan and the SegmentEdgeGrid gives the
+same segments as the scalar find_nearest_segment loop it replaced
+"""
+import math
+import random
+
+import pytest
+
+from app.utils.geo_utils import EARTH_RADIUS_METERS, match_obstacles_to_segments
+
+
+# the scalar math-module version of find_nearest_segment before the batch kernels,
+# kept here as the reference the batch matching has to agree with
+
+def scalar_haversine(lat1, lon1, lat2, lon2):
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    delta_phi = math.radians(lat2 - lat1)
+    delta_lambda = math.radians(lon2 - lon1)
+
+    a = math.sin(delta_phi / 2) ** 2 + \
+        math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
+
+    return EARTH_RADIUS_METERS * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def scalar_point_to_segment(px, py, x1, y1, x2, y2):
+    dx = x2 - x1
+    dy = y2 - y1
+    if dx == 0 and dy == 0:
+        return scalar_haversine(px, py, x1, y1)
+
+    t = ((px - x1) * dx + (py - y1) * dy) / (dx * dx + dy * dy)
+    t = max(0, min(1, t))
+    return scalar_haversine(px, py, x1 + t * dx, y1 + t * dy)
+
+
+def scalar_nearest(lat, lon, segments):
+    """(segment_id, distance) of the nearest segment, same loop as the old find_nearest_segment"""
+    min_distance = float('inf')
+    nearest_segment_id = None
+
+    for segment in segments:
+        route_geometry = segment.get('route_geometry')
+        if route_geometry and len(route_geometry) >= 2:
+            lines = [(*p1, *p2) for p1, p2 in zip(route_geometry, route_geometry[1:])]
+        else:
+            lines = [(segment['start_latitude'], segment['start_longitude'],
+                      segment['end_latitude'], segment['end_longitude'])]
+
+        for line in lines:
+            distance = scalar_point_to_segment(lat, lon, *line)
+            if distance < min_distance:
+                min_distance = distance
+                nearest_segment_id = segment['segment_id']
+
+    return nearest_segment_id, min_distance
+
+
+def scalar_find_nearest_segment(lat, lon, segments, max_distance_meters):
+    nearest_segment_id, min_distance = scalar_nearest(lat, lon, segments)
+    return None if min_distance > max_distance_meters else nearest_segment_id
+
+
+def make_segments(rng, lat, lon, count, with_geometry=0.7):
+    """a wiggly path starting at (lat, lon), ~1 m steps, some segments only have start/end"""
+    segments = []
+    for idx in range(count):
+        geometry = [[lat, lon]]
+        for _ in range(rng.randint(1, 60)):
+            lat = max(-90.0, min(90.0, lat + rng.uniform(-0.00001, 0.00003)))
+            lon = lon + rng.uniform(-0.00001, 0.00003)
+            geometry.append([lat, lon])
+
+        segment = {
+            'segment_id': f"segment-{idx}",
+            'start_latitude': geometry[0][0],
+            'start_longitude': geometry[0][1],
+            'end_latitude': geometry[-1][0],
+            'end_longitude': geometry[-1][1],
+        }
+        if rng.random() < with_geometry:
+            segment['route_geometry'] = geometry
+        segments.append(segment)
+    return segments
+
+
+def obstacles_around(rng, segments, count, spread=0.0005):
+    points = []
+    for _ in range(count):
+        segment = rng.choice(segments)
+        lat, lon = rng.choice(segment.get('route_geometry') or [[segment['start_latitude'], segment['start_longitude']]])
+        points.append((max(-90.0, min(90.0, lat + rng.uniform(-spread, spread))), lon + rng.uniform(-spread, spread)))
+    return points
+
+
+def assert_same_as_scalar(obstacles, segments, max_distance_meters):
+    expected = [scalar_find_nearest_segment(lat, lon, segments, max_distance_meters) for lat, lon in obstacles]
+    assert match_obstacles_to_segments(obstacles, segments, max_distance_meters, use_index=False) == expected
+    assert match_obstacles_to_segments(obstacles, segments, max_distance_meters, use_index=True) == expected
+    return expected
+
+
+@pytest.mark.parametrize("with_geometry", [0.0, 0.7, 1.0])
+@pytest.mark.parametrize("max_distance", [5.0, 50.0, 500.0])
+def test_city_paths(with_geometry, max_distance):
+    rng = random.Random(42)
+    segments = make_segments(rng, 45.4642, 9.19, 40, with_geometry)
+    obstacles = obstacles_around(rng, segments, 200)
+
+    expected = assert_same_as_scalar(obstacles, segments, max_distance)
+    assert any(expected)
+    if max_distance < 500:
+        assert not all(expected)
+
+
+def test_obstacles_exactly_at_the_radius():
+    rng = random.Random(7)
+    segments = make_segments(rng, 45.4642, 9.19, 20)
+    obstacles = obstacles_around(rng, segments, 50, spread=0.002)
+
+    for lat, lon in obstacles:
+        segment_id, distance = scalar_nearest(lat, lon, segments)
+        # on the radius still matches, anything closer than the obstacle does not
+        assert match_obstacles_to_segments([(lat, lon)], segments, distance, use_index=False) == [segment_id]
+        assert match_obstacles_to_segments([(lat, lon)], segments, distance, use_index=True) == [segment_id]
+        assert match_obstacles_to_segments([(lat, lon)], segments, distance * (1 - 1e-9), use_index=True) == [None]
+
+
+@pytest.mark.parametrize("lon", [179.999, -179.9995])
+def test_antimeridian(lon):
+    rng = random.Random(3)
+    segments = make_segments(rng, -16.5, lon, 30)
+    # the path walks east over the line, put the tail back into [-180, 180]
+    for segment in segments:
+        for point in segment.get('route_geometry', []):
+            point[1] = (point[1] + 180) % 360 - 180
+        segment['start_longitude'] = (segment['start_longitude'] + 180) % 360 - 180
+        segment['end_longitude'] = (segment['end_longitude'] + 180) % 360 - 180
+    obstacles = [(lat, (lon + 180) % 360 - 180) for lat, lon in obstacles_around(rng, segments, 100)]
+
+    for max_distance in (5.0, 50.0, 500.0):
+        assert_same_as_scalar(obstacles, segments, max_distance)
+
+
+@pytest.mark.parametrize("lat", [89.9995, -89.9999])
+def test_poles(lat):
+    rng = random.Random(11)
+    segments = make_segments(rng, lat, 12.0, 30)
+    obstacles = obstacles_around(rng, segments, 100) + [(90.0, 0.0), (-90.0, 0.0), (lat, -170.0)]
+
+    for max_distance in (5.0, 50.0, 500.0):
+        assert_same_as_scalar(obstacles, segments, max_distance)
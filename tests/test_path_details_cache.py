@@ -0,0 +1,74 @@
+"""
+the detail cache holds one body per path for every caller, a private path that is
+cached for its owner must still be a 404 for everybody else (also for a 304)
+"""
+from datetime import datetime
+from decimal import Decimal
+
+from fastapi.testclient import TestClient
+from jose import jwt
+
+from app.config.settings import settings
+from app.main import app
+from app.services.path_cache import path_detail_cache, path_detail_key
+
+PATH_ID = "9b2e7a4c-1d3f-4e5a-8b6c-7d8e9f0a1b2c"
+OWNER = "3f1c3c52-8d0e-4a0b-9a43-6d1f3e2b7c10"
+OTHER = "a7d4e1f0-2b3c-4d5e-9f60-718293a4b5c6"
+SEGMENT_ID = "c1d2e3f4-a5b6-4c7d-8e9f-0a1b2c3d4e5f"
+
+
+def private_path(query, params):
+    if "FROM PathInfo" in query:
+        return [(PATH_ID, OWNER, "Naviglio", None, "MANUAL", False, datetime(2026, 1, 1).isoformat(),
+                 Decimal("111.19"), Decimal("111.19"), 3)]
+    if "FROM Segments" in query:
+        return [(SEGMENT_ID, "Via Roma", "OPTIMAL", 45.0, 9.0, 45.001, 9.0, 0, Decimal("111.19"), PATH_ID)]
+    if "FROM Obstacles" in query:
+        return []
+    raise AssertionError(f"unexpected statement: {query}")
+
+
+def auth(user_id: str) -> dict:
+    token = jwt.encode({"user_id": user_id}, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+    return {"Authorization": f"Bearer {token}"}
+
+
+def get(user_id=None, if_none_match=None):
+    headers = auth(user_id) if user_id else {}
+    if if_none_match:
+        headers["If-None-Match"] = if_none_match
+    return TestClient(app).get(f"/paths/{PATH_ID}", headers=headers)
+
+
+def test_cached_private_path_is_not_served_to_other_users(fake_db):
+    fake_db.handler = private_path
+
+    owner = get(OWNER)
+    assert owner.status_code == 200
+    assert path_detail_cache.get(path_detail_key(PATH_ID, False)) is not None
+    statements = len(fake_db.statements)
+
+    assert get(OTHER).status_code == 404
+    assert get().status_code == 404
+    # answered from the cache, the visibility check ran on the hit
+    assert len(fake_db.statements) == statements
+
+    # the owner still gets the cached body
+    assert get(OWNER).json() == owner.json()
+
+
+def test_if_none_match_of_a_private_path_is_a_404_for_other_users(fake_db):
+    fake_db.handler = private_path
+
+    # before anything is cached (the database path) ...
+    etag = '"%s-3-plain"' % PATH_ID
+    assert get(OTHER, if_none_match=etag).status_code == 404
+
+    # ... and on a cache hit
+    owner = get(OWNER)
+    assert owner.headers["etag"] == etag
+    assert get(OWNER, if_none_match=etag).status_code == 304
+    assert get(OTHER, if_none_match=etag).status_code == 404
+    assert get(if_none_match=etag).status_code == 404
+    assert get(OTHER, if_none_match="*").status_code == 404
@@ -0,0 +1,103 @@
+"""
+the path stats triggers against a real postgres: two transactions adding obstacles
+to the same path at once must both end up in its counts and score. needs
+TEST_DATABASE_URL, the schema is created in a throwaway postgres schema and dropped
+"""
+import os
+import threading
+import time
+import uuid
+
+import psycopg2
+import pytest
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+INIT_SQL = os.path.join(os.path.dirname(__file__), "..", "database", "init_path_tables.sql")
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+
+@pytest.fixture
+def connect():
+    schema = f"test_stats_{uuid.uuid4().hex[:12]}"
+    connections = []
+
+    def connect():
+        conn = psycopg2.connect(TEST_DATABASE_URL, options=f"-c search_path={schema},public")
+        connections.append(conn)
+        return conn
+
+    admin = psycopg2.connect(TEST_DATABASE_URL)
+    admin.autocommit = True
+    admin.cursor().execute(f"CREATE SCHEMA {schema}")
+    try:
+        setup = connect()
+        with open(INIT_SQL) as f:
+            setup.cursor().execute(f.read())
+        setup.commit()
+        yield connect
+    finally:
+        for conn in connections:
+            conn.close()
+        admin.cursor().execute(f"DROP SCHEMA {schema} CASCADE")
+        admin.close()
+
+
+def add_obstacle(cursor, segment_id: str, severity: str):
+    cursor.execute("""
+        INSERT INTO Obstacles (segment_id, type, severity, latitude, longitude)
+        VALUES (%s, 'POTHOLE', %s, 45.0, 9.0)
+    """, (segment_id, severity))
+
+
+def wait_until_blocked(watcher, pid: int):
+    cursor = watcher.cursor()
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        cursor.execute("SELECT wait_event_type FROM pg_stat_activity WHERE pid = %s", (pid,))
+        if cursor.fetchone()[0] == "Lock":
+            return
+        time.sleep(0.01)
+    raise AssertionError("the second transaction never waited for the path lock")
+
+
+def test_concurrent_obstacles_are_all_counted(connect):
+    setup = connect()
+    cursor = setup.cursor()
+    cursor.execute("INSERT INTO PathInfo (name, publishable) VALUES ('Naviglio', TRUE) RETURNING path_info_id")
+    path_id = cursor.fetchone()[0]
+    cursor.execute("""
+        INSERT INTO Segments (path_info_id, start_latitude, start_longitude, end_latitude, end_longitude,
+                              segment_order, length_meters)
+        VALUES (%s, 45.0, 9.0, 45.001, 9.0, 0, 111.19) RETURNING segment_id
+    """, (path_id,))
+    segment_id = cursor.fetchone()[0]
+    setup.commit()
+
+    first, second, watcher = connect(), connect(), connect()
+    watcher.autocommit = True
+
+    # first holds the path row until it commits
+    add_obstacle(first.cursor(), segment_id, "MINOR")
+
+    errors = []
+
+    def second_transaction():
+        try:
+            add_obstacle(second.cursor(), segment_id, "SEVERE")
+            second.commit()
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=second_transaction)
+    thread.start()
+    wait_until_blocked(watcher, second.get_backend_pid())
+
+    first.commit()
+    thread.join(10)
+    assert not thread.is_alive() and not errors
+
+    cursor.execute("SELECT obstacle_count, score FROM PathInfo WHERE path_info_id = %s", (path_id,))
+    obstacle_count, score = cursor.fetchone()
+    assert obstacle_count == 2
+    assert float(score) == pytest.approx(111.19 + 50 + 400)
@@ -0,0 +1,66 @@
+"""
+routeGeometry is stored as an encoded polyline, encoding and decoding must give
+back the points to the precision and match the strings other polyline6 tools produce
+"""
+import random
+
+import pytest
+
+from app.utils.polyline import decode_polyline, encode_polyline, encode_polylines
+
+# the example line of the polyline format documentation
+REFERENCE_POINTS = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]
+
+
+def assert_round_trip(geometry, precision=6):
+    decoded = decode_polyline(encode_polyline(geometry, precision), precision)
+    assert len(decoded) == len(geometry)
+    for (lat, lng), (decoded_lat, decoded_lng) in zip(geometry, decoded):
+        assert decoded_lat == pytest.approx(lat, abs=0.5 / 10 ** precision)
+        assert decoded_lng == pytest.approx(lng, abs=0.5 / 10 ** precision)
+
+
+def test_reference_strings():
+    assert encode_polyline(REFERENCE_POINTS) == "_izlhA~rlgdF_{geC~ywl@_kwzCn`{nI"
+    assert encode_polyline(REFERENCE_POINTS, precision=5) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert decode_polyline("_izlhA~rlgdF_{geC~ywl@_kwzCn`{nI") == REFERENCE_POINTS
+
+
+@pytest.mark.parametrize("geometry", [
+    [[45.4642, 9.19]],
+    [[-33.8688, -151.2093]],
+    [[0.0, 0.0], [0.0, 0.0]],
+    [[-34.6037, -58.3816], [-34.6036, -58.3815], [-34.6038, -58.3818]],
+    [[90.0, 180.0], [-90.0, -180.0], [90.0, -180.0], [-90.0, 180.0]],
+    [[89.999999, 179.999999], [-89.999999, -179.999999]],
+    [[45.0, 9.0], [45.0000004, 9.0000006]],
+])
+def test_round_trip(geometry):
+    assert_round_trip(geometry)
+
+
+def test_round_trip_random_paths():
+    rng = random.Random(5)
+    for _ in range(50):
+        lat, lng = rng.uniform(-90, 90), rng.uniform(-180, 180)
+        geometry = [[lat, lng]]
+        for _ in range(rng.randint(0, 200)):
+            lat = max(-90.0, min(90.0, lat + rng.uniform(-0.001, 0.001)))
+            lng = max(-180.0, min(180.0, lng + rng.uniform(-0.001, 0.001)))
+            geometry.append([lat, lng])
+        assert_round_trip(geometry)
+        assert_round_trip(geometry, precision=5)
+
+
+def test_batch_encoding_matches_one_by_one():
+    geometries = [REFERENCE_POINTS, None, [[45.4642, 9.19]], [], [[-90.0, -180.0], [90.0, 180.0]]]
+
+    assert encode_polylines(geometries) == [
+        encode_polyline(REFERENCE_POINTS), None, encode_polyline([[45.4642, 9.19]]), None,
+        encode_polyline([[-90.0, -180.0], [90.0, 180.0]])
+    ]
+
+
+def test_empty():
+    assert encode_polyline([]) is None
+    assert decode_polyline("") == []
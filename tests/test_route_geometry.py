@@ -0,0 +1,58 @@
+"""
+routeGeometry points reach the numpy geometry kernels as [lat, lng], malformed
+points are refused with the other body validation errors instead of a 500
+"""
+from fastapi.testclient import TestClient
+from jose import jwt
+import pytest
+from pydantic import ValidationError
+
+from app.config.settings import settings
+from app.main import app
+from app.models.path import ManualPathCreate, SegmentInput
+from app.services.path_writer import build_path_rows
+
+
+def segment(route_geometry):
+    return {
+        "status": "OPTIMAL",
+        "startLatitude": 45.0, "startLongitude": 9.0,
+        "endLatitude": 45.001, "endLongitude": 9.001,
+        "order": 0,
+        "routeGeometry": route_geometry
+    }
+
+
+def test_extra_values_are_dropped():
+    parsed = SegmentInput(**segment([[45.0, 9.0, 120.5], [45.0005, 9.0005], [45.001, 9.001, 119.0, 3.0]]))
+    assert parsed.routeGeometry == [[45.0, 9.0], [45.0005, 9.0005], [45.001, 9.001]]
+
+
+def test_ragged_geometry_builds_rows():
+    path = ManualPathCreate(
+        segments=[segment([[45.0, 9.0, 120.5], [45.001, 9.001]])], publishable=True
+    )
+    rows = build_path_rows(path, "user-1", "MANUAL", set())
+    assert rows["segments"][0][10]
+
+
+@pytest.mark.parametrize("route_geometry", [
+    [[45.0, 9.0], [45.001]],
+    [[45.0, 9.0], []],
+    [[45.0, 9.0], [95.0, 9.0]],
+    [[45.0, 9.0], [45.0, 190.0]],
+])
+def test_malformed_points_are_rejected(route_geometry):
+    with pytest.raises(ValidationError):
+        SegmentInput(**segment(route_geometry))
+
+
+def test_malformed_points_are_a_client_error():
+    token = jwt.encode({"user_id": "user-1"}, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+    response = TestClient(app).post(
+        "/paths/manual",
+        json={"segments": [segment([[45.0, 9.0], [45.001]])], "publishable": True},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][-1] == "routeGeometry"
@@ -0,0 +1,42 @@
+"""
+run_db keeps blocking database work off the event loop: while one request waits
+on a slow statement, other requests are still served
+"""
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from app.config.database import run_db
+from app.main import app
+
+BLOCK_TIMEOUT = 5.0
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("path", ["/", "/health"])
+async def test_slow_query_does_not_block_other_requests(fake_db, path):
+    fake_db.handler = lambda query, params: [(1,)]
+    entered, release = threading.Event(), threading.Event()
+
+    def slow_query(conn):
+        entered.set()
+        # stands in for a statement that takes a while, it blocks its db thread only
+        release.wait(BLOCK_TIMEOUT)
+        return "done"
+
+    slow = asyncio.create_task(run_db(slow_query))
+    try:
+        assert await asyncio.to_thread(entered.wait, BLOCK_TIMEOUT)
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await asyncio.wait_for(client.get(path), timeout=BLOCK_TIMEOUT / 2)
+
+        assert response.status_code == 200
+        assert not slow.done()
+    finally:
+        release.set()
+
+    assert await slow == "done"
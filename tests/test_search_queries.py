@@ -0,0 +1,86 @@
+"""
+/paths/search loads the page of routes with a fixed number of statements, no
+matter how many paths match (no N+1 loop over paths or segments)
+"""
+from decimal import Decimal
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.path_cache import search_cache
+from app.services.spatial_index import path_endpoint_index
+
+ORIGIN = (45.4642, 9.1900)
+DESTINATION = (45.4700, 9.2000)
+SEGMENTS_PER_PATH = 3
+
+
+def make_paths(count: int):
+    """count public paths from ORIGIN to DESTINATION, each with a few segments and one obstacle"""
+    paths = []
+    for i in range(count):
+        path_id = str(uuid.UUID(int=i + 1))
+        segments = []
+        for order in range(SEGMENTS_PER_PATH):
+            t0, t1 = order / SEGMENTS_PER_PATH, (order + 1) / SEGMENTS_PER_PATH
+            segments.append((
+                str(uuid.uuid4()), f"Via {order}", "OPTIMAL",
+                ORIGIN[0] + (DESTINATION[0] - ORIGIN[0]) * t0, ORIGIN[1] + (DESTINATION[1] - ORIGIN[1]) * t0,
+                ORIGIN[0] + (DESTINATION[0] - ORIGIN[0]) * t1, ORIGIN[1] + (DESTINATION[1] - ORIGIN[1]) * t1,
+                order, Decimal("330.5")
+            ))
+        obstacle = (str(uuid.uuid4()), "POTHOLE", "MINOR", ORIGIN[0], ORIGIN[1], None, segments[0][0])
+        paths.append({"id": path_id, "score": Decimal(i + 1), "segments": segments, "obstacles": [obstacle]})
+    return paths
+
+
+def answer(paths):
+    """handler of the fake database for the statements the search runs"""
+    by_id = {path["id"]: path for path in paths}
+
+    def handler(query, params):
+        if "FROM PathEndpoints" in query:
+            return [(path["id"], *ORIGIN, *DESTINATION) for path in paths]
+        if "FROM PathInfo" in query:
+            ids, limit = params[0], params[-1]
+            ranked = sorted((by_id[path_id]["score"], path_id) for path_id in ids)
+            return [(path_id, score, Decimal("991.5")) for score, path_id in ranked[:limit]]
+        if "FROM Segments" in query:
+            return [(*seg, path_id) for path_id in params[0] for seg in by_id[path_id]["segments"]]
+        if "FROM Obstacles" in query:
+            segment_ids = set(params[0])
+            return [obs for path in paths for obs in path["obstacles"] if obs[6] in segment_ids]
+        raise AssertionError(f"unexpected statement: {query}")
+
+    return handler
+
+
+def search(fake_db, paths, index_loaded: bool, limit: int) -> int:
+    """runs one search over paths, returns the number of statements it ran"""
+    fake_db.handler = answer(paths)
+    fake_db.statements.clear()
+    search_cache.clear()
+    path_endpoint_index.load([(path["id"], None, True, *ORIGIN, *DESTINATION) for path in paths])
+    path_endpoint_index.is_loaded = index_loaded
+
+    response = TestClient(app).get("/paths/search", params={
+        "originLat": ORIGIN[0], "originLon": ORIGIN[1],
+        "destLat": DESTINATION[0], "destLon": DESTINATION[1], "limit": limit
+    })
+
+    assert response.status_code == 200
+    routes = response.json()["routes"]
+    assert len(routes) == min(len(paths), limit)
+    assert all(len(route["segments"]) == SEGMENTS_PER_PATH for route in routes)
+    return len(fake_db.statements)
+
+
+@pytest.mark.parametrize("index_loaded", [True, False], ids=["index", "db-candidates"])
+def test_search_statements_do_not_grow_with_matches(fake_db, index_loaded):
+    one = search(fake_db, make_paths(1), index_loaded, limit=50)
+    many = search(fake_db, make_paths(40), index_loaded, limit=50)
+
+    # ranking, segments and obstacles, plus the candidate lookup without the index
+    assert one == many == (3 if index_loaded else 4)
@@ -0,0 +1,84 @@
+"""
+verified tokens are cached by their hash until their exp at the latest, failed
+verifications never are
+"""
+import hashlib
+import time
+
+from fastapi import HTTPException
+from jose import jwt
+import pytest
+
+from app.config.settings import settings
+from app.utils.security import get_user_id_from_token, token_cache
+
+USER_ID = "3f1c3c52-8d0e-4a0b-9a43-6d1f3e2b7c10"
+
+
+def make_token(claims: dict, secret: str = None) -> str:
+    return jwt.encode(claims, secret or settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+
+
+def cached_seconds_left(token: str) -> float:
+    expires_at, _ = token_cache._entries[hashlib.sha256(token.encode()).digest()]
+    return expires_at - time.monotonic()
+
+
+def test_cache_key_is_the_token_hash():
+    token = make_token({"user_id": USER_ID})
+
+    assert get_user_id_from_token(token) == USER_ID
+    assert list(token_cache._entries) == [hashlib.sha256(token.encode()).digest()]
+    assert all(token not in repr(key) for key in token_cache._entries)
+
+
+def test_cached_token_skips_decoding(monkeypatch):
+    token = make_token({"user_id": USER_ID})
+    get_user_id_from_token(token)
+
+    def no_decode(*args, **kwargs):
+        raise AssertionError("a cached token was decoded again")
+
+    monkeypatch.setattr(jwt, "decode", no_decode)
+    assert get_user_id_from_token(token) == USER_ID
+
+
+def test_ttl_is_capped_at_exp():
+    token = make_token({"user_id": USER_ID, "exp": int(time.time()) + 30})
+    get_user_id_from_token(token)
+    assert 0 < cached_seconds_left(token) <= 30
+
+    no_exp = make_token({"user_id": USER_ID, "name": "no exp"})
+    get_user_id_from_token(no_exp)
+    assert 30 < cached_seconds_left(no_exp) <= settings.JWT_CACHE_TTL_SECONDS
+
+
+def test_expired_token_is_rejected_after_being_cached():
+    exp = int(time.time()) + 1
+    token = make_token({"user_id": USER_ID, "exp": exp})
+    assert get_user_id_from_token(token) == USER_ID
+
+    # jose compares exp with the current whole second
+    while time.time() < exp + 1:
+        time.sleep(0.05)
+
+    with pytest.raises(HTTPException) as raised:
+        get_user_id_from_token(token)
+    assert raised.value.status_code == 401
+    assert len(token_cache) == 0
+
+
+@pytest.mark.parametrize("token", [
+    make_token({"user_id": USER_ID}, secret="not-the-secret"),
+    make_token({"sub": "no user_id claim"}),
+    make_token({"user_id": USER_ID, "exp": int(time.time()) - 10}),
+    "not.a.token",
+], ids=["bad-signature", "no-user-id", "expired", "garbage"])
+def test_failed_verification_is_never_cached(token):
+    hits = token_cache.stats()["hits"]
+    for _ in range(2):
+        with pytest.raises(HTTPException) as raised:
+            get_user_id_from_token(token)
+        assert raised.value.status_code == 401
+    assert len(token_cache) == 0
+    assert token_cache.stats()["hits"] == hits
@@ -0,0 +1,88 @@
+"""
+a committed path is put into the in-memory index and routing graph after its
+conection is back in the pool, and a failure there does not fail the write.
+route planning does not hold the graph lock while it searches
+"""
+from fastapi.testclient import TestClient
+from jose import jwt
+
+from app.config.settings import settings
+from app.main import app
+from app.routes import paths
+from app.services import routing_graph as routing_graph_module
+from app.services.routing_graph import RoutingGraph
+from app.services.spatial_index import path_endpoint_index
+
+USER_ID = "3f1c3c52-8d0e-4a0b-9a43-6d1f3e2b7c10"
+
+
+def manual_path():
+    return {
+        "name": "Naviglio",
+        "segments": [{
+            "status": "OPTIMAL",
+            "startLatitude": 45.45, "startLongitude": 9.17,
+            "endLatitude": 45.451, "endLongitude": 9.171,
+            "order": 0
+        }],
+        "publishable": True
+    }
+
+
+def test_graph_failure_does_not_fail_a_committed_path(fake_db, monkeypatch):
+    path_endpoint_index.load([])
+    inserted = []
+    checked_out_during_update = []
+
+    def failing_add_path(rows):
+        checked_out_during_update.append(fake_db.checked_out)
+        raise RuntimeError("graph is broken")
+
+    monkeypatch.setattr(paths, "insert_path_rows", lambda cursor, rows: inserted.append(rows))
+    monkeypatch.setattr(paths.routing_graph, "add_path", failing_add_path)
+
+    token = jwt.encode({"user_id": USER_ID}, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+    response = TestClient(app).post("/paths/manual", json=manual_path(), headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 201
+    assert response.json()["pathInfoId"] == inserted[0]["path_info"][0]
+    assert checked_out_during_update == [0]
+    # the endpoint index was still updated
+    assert len(path_endpoint_index) == 1
+
+
+def segment(segment_id, path_id, start_lat, end_lat):
+    return (segment_id, path_id, None, True, "OPTIMAL", start_lat, 9.0, end_lat, 9.0, 111.2)
+
+
+def test_find_route_searches_without_the_lock(monkeypatch):
+    graph = RoutingGraph(snap_meters=5.0, cell_size_meters=100.0)
+    # two paths along a meridian with a gap between 45.001 and 45.002
+    graph.load([
+        segment("segment-0", "path-1", 45.0, 45.001),
+        segment("segment-2", "path-2", 45.002, 45.003),
+    ], [], None)
+
+    heappop = routing_graph_module.heapq.heappop
+    lock_held = []
+
+    class WriteDuringSearch:
+        heapify = staticmethod(routing_graph_module.heapq.heapify)
+        heappush = staticmethod(routing_graph_module.heapq.heappush)
+
+        @staticmethod
+        def heappop(heap):
+            lock_held.append(graph._lock.locked())
+            if len(lock_held) == 1 and not lock_held[0]:
+                # a path closing the gap is stored while the search runs
+                graph.apply_changes([segment("segment-1", "path-3", 45.001, 45.002)], [], None)
+            return heappop(heap)
+
+    monkeypatch.setattr(routing_graph_module, "heapq", WriteDuringSearch)
+
+    # the search started before the gap was closed, it does not see the new segment
+    assert graph.find_route(45.0, 9.0, 45.003, 9.0, None, 20.0, 10000) is None
+    assert lock_held and not any(lock_held)
+
+    route = graph.find_route(45.0, 9.0, 45.003, 9.0, None, 20.0, 10000)
+    assert [segment_id for segment_id, _, _ in route["edges"]] == ["segment-0", "segment-1", "segment-2"]